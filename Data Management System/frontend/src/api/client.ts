@@ -17,6 +17,17 @@ export type ListResponse<T> = {
   error?: string;
 };
 
+// 游标分页（请求带 cursor 参数时）：total 可能为 null（见后端 total=exact|approx|none）
+export type CursorListResponse<T> = {
+  ok: boolean;
+  data: {
+    items: T[];
+    total: number | null;
+    next_cursor: string | null;
+  };
+  error?: string;
+};
+
 export type AuditLogItem = {
   uuid: string;
   action: string;
@@ -61,6 +72,7 @@ export type RankChangeItem = {
   rank_change?: number | null;
   current?: Record<string, string | null>;
   previous?: Record<string, string | null> | null;
+  band_change?: Record<string, number | null>;
 };
 
 export type RankChangeResponse = {
@@ -68,3 +80,56 @@ export type RankChangeResponse = {
   current_date: string | null;
   previous_date: string | null;
 };
+
+export type RankTrajectoryItem = {
+  key: string;
+  title?: string;
+  nickname?: string;
+  shop_name?: string;
+  ranks: (number | null)[];
+  bands: Record<string, (number | null)[]>;
+  rank_change: number | null;
+};
+
+export type RankTrajectoryResponse = {
+  dates: string[];
+  items: RankTrajectoryItem[];
+};
+
+export type ExportTable = "note_rank" | "account_rank" | "audit_log" | "rank_change";
+export type ExportFormat = "csv" | "jsonl" | "parquet";
+
+// 导出走浏览器下载（/api/export 流式返回附件），不经过 axios，避免整包读入内存
+export const buildExportUrl = (
+  table: ExportTable,
+  format: ExportFormat,
+  params: Record<string, string | number | undefined | null> = {}
+): string => {
+  const query = new URLSearchParams({ table, format });
+  Object.entries(params).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== "") {
+      query.set(key, String(value));
+    }
+  });
+  return `${API_BASE}/export?${query.toString()}`;
+};
+
+export type BandDistributionResponse = {
+  dates: string[];
+  totals: number[];
+  metrics: Record<string, { band: number; lo: number | null; hi: number | null; counts: number[] }[]>;
+};
+
+export type BandTransitionResponse = {
+  pairs: { current_date: string; previous_date: string }[];
+  metrics: Record<
+    string,
+    {
+      up: number[];
+      down: number[];
+      same: number[];
+      total: { up: number; down: number; same: number };
+      matrix: { from: number; to: number; count: number }[];
+    }
+  >;
+};
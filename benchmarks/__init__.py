@@ -0,0 +1 @@
+"""本地性能基准脚本（不依赖网络，均在临时目录中生成 SQLite 数据）。"""
@@ -0,0 +1,49 @@
+"""读取仓库自带的样例 CSV，并转换成扩展上报的行格式（camelCase 字段）。"""
+
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+NOTE_CSV = REPO_ROOT / "xhs_note_rank_20251118.csv"
+ACCOUNT_CSV = REPO_ROOT / "xhs_account_rank_20251118.csv"
+
+NOTE_HEADERS: Dict[str, str] = {
+    "笔记标题": "title",
+    "账号昵称": "nickname",
+    "发布时间": "publishTime",
+    "笔记阅读数": "readCount",
+    "笔记商品点击率": "clickRate",
+    "笔记支付转化率": "payConversionRate",
+    "笔记成交金额（元）": "gmv",
+    "获取时间": "fetchDate",
+}
+
+ACCOUNT_HEADERS: Dict[str, str] = {
+    "店铺名": "shopName",
+    "粉丝数": "fansCount",
+    "笔记阅读数": "readCount",
+    "笔记商品点击率": "clickRate",
+    "笔记支付转化率": "payConversionRate",
+    "笔记成交金额（元）": "gmv",
+    "获取时间": "fetchDate",
+}
+
+
+def _load(path: Path, headers: Dict[str, str]) -> List[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [
+            {key: (row.get(col) or "").strip() for col, key in headers.items()}
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_sample_note_rows() -> List[Dict[str, str]]:
+    return _load(NOTE_CSV, NOTE_HEADERS)
+
+
+def load_sample_account_rows() -> List[Dict[str, str]]:
+    return _load(ACCOUNT_CSV, ACCOUNT_HEADERS)
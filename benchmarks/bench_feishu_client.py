@@ -0,0 +1,91 @@
+"""飞书上传的握手/token 开销：每次 requests.post（旧实现） vs FeishuClient（缓存 token + Session）。
+
+在本地假飞书服务上执行，不访问网络；两种方式都去掉了批次间的固定 sleep，只比较连接与 token 开销。
+
+用法（在仓库根目录）：
+
+    python -m benchmarks.bench_feishu_client --uploads 20 --rows 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+import requests
+
+from benchmarks.fake_feishu_server import FakeFeishuServer, FakeFeishuState
+from feishu_client import FeishuClient
+
+BATCH_SIZE = 100
+
+
+def _records(count: int) -> List[Dict]:
+    return [{"fields": {"排名": i + 1, "笔记标题": f"标题{i}"}} for i in range(count)]
+
+
+def _legacy_upload(base_url: str, records: List[Dict]) -> int:
+    """复刻旧路径：每次上传重新申请 token，每批都是一次新的 requests.post（新连接）。"""
+    resp = requests.post(
+        f"{base_url}/auth/v3/tenant_access_token/internal",
+        json={"app_id": "a", "app_secret": "b"},
+        timeout=10,
+    )
+    token = resp.json()["tenant_access_token"]
+    url = f"{base_url}/bitable/v1/apps/app/tables/tbl/records/batch_create"
+    created = 0
+    for i in range(0, len(records), BATCH_SIZE):
+        resp = requests.post(
+            url,
+            headers={"Authorization": f"Bearer {token}"},
+            json={"records": records[i : i + BATCH_SIZE]},
+            timeout=15,
+        )
+        created += len(resp.json()["data"]["records"])
+    return created
+
+
+def _client_upload(client: FeishuClient, records: List[Dict]) -> int:
+    created = 0
+    for i in range(0, len(records), BATCH_SIZE):
+        created += len(client.batch_create("app", "tbl", records[i : i + BATCH_SIZE]))
+    return created
+
+
+def _run(label: str, uploads: int, fn) -> None:
+    state = FakeFeishuState()
+    with FakeFeishuServer(state=state) as server:
+        started = time.perf_counter()
+        for _ in range(uploads):
+            fn(server.base_url)
+        elapsed = time.perf_counter() - started
+    print(
+        f"  {label:<14} {elapsed * 1000:9.1f} ms  "
+        f"token requests={state.token_requests:<4} TCP connections={state.connections}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=300)
+    args = parser.parse_args()
+
+    records = _records(args.rows)
+    print(f"uploads={args.uploads} rows/upload={args.rows} batch={BATCH_SIZE}")
+    _run("requests.post", args.uploads, lambda base: _legacy_upload(base, records))
+
+    clients: Dict[str, FeishuClient] = {}
+
+    def with_client(base: str) -> int:
+        client = clients.setdefault(base, FeishuClient("a", "b", base_url=base))
+        return _client_upload(client, records)
+
+    _run("FeishuClient", args.uploads, with_client)
+    for client in clients.values():
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
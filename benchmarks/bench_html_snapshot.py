@@ -0,0 +1,67 @@
+"""另存榜单页面的离线解析吞吐：整页 HTMLParser vs 跳到表格的增量解析，以及多进程批量模式。
+
+默认使用仓库自带的 `热卖榜-优秀内容排行html/` 与 `成交榜-优秀账号排行html/` 样例（每个约 3 MB），
+每轮解析全部样例，重复 --rounds 轮。
+
+用法（在仓库根目录）：
+
+    python -m benchmarks.bench_html_snapshot --rounds 10 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import html_snapshot_parser
+from benchmarks._sample import REPO_ROOT
+
+SAMPLE_DIRS = [REPO_ROOT / "热卖榜-优秀内容排行html", REPO_ROOT / "成交榜-优秀账号排行html"]
+
+
+def _measure(label: str, files: List[Path], rounds: int, run: Callable[[List[Path]], int]) -> None:
+    megabytes = sum(p.stat().st_size for p in files) * rounds / 1024 / 1024
+    started = time.perf_counter()
+    rows = 0
+    for _ in range(rounds):
+        rows += run(files)
+    elapsed = time.perf_counter() - started
+    print(
+        f"  {label:<26} {elapsed:7.2f} s  {len(files) * rounds / elapsed:7.1f} pages/s  "
+        f"{megabytes / elapsed:7.1f} MB/s  rows={rows}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[str(p) for p in SAMPLE_DIRS], help="HTML 文件或目录")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    files = html_snapshot_parser.expand_snapshot_paths(args.paths)
+    if not files:
+        raise SystemExit("没有找到 HTML 文件。")
+    print(f"pages={len(files)} rounds={args.rounds} workers={args.workers}")
+
+    def full_document(paths: List[Path]) -> int:
+        return sum(len(html_snapshot_parser.parse_snapshot(p, skip_to_table=False)[1]) for p in paths)
+
+    def skip_to_table(paths: List[Path]) -> int:
+        return sum(len(html_snapshot_parser.parse_snapshot(p)[1]) for p in paths)
+
+    def process_pool(paths: List[Path]) -> int:
+        # 每轮新建进程池，计入进程启动开销
+        return sum(
+            len(rows) for _, _, rows in html_snapshot_parser.parse_snapshots(paths, workers=args.workers)
+        )
+
+    _measure("full document", files, args.rounds, full_document)
+    _measure("skip to <table>", files, args.rounds, skip_to_table)
+    _measure(f"skip + {args.workers} processes", files, args.rounds, process_pool)
+
+
+if __name__ == "__main__":
+    main()
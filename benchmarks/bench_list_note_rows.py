@@ -0,0 +1,88 @@
+"""list_note_rows 吞吐对比：每次请求新建连接（旧实现） vs StorageEngine 连接池。
+
+用法（在仓库根目录）：
+
+    python -m benchmarks.bench_list_note_rows --rows 20000 --seconds 3 --threads 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import storage_sqlite
+from benchmarks._sample import load_sample_note_rows
+
+
+def _legacy_list_note_rows(db_path: Path, page: int = 1, page_size: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+    """复刻连接池之前的调用路径：connect + WAL pragma + schema 检查 + 查询 + COUNT。"""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        storage_sqlite._init_schema(conn)
+        conn.commit()
+    offset = (page - 1) * page_size
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            "SELECT * FROM note_rank ORDER BY fetch_date DESC, created_at DESC LIMIT ? OFFSET ?",
+            (page_size, offset),
+        ).fetchall()
+        total = conn.execute("SELECT COUNT(1) FROM note_rank").fetchone()[0]
+        return [dict(r) for r in rows], total
+
+
+def _seed(db_path: Path, total_rows: int) -> None:
+    sample = load_sample_note_rows()
+    days = max(1, total_rows // len(sample))
+    for day in range(days):
+        fetch_date = f"2025-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}"
+        storage_sqlite.insert_note_rows(
+            [dict(r, fetchDate=fetch_date) for r in sample], db_path
+        )
+
+
+def _measure(fn: Callable[[], Any], seconds: float, threads: int) -> float:
+    stop_at = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(slot: int) -> None:
+        while time.perf_counter() < stop_at:
+            fn()
+            counts[slot] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        _seed(db_path, args.rows)
+
+        before = _measure(lambda: _legacy_list_note_rows(db_path), args.seconds, args.threads)
+        after = _measure(lambda: storage_sqlite.list_note_rows(db_path), args.seconds, args.threads)
+        storage_sqlite.close_engines()
+
+    print(f"rows={args.rows} threads={args.threads}")
+    print(f"  per-call connect : {before:10.1f} req/s")
+    print(f"  StorageEngine    : {after:10.1f} req/s  (x{after / before:.2f})")
+
+
+if __name__ == "__main__":
+    main()
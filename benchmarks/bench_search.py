@@ -0,0 +1,72 @@
+"""关键词检索延迟：LIKE 全表扫描 vs FTS5 bigram 索引，随数据量增长的对比。
+
+用法（在仓库根目录）：
+
+    python -m benchmarks.bench_search --sizes 10000 50000 200000 --queries 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import storage_sqlite
+from benchmarks._sample import load_sample_note_rows
+
+
+def _grow(db_path: Path, target: int, sample: List[dict], day: int) -> int:
+    with storage_sqlite.get_engine(db_path).reader() as conn:
+        have = conn.execute("SELECT COUNT(1) FROM note_rank").fetchone()[0]
+    while have < target:
+        fetch_date = f"2024-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}#{day // 336}"
+        storage_sqlite.insert_note_rows([dict(r, fetchDate=fetch_date) for r in sample], db_path)
+        have += len(sample)
+        day += 1
+    return day
+
+
+def _time_queries(db_path: Path, queries: List[str], use_search: bool) -> float:
+    engine = storage_sqlite.get_engine(db_path)
+    saved = engine.has_search
+    engine.has_search = use_search
+    try:
+        started = time.perf_counter()
+        for q in queries:
+            storage_sqlite.list_note_rows(db_path, q=q)
+        return (time.perf_counter() - started) / len(queries) * 1000
+    finally:
+        engine.has_search = saved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    sample = load_sample_note_rows()
+    rng = random.Random(42)
+    queries: List[str] = []
+    for _ in range(args.queries):
+        title = rng.choice(sample)["title"]
+        start = rng.randrange(max(1, len(title) - 2))
+        queries.append(title[start : start + rng.choice((1, 2, 3, 4))])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        day = 0
+        print(f"{'rows':>10} {'LIKE ms/q':>12} {'FTS5 ms/q':>12}")
+        for size in sorted(args.sizes):
+            day = _grow(db_path, size, sample, day)
+            like_ms = _time_queries(db_path, queries, use_search=False)
+            fts_ms = _time_queries(db_path, queries, use_search=True)
+            print(f"{size:>10} {like_ms:>12.2f} {fts_ms:>12.2f}")
+        storage_sqlite.close_engines()
+
+
+if __name__ == "__main__":
+    main()
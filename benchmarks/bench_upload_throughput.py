@@ -0,0 +1,83 @@
+"""整日上传吞吐：旧的串行 100 条/批 + 固定 sleep(0.3) vs 500 条/批并发 + 自适应令牌桶。
+
+假飞书服务模拟每个请求的网络延迟和频率限制（超限返回 429 / 99991400），
+用来确认并发写入不会被限流拖垮，且能逼近限额允许的最大吞吐。
+
+用法（在仓库根目录）：
+
+    python -m benchmarks.bench_upload_throughput --rows 5000 --latency 0.08 --rate-limit 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+from benchmarks.fake_feishu_server import FakeFeishuServer, FakeFeishuState
+from feishu_client import FeishuClient, RateLimiter
+
+
+def _records(count: int) -> List[Dict]:
+    return [{"fields": {"排名": i + 1, "笔记标题": f"标题{i}"}} for i in range(count)]
+
+
+def _sequential(client: FeishuClient, records: List[Dict]) -> int:
+    """旧实现：100 条一批，逐批写入，批间固定 sleep 0.3 秒。"""
+    created = 0
+    for i in range(0, len(records), 100):
+        created += len(client.batch_create("app", "tbl", records[i : i + 100]))
+        time.sleep(0.3)
+    return created
+
+
+def _run(label: str, args: argparse.Namespace, limiter, upload) -> None:
+    state = FakeFeishuState(latency=args.latency, rate_limit=args.rate_limit)
+    records = _records(args.rows)
+    with FakeFeishuServer(state=state) as server:
+        client = FeishuClient(
+            "a", "b", base_url=server.base_url, pool_maxsize=max(8, args.workers), rate_limiter=limiter
+        )
+        client.get_tenant_access_token()
+        started = time.perf_counter()
+        created = upload(client, records)
+        elapsed = time.perf_counter() - started
+        client.close()
+    print(
+        f"  {label:<22} {elapsed:7.2f} s  {created / elapsed:9.0f} rows/s  "
+        f"requests={state.api_requests:<4} throttled={state.throttled}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.08, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--rate-limit", type=int, default=10, help="假服务每秒允许的请求数")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    print(
+        f"rows={args.rows} latency={args.latency}s rate_limit={args.rate_limit}/s "
+        f"workers={args.workers} batch={args.batch_size}"
+    )
+
+    def concurrent(client: FeishuClient, records: List[Dict]) -> int:
+        return client.batch_create_many(
+            "app", "tbl", records, batch_size=args.batch_size, max_workers=args.workers
+        )
+
+    _run("sequential 100 + sleep", args, None, _sequential)
+    _run("concurrent, rate=limit", args, RateLimiter(args.rate_limit, burst=args.workers), concurrent)
+    # 初始速率设得过高：令牌桶被限流后减半并回升，仍应收敛到限额附近
+    _run(
+        "concurrent, rate=3x",
+        args,
+        RateLimiter(args.rate_limit * 3, burst=args.workers),
+        concurrent,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""本地假飞书开放平台，供基准脚本在无网络环境下测量 token / 连接 / 批量写入开销。
+
+实现的接口（路径与正式环境一致，前缀 /open-apis）：
+
+- POST /auth/v3/tenant_access_token/internal
+- POST /bitable/v1/apps/<app_token>/tables/<table_id>/records/batch_create
+- POST /bitable/v1/apps/<app_token>/tables/<table_id>/records/batch_update
+
+单独运行：python -m benchmarks.fake_feishu_server --port 18080
+然后在 config_local.py 中设置 FEISHU_BASE_URL = "http://127.0.0.1:18080/open-apis"。
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+_RECORDS_RE = re.compile(r"^/open-apis/bitable/v1/apps/([^/]+)/tables/([^/]+)/records/([a-z_]+)$")
+
+
+class FakeFeishuState:
+    """服务端计数器与已写入的记录（按 (app_token, table_id) 分表）。
+
+    rate_limit > 0 时模拟飞书的频率限制：1 秒滑动窗口内超过 rate_limit 次的
+    多维表请求返回 HTTP 429 / code 99991400，并带 x-ogw-ratelimit-reset 头。
+    """
+
+    def __init__(self, token_ttl: int = 7200, latency: float = 0.0, rate_limit: int = 0) -> None:
+        self.token_ttl = token_ttl
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.token_requests = 0
+        self.api_requests = 0
+        self.throttled = 0
+        self.failures_pending = 0
+        self.write_requests = 0
+        self.failures_at: Set[int] = set()
+        self.client_tokens: Dict[str, List[Dict[str, Any]]] = {}
+        self._window: deque = deque()
+        self.tokens: Dict[str, float] = {}
+        self.tables: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+        self._ids = itertools.count(1)
+
+    def issue_token(self) -> Dict[str, Any]:
+        with self.lock:
+            self.token_requests += 1
+            token = f"t-fake-{next(self._ids)}"
+            self.tokens[token] = time.monotonic() + self.token_ttl
+        return {"code": 0, "msg": "ok", "tenant_access_token": token, "expire": self.token_ttl}
+
+    def token_ok(self, header: Optional[str]) -> bool:
+        token = (header or "").replace("Bearer ", "", 1)
+        with self.lock:
+            expires = self.tokens.get(token)
+        return expires is not None and expires > time.monotonic()
+
+    def throttle(self) -> Optional[float]:
+        """超出频率限制时返回需要等待的秒数，否则记一次请求并返回 None。"""
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            while self._window and now - self._window[0] >= 1.0:
+                self._window.popleft()
+            if len(self._window) >= self.rate_limit:
+                self.throttled += 1
+                return 1.0 - (now - self._window[0])
+            self._window.append(now)
+        return None
+
+    def fail_next(self, count: int) -> None:
+        """让接下来的 count 个 batch_create / batch_update 请求返回 HTTP 500（用于测试断点续传）。"""
+        with self.lock:
+            self.failures_pending += count
+
+    def fail_request(self, number: int) -> None:
+        """让第 number 个（从 1 计数）batch_create / batch_update 请求返回 HTTP 500。"""
+        with self.lock:
+            self.failures_at.add(number)
+
+    def take_failure(self) -> bool:
+        with self.lock:
+            self.write_requests += 1
+            if self.write_requests in self.failures_at:
+                return True
+            if self.failures_pending <= 0:
+                return False
+            self.failures_pending -= 1
+            return True
+
+    def create_records(
+        self,
+        table: Tuple[str, str],
+        records: List[Dict[str, Any]],
+        client_token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        created = []
+        with self.lock:
+            # 与飞书一致：相同 client_token 的重复请求直接返回首次结果
+            if client_token and client_token in self.client_tokens:
+                return self.client_tokens[client_token]
+            store = self.tables.setdefault(table, {})
+            for record in records:
+                record_id = f"rec{next(self._ids):08d}"
+                store[record_id] = record.get("fields", {})
+                created.append({"record_id": record_id, "fields": record.get("fields", {})})
+            if client_token:
+                self.client_tokens[client_token] = created
+        return created
+
+    def update_records(
+        self, table: Tuple[str, str], records: List[Dict[str, Any]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """按 record_id 合并字段；有不存在的 record_id 时整批不生效并返回 None。"""
+        with self.lock:
+            store = self.tables.setdefault(table, {})
+            if any(record.get("record_id") not in store for record in records):
+                return None
+            updated = []
+            for record in records:
+                fields = store[record["record_id"]]
+                fields.update(record.get("fields", {}))
+                updated.append({"record_id": record["record_id"], "fields": dict(fields)})
+        return updated
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，连接数才有对比意义
+    # 响应头与正文合并成一次写出，避免 keep-alive 连接上触发 Nagle + 延迟 ACK 的 40ms 卡顿
+    wbufsize = 64 * 1024
+    server: "FakeFeishuServer"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - 与基类签名一致
+        return
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server 约定
+        state = self.server.state
+        path, _, query = self.path.partition("?")
+        body = self._read_json()
+        if state.latency:
+            time.sleep(state.latency)
+
+        if path == "/open-apis/auth/v3/tenant_access_token/internal":
+            self._send(200, state.issue_token())
+            return
+
+        match = _RECORDS_RE.match(path)
+        if not match:
+            self._send(404, {"code": 404, "msg": "not found"})
+            return
+        with state.lock:
+            state.api_requests += 1
+        if not state.token_ok(self.headers.get("Authorization")):
+            self._send(400, {"code": 99991663, "msg": "Invalid access token for authorization."})
+            return
+        reset = state.throttle()
+        if reset is not None:
+            self._send(
+                429,
+                {"code": 99991400, "msg": "request trigger frequency limit"},
+                {"x-ogw-ratelimit-limit": str(state.rate_limit), "x-ogw-ratelimit-reset": f"{reset:.3f}"},
+            )
+            return
+
+        app_token, table_id, action = match.groups()
+        if action in ("batch_create", "batch_update"):
+            records = body.get("records") or []
+            if len(records) > 500:
+                self._send(400, {"code": 1254104, "msg": "records over limit"})
+                return
+            if state.take_failure():
+                self._send(500, {"code": 1254000, "msg": "internal error (injected)"})
+                return
+            if action == "batch_update":
+                updated = state.update_records((app_token, table_id), records)
+                if updated is None:
+                    self._send(400, {"code": 1254043, "msg": "RecordIdNotFound"})
+                    return
+                self._send(200, {"code": 0, "msg": "success", "data": {"records": updated}})
+                return
+            client_token = parse_qs(query).get("client_token", [None])[0]
+            created = state.create_records((app_token, table_id), records, client_token)
+            self._send(200, {"code": 0, "msg": "success", "data": {"records": created}})
+            return
+        self._send(404, {"code": 404, "msg": f"unsupported action {action}"})
+
+
+class FakeFeishuServer(ThreadingHTTPServer):
+    """在后台线程运行的假飞书服务；可作为上下文管理器使用。"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, state: Optional[FakeFeishuState] = None) -> None:
+        self.state = state or FakeFeishuState()
+        super().__init__(("127.0.0.1", port), _Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/open-apis"
+
+    def start(self) -> "FakeFeishuServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeFeishuServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地假飞书开放平台")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求额外延迟（秒）")
+    parser.add_argument("--rate-limit", type=int, default=0, help="每秒允许的多维表请求数（0 不限）")
+    args = parser.parse_args()
+
+    server = FakeFeishuServer(
+        args.port, FakeFeishuState(latency=args.latency, rate_limit=args.rate_limit)
+    )
+    print(f"fake feishu listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""本地 API 压测：Flask 开发服务器 vs waitress（多线程）vs gunicorn（多进程 × 多线程）vs uvicorn（ASGI）。
+
+每种服务器在临时数据库副本上各启动一次（子进程），用 --concurrency 个线程持续发送
+读请求（榜单分页 / 搜索 / 排名变化 / 档位分布），按 --write-ratio 混入 /db_only_* 写入，
+统计吞吐（req/s）、延迟分位数和失败数。写入会让响应缓存失效，--no-cache 则给每个读请求
+加随机参数，直接测数据库查询路径。
+
+用法（在仓库根目录，需要 pip install waitress gunicorn uvicorn httpx）：
+
+    python -m benchmarks.load_test --duration 15 --concurrency 32 --workers 4 --threads 8
+    python -m benchmarks.load_test --servers dev,waitress --write-ratio 0.1 --no-cache
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks._sample import REPO_ROOT, load_sample_account_rows, load_sample_note_rows
+
+SERVERS = ("dev", "waitress", "gunicorn", "uvicorn")
+
+READ_PATHS = [
+    "/api/note_rank?page={page}&page_size=20",
+    "/api/note_rank?page=1&page_size=20&q=夏季",
+    "/api/note_rank?cursor=&page_size=50",
+    "/api/account_rank?page={page}&page_size=20",
+    "/api/rank_change?type=note",
+    "/api/band_distribution?type=note&days=7",
+]
+
+# 子进程启动代码：把临时配置目录放在 sys.path 最前，覆盖仓库中的 config_local.py
+_LAUNCH = {
+    "dev": (
+        "import sys; sys.path.insert(0, {cfg!r}); import feishu_api; "
+        "feishu_api.app.run(host='127.0.0.1', port={port}, threaded=True)"
+    ),
+    "waitress": (
+        "import sys; sys.path.insert(0, {cfg!r}); import serve; "
+        "serve.main(['--server', 'waitress', '--port', '{port}', '--threads', '{threads}'])"
+    ),
+    "gunicorn": (
+        "import sys; sys.path.insert(0, {cfg!r}); import serve; "
+        "serve.main(['--server', 'gunicorn', '--port', '{port}', "
+        "'--workers', '{workers}', '--threads', '{threads}'])"
+    ),
+    "uvicorn": (
+        "import sys; sys.path.insert(0, {cfg!r}); import serve; "
+        "serve.main(['--server', 'uvicorn', '--port', '{port}', '--threads', '{threads}'])"
+    ),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _write_config(directory: Path, db_path: Path) -> None:
+    (directory / "config_local.py").write_text(
+        f"SQLITE_PATH = {str(db_path)!r}\nUPLOAD_WORKERS = 1\n", encoding="utf-8"
+    )
+
+
+def _start(server: str, cfg_dir: Path, port: int, args: argparse.Namespace) -> subprocess.Popen:
+    code = _LAUNCH[server].format(cfg=str(cfg_dir), port=port, workers=args.workers, threads=args.threads)
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{server} 启动失败（退出码 {proc.returncode}），是否已安装对应的服务器？")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/upload_jobs", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f"{server} 60 秒内没有就绪")
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def add(self, latency: float, ok: bool, write: bool) -> None:
+        with self.lock:
+            self.latencies.append(latency)
+            self.errors += 0 if ok else 1
+            self.writes += 1 if write else 0
+
+
+def _write_payload(rng: random.Random, notes: List[Dict], accounts: List[Dict]) -> Tuple[str, Dict]:
+    # 随机日期 + 随机标记，保证每次都是真实插入（而不是被去重的重复行）
+    fetch_date = f"2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    tag = f"#{rng.getrandbits(32):08x}"
+    if rng.random() < 0.5:
+        rows = [dict(r, fetchDate=fetch_date, title=r["title"] + tag) for r in rng.sample(notes, 20)]
+        return "/db_only_note_rank", {"rows": rows}
+    rows = [dict(r, fetchDate=fetch_date, shopName=r["shopName"] + tag) for r in rng.sample(accounts, 20)]
+    return "/db_only_account_rank", {"rows": rows}
+
+
+def _client(
+    base_url: str,
+    args: argparse.Namespace,
+    stop_at: float,
+    stats: _Stats,
+    seed: int,
+    notes: List[Dict],
+    accounts: List[Dict],
+) -> None:
+    rng = random.Random(seed)
+    session = requests.Session()
+    while time.monotonic() < stop_at:
+        write = rng.random() < args.write_ratio
+        started = time.perf_counter()
+        try:
+            if write:
+                path, payload = _write_payload(rng, notes, accounts)
+                response = session.post(base_url + path, json=payload, timeout=60)
+            else:
+                path = rng.choice(READ_PATHS).format(page=rng.randint(1, 20))
+                if args.no_cache:
+                    path += f"&_={rng.getrandbits(48)}"
+                response = session.get(base_url + path, timeout=60)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        stats.add(time.perf_counter() - started, ok, write)
+    session.close()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _run(server: str, source_db: Path, args: argparse.Namespace) -> Optional[float]:
+    notes, accounts = load_sample_note_rows(), load_sample_account_rows()
+    with tempfile.TemporaryDirectory(prefix="xhs_load_") as tmp:
+        cfg_dir = Path(tmp)
+        db_path = cfg_dir / "load.db"
+        if source_db.exists():
+            shutil.copyfile(source_db, db_path)
+        _write_config(cfg_dir, db_path)
+        port = _free_port()
+        proc = _start(server, cfg_dir, port, args)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            # 预热：迁移 / 连接池 / 首次查询计划
+            for path in READ_PATHS:
+                requests.get(base_url + path.format(page=1), timeout=60)
+            stats = _Stats()
+            started = time.monotonic()
+            stop_at = started + args.duration
+            threads = [
+                threading.Thread(
+                    target=_client, args=(base_url, args, stop_at, stats, i, notes, accounts), daemon=True
+                )
+                for i in range(args.concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    total = len(stats.latencies)
+    throughput = total / elapsed
+    label = {
+        "dev": "flask dev server",
+        "waitress": f"waitress x{args.threads}t",
+        "gunicorn": f"gunicorn {args.workers}p x{args.threads}t",
+        "uvicorn": f"uvicorn asgi x{args.threads}t",
+    }[server]
+    print(
+        f"  {label:<24} {throughput:8.1f} req/s  p50={_percentile(stats.latencies, 0.5) * 1000:7.1f} ms  "
+        f"p95={_percentile(stats.latencies, 0.95) * 1000:7.1f} ms  "
+        f"requests={total} writes={stats.writes} errors={stats.errors}"
+    )
+    return throughput
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", default=",".join(SERVERS), help="逗号分隔：dev,waitress,gunicorn,uvicorn")
+    parser.add_argument("--db", default=str(REPO_ROOT / "data" / "xhs_rank.db"), help="压测所用数据库（复制后使用）")
+    parser.add_argument("--duration", type=float, default=15.0, help="每种服务器的压测时长（秒）")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发客户端线程数")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn 进程数")
+    parser.add_argument("--threads", type=int, default=8, help="每进程线程数")
+    parser.add_argument("--write-ratio", type=float, default=0.02, help="写请求占比")
+    parser.add_argument("--no-cache", action="store_true", help="读请求带随机参数，绕过响应缓存")
+    args = parser.parse_args()
+
+    servers = [s.strip() for s in args.servers.split(",") if s.strip()]
+    unknown = set(servers) - set(SERVERS)
+    if unknown:
+        raise SystemExit(f"未知的服务器: {', '.join(sorted(unknown))}")
+    print(
+        f"duration={args.duration}s concurrency={args.concurrency} write_ratio={args.write_ratio} "
+        f"cache={'off' if args.no_cache else 'on'}"
+    )
+    results = {server: _run(server, Path(args.db), args) for server in servers}
+    baseline = results.get("dev")
+    if baseline:
+        for server, throughput in results.items():
+            if server != "dev" and throughput:
+                print(f"  {server} vs dev: {throughput / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
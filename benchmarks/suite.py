@@ -0,0 +1,345 @@
+"""可复现的基准套件：在合成榜单历史上测主要代码路径，结果写成 JSON 供逐次对比。
+
+每个规模（--scale，或 --rows / --days 自定义）用 benchmarks.synthetic 生成内容榜与账号榜历史，
+写入临时数据库后依次计时：
+
+- storage：insert_*_rows（逐天写入 / 重复写入未变化的一天）、list_*_rows（首页 / 深分页 /
+  带 q / 带 q + 日期范围）、list_note_rows_by_cursor、get_*_rank_changes（最近两天 / 首尾两天）；
+- upload：to_bitable_records（一天的行）；
+- api：经 Flask test client 请求 /api/note_rank、/api/account_rank、/api/rank_change、
+  /api/band_distribution、/api/export（读接口带随机参数绕过响应缓存，另测一次命中缓存）。
+
+临时配置目录放在 sys.path 最前，不会读写 data/xhs_rank.db，也不会访问飞书。
+同样的参数与 seed 生成的数据完全一致；JSON 中记录 git 提交、Python / SQLite 版本与机器信息。
+
+用法（在仓库根目录）：
+
+    python -m benchmarks.suite --scale small --out bench.json
+    python -m benchmarks.suite --rows 100000 --days 90 --repeat 7 --out after.json --compare bench.json
+    python -m benchmarks.suite --scale small,medium --compare bench.json --threshold 0.2 --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks._sample import REPO_ROOT
+from benchmarks.synthetic import generate_history
+
+# 规模名 -> (每个榜单的总行数, 采集天数)
+SCALES: Dict[str, Tuple[int, int]] = {
+    "small": (1_000, 5),
+    "medium": (100_000, 90),
+    "large": (1_000_000, 365),
+}
+
+# 每个样本至少持续的时间：很快的调用在一个样本里重复多次，取平均
+MIN_SAMPLE_SECONDS = 0.02
+
+
+def _write_config(directory: Path, db_path: Path) -> None:
+    (directory / "config_local.py").write_text(
+        "APP_ID = 'bench'\n"
+        "APP_SECRET = 'bench'\n"
+        "BITABLE_NOTE_APP_TOKEN = 'bench'\n"
+        "BITABLE_NOTE_TABLE_ID = 'bench'\n"
+        f"SQLITE_PATH = {str(db_path)!r}\n"
+        "SLOW_REQUEST_LOG = None\n",
+        encoding="utf-8",
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    commit = out.stdout.strip()
+    if commit and subprocess.run(
+        ["git", "diff", "--quiet", "HEAD"], cwd=REPO_ROOT, capture_output=True, timeout=30
+    ).returncode:
+        commit += "-dirty"
+    return commit or None
+
+
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+
+
+class Runner:
+    """计时并收集一个规模下的所有结果。"""
+
+    def __init__(self, scale: str, repeat: int) -> None:
+        self.scale = scale
+        self.repeat = max(1, repeat)
+        self.results: List[Dict[str, Any]] = []
+
+    def record(self, name: str, samples: List[float], number: int = 1, rows: Optional[int] = None) -> None:
+        ordered = sorted(samples)
+        median = statistics.median(ordered)
+        result: Dict[str, Any] = {
+            "scale": self.scale,
+            "name": name,
+            "samples": len(ordered),
+            "number": number,
+            "min": ordered[0],
+            "median": median,
+            "mean": statistics.fmean(ordered),
+            "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            "stdev": statistics.pstdev(ordered),
+            "ops_per_sec": 1 / median if median > 0 else None,
+        }
+        if rows is not None:
+            result["rows"] = rows
+            result["rows_per_sec"] = rows / median if median > 0 else None
+        self.results.append(result)
+        extra = f"  {result['rows_per_sec']:>10.0f} rows/s" if rows is not None and median > 0 else ""
+        print(f"  {name:<44} median={median * 1000:9.3f} ms  p95={result['p95'] * 1000:9.3f} ms{extra}")
+
+    def time(self, name: str, fn: Callable[[], Any], rows: Optional[int] = None) -> None:
+        """预热一次后取 repeat 个样本；单次很快时每个样本内重复 number 次。"""
+        started = time.perf_counter()
+        fn()
+        once = time.perf_counter() - started
+        number = max(1, min(1000, int(MIN_SAMPLE_SECONDS / once))) if once > 0 else 1000
+        samples = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started) / number)
+        self.record(name, samples, number=number, rows=rows)
+
+
+def _load_history(runner: Runner, db_path: Path, rows: int, days: int, seed: int) -> Dict[str, Any]:
+    """逐天写入两个榜单，每天的写入时间作为一个样本；返回后续用例需要的上下文。"""
+    import storage_sqlite
+
+    context: Dict[str, Any] = {}
+    for kind, insert in (("note", storage_sqlite.insert_note_rows), ("account", storage_sqlite.insert_account_rows)):
+        samples: List[float] = []
+        dates: List[str] = []
+        last_rows: List[Dict[str, str]] = []
+        generated = 0
+        gen_seconds = 0.0
+        history = generate_history(kind, rows, days, seed=seed)
+        while True:
+            started = time.perf_counter()
+            item = next(history, None)
+            gen_seconds += time.perf_counter() - started
+            if item is None:
+                break
+            fetch_date, day_rows = item
+            started = time.perf_counter()
+            insert(day_rows, db_path)
+            samples.append(time.perf_counter() - started)
+            dates.append(fetch_date)
+            last_rows = day_rows
+            generated += len(day_rows)
+        print(f"  [{kind}] 生成 {generated} 行 / {len(dates)} 天，用时 {gen_seconds:.1f}s")
+        runner.record(f"storage.insert_{kind}_rows.day", samples, rows=len(last_rows))
+        # 同一天原样再写一次：全部走“未变化”分支
+        runner.time(f"storage.insert_{kind}_rows.unchanged_day", lambda: insert(last_rows, db_path), rows=len(last_rows))
+        context[kind] = {"dates": dates, "last_rows": last_rows, "total": generated}
+    return context
+
+
+def _search_term(rows: List[Dict[str, str]], field: str) -> str:
+    # 取最新一天第一条的前两个字：一定有命中，且和扩展用户的搜索长度相当
+    for row in rows:
+        text = "".join(ch for ch in row.get(field, "") if ch.isalnum())
+        if len(text) >= 2:
+            return text[:2]
+    return "夏季"
+
+
+def _storage_cases(runner: Runner, db_path: Path, context: Dict[str, Any]) -> None:
+    import storage_sqlite
+
+    note, account = context["note"], context["account"]
+    note_q = _search_term(note["last_rows"], "title")
+    account_q = _search_term(account["last_rows"], "shopName")
+    week_from = note["dates"][max(0, len(note["dates"]) - 7)]
+    deep_page = max(1, note["total"] // 20 // 2)
+
+    runner.time("storage.list_note_rows.page1", lambda: storage_sqlite.list_note_rows(db_path))
+    runner.time("storage.list_note_rows.deep_page", lambda: storage_sqlite.list_note_rows(db_path, page=deep_page))
+    runner.time("storage.list_note_rows.q", lambda: storage_sqlite.list_note_rows(db_path, q=note_q))
+    runner.time(
+        "storage.list_note_rows.q_week",
+        lambda: storage_sqlite.list_note_rows(db_path, q=note_q, fetch_date_from=week_from),
+    )
+    runner.time("storage.list_note_rows_by_cursor.page1", lambda: storage_sqlite.list_note_rows_by_cursor(db_path))
+    runner.time("storage.list_account_rows.page1", lambda: storage_sqlite.list_account_rows(db_path))
+    runner.time("storage.list_account_rows.q", lambda: storage_sqlite.list_account_rows(db_path, q=account_q))
+
+    for kind, get_changes in (
+        ("note", storage_sqlite.get_note_rank_changes),
+        ("account", storage_sqlite.get_account_rank_changes),
+    ):
+        dates = context[kind]["dates"]
+        runner.time(f"storage.get_{kind}_rank_changes.latest", lambda: get_changes(db_path))
+        if len(dates) > 2:
+            first, last = dates[0], dates[-1]
+            runner.time(f"storage.get_{kind}_rank_changes.span", lambda: get_changes(db_path, last, first))
+
+
+def _upload_cases(runner: Runner, context: Dict[str, Any]) -> None:
+    import upload_to_feishu
+
+    for kind, mapping in (
+        ("note", upload_to_feishu.FIELD_MAPPING_NOTE),
+        ("account", upload_to_feishu.FIELD_MAPPING_ACCOUNT),
+    ):
+        rows = [dict(row, __rank=str(idx)) for idx, row in enumerate(context[kind]["last_rows"], start=1)]
+        runner.time(
+            f"upload.to_bitable_records.{kind}",
+            lambda: upload_to_feishu.to_bitable_records(rows, mapping),
+            rows=len(rows),
+        )
+
+
+def _api_cases(runner: Runner, db_path: Path, context: Dict[str, Any]) -> None:
+    import feishu_api
+
+    # 视图在调用时读取模块全局 SQLITE_PATH，每个规模切到自己的库；缓存键只含数据版本，换库时清空
+    feishu_api.SQLITE_PATH = db_path
+    feishu_api.response_cache.clear()
+    client = feishu_api.app.test_client()
+    note_q = _search_term(context["note"]["last_rows"], "title")
+    latest = context["note"]["dates"][-1]
+    counter = [0]
+
+    def get(path: str, bust: bool = True) -> Callable[[], None]:
+        def call() -> None:
+            url = path
+            if bust:
+                counter[0] += 1
+                url += f"&_={counter[0]}"
+            response = client.get(url)
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} -> {response.status_code}")
+
+        return call
+
+    runner.time("api.note_rank.page1", get("/api/note_rank?page=1&page_size=20"))
+    runner.time("api.note_rank.page1_cached", get("/api/note_rank?page=1&page_size=20", bust=False))
+    runner.time("api.note_rank.q", get(f"/api/note_rank?page=1&page_size=20&q={note_q}"))
+    runner.time("api.account_rank.page1", get("/api/account_rank?page=1&page_size=20"))
+    runner.time("api.rank_change.note", get("/api/rank_change?type=note"))
+    runner.time("api.band_distribution.note_7d", get("/api/band_distribution?type=note&days=7"))
+    runner.time(
+        "api.export.note_csv_day",
+        get(f"/api/export?table=note_rank&format=csv&fetch_date_from={latest}&fetch_date_to={latest}"),
+        rows=len(context["note"]["last_rows"]),
+    )
+
+
+def run_scale(scale: str, rows: int, days: int, args: argparse.Namespace, tmp: Path) -> List[Dict[str, Any]]:
+    import storage_sqlite
+
+    print(f"== {scale}: {rows} 行 x {days} 天（每个榜单）")
+    runner = Runner(scale, args.repeat)
+    db_path = tmp / f"{scale}.db"
+    context = _load_history(runner, db_path, rows, days, args.seed)
+    _storage_cases(runner, db_path, context)
+    _upload_cases(runner, context)
+    _api_cases(runner, db_path, context)
+    storage_sqlite.close_engines()
+    return runner.results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Tuple[str, str, float]]:
+    """按 (scale, name) 对比中位数，打印比值；返回超过阈值的回退项。"""
+    before = {(r["scale"], r["name"]): r for r in baseline.get("results", [])}
+    regressions: List[Tuple[str, str, float]] = []
+    print(f"== 对比 {baseline.get('meta', {}).get('git_commit')} -> {current['meta'].get('git_commit')}（中位数比值）")
+    for result in current["results"]:
+        old = before.get((result["scale"], result["name"]))
+        if old is None or not old["median"]:
+            continue
+        ratio = result["median"] / old["median"]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  回退"
+            regressions.append((result["scale"], result["name"], ratio))
+        elif ratio < 1 - threshold:
+            mark = "  提升"
+        print(f"  {result['scale']:<10} {result['name']:<44} {ratio:6.2f}x{mark}")
+    return regressions
+
+
+def _scales(args: argparse.Namespace) -> List[Tuple[str, int, int]]:
+    if args.rows or args.days:
+        rows = args.rows or SCALES["small"][0]
+        days = args.days or SCALES["small"][1]
+        return [(f"{rows}x{days}", rows, days)]
+    selected = []
+    for name in (s.strip() for s in args.scale.split(",") if s.strip()):
+        if name not in SCALES:
+            raise SystemExit(f"未知的规模: {name}（可选 {', '.join(SCALES)}）")
+        selected.append((name, *SCALES[name]))
+    return selected
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="small", help="逗号分隔：small,medium,large")
+    parser.add_argument("--rows", type=int, default=0, help="自定义规模：每个榜单的总行数（覆盖 --scale）")
+    parser.add_argument("--days", type=int, default=0, help="自定义规模：采集天数（1~365）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例的样本数")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据的随机种子")
+    parser.add_argument("--out", help="结果 JSON 路径")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.15, help="中位数变慢超过该比例视为回退")
+    parser.add_argument("--fail-on-regression", action="store_true", help="存在回退时以退出码 1 结束")
+    args = parser.parse_args(argv)
+
+    scales = _scales(args)
+    with tempfile.TemporaryDirectory(prefix="xhs_bench_") as tmp_dir:
+        tmp = Path(tmp_dir)
+        # 先放好临时配置再导入 feishu_api / upload_to_feishu
+        _write_config(tmp, tmp / "boot.db")
+        sys.path.insert(0, str(tmp))
+        report: Dict[str, Any] = {"meta": _meta(args), "results": []}
+        for scale, rows, days in scales:
+            report["meta"].setdefault("scales", {})[scale] = {"rows": rows, "days": days}
+            report["results"].extend(run_scale(scale, rows, days, args, tmp))
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"结果已写入 {args.out}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
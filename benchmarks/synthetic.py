@@ -0,0 +1,267 @@
+"""合成榜单历史：按仓库样例 CSV 的标题用词、区间取值分布与每日采集节奏，生成任意规模的数据。
+
+- 标题由样例标题切出的词片段（及 emoji）重新组合，昵称 / 店铺名在样例基础上派生；
+- 各区间指标按样例中的取值频率抽样，在榜条目每天以小概率向相邻区间漂移；
+- 每天约 carry_over 比例的条目留在榜上（名次随机扰动），其余为新条目，rank_change 因此有足够的匹配；
+- fetch_date 按天推进，以 gap_rate 的概率跳过一天（样例库里也有缺采的日期）。
+
+同一 seed 生成的数据完全相同，用于让基准结果可以逐次对比。按天产出，内存只占一天的数据。
+
+    from benchmarks.synthetic import generate_history
+    for fetch_date, rows in generate_history("note", rows=100_000, days=90):
+        storage_sqlite.insert_note_rows(rows, db_path)
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import intervals
+from benchmarks._sample import load_sample_account_rows, load_sample_note_rows
+
+KINDS = ("note", "account")
+
+# kind -> [(行字段, intervals 中的指标名)]
+METRIC_FIELDS: Dict[str, List[Tuple[str, str]]] = {
+    "note": [
+        ("readCount", "read_count"),
+        ("clickRate", "click_rate"),
+        ("payConversionRate", "pay_conversion_rate"),
+        ("gmv", "gmv"),
+    ],
+    "account": [
+        ("readCount", "read_count"),
+        ("clickRate", "click_rate"),
+        ("payConversionRate", "pay_conversion_rate"),
+        ("gmv", "gmv"),
+    ],
+}
+
+_SPLIT_RE = re.compile(r"[\s，。！？、,.!?|｜（）()【】\[\]#~～:：;；\-—_/]+")
+_EMOJI_RE = re.compile("[\U0001F000-\U0001FAFF☀-➿]")
+_SEPARATORS = ["", "", "，", "｜", " ", "！", "？"]
+
+
+class SampleProfile:
+    """从样例 CSV 提取的词片段、名称与各指标的取值频率。"""
+
+    def __init__(self) -> None:
+        notes = load_sample_note_rows()
+        accounts = load_sample_account_rows()
+
+        fragments: List[str] = []
+        emojis: List[str] = []
+        for row in notes:
+            title = row["title"]
+            emojis.extend(_EMOJI_RE.findall(title))
+            for piece in _SPLIT_RE.split(_EMOJI_RE.sub(" ", title)):
+                # 长句再切成 2~8 字的片段，组合出的标题长度接近样例
+                while len(piece) > 8:
+                    cut = 4 + len(piece) % 5
+                    fragments.append(piece[:cut])
+                    piece = piece[cut:]
+                if len(piece) >= 2:
+                    fragments.append(piece)
+        self.fragments = sorted(set(fragments))
+        self.emojis = sorted(set(emojis)) or ["🔥"]
+        self.nicknames = sorted({r["nickname"] for r in notes if r["nickname"]})
+        self.shop_names = sorted({r["shopName"] for r in accounts if r["shopName"]})
+
+        # kind -> 字段 -> (按区间下界排序的取值, 对应的样例频次)
+        self.values: Dict[str, Dict[str, Tuple[List[str], List[int]]]] = {}
+        for kind, rows in (("note", notes), ("account", accounts)):
+            per_field: Dict[str, Tuple[List[str], List[int]]] = {}
+            for field, _ in METRIC_FIELDS[kind]:
+                counts = Counter(r[field] for r in rows if r[field])
+                ordered = sorted(counts, key=lambda v: intervals.parse_interval(v)[0] or 0.0)
+                per_field[field] = (ordered, [counts[v] for v in ordered])
+            self.values[kind] = per_field
+
+
+_PROFILE: Optional[SampleProfile] = None
+
+
+def sample_profile() -> SampleProfile:
+    global _PROFILE
+    if _PROFILE is None:
+        _PROFILE = SampleProfile()
+    return _PROFILE
+
+
+def _format_fans(count: int) -> str:
+    # 与页面一致："90"、"1,007"、"1.30万"
+    if count >= 10000:
+        return f"{count / 10000:.2f}万"
+    return f"{count:,}"
+
+
+class _Item:
+    __slots__ = ("name", "nickname", "published", "fans", "levels", "rank")
+
+    def __init__(self, name: str, nickname: str, published: date, fans: int, levels: Dict[str, int]) -> None:
+        self.name = name
+        self.nickname = nickname
+        self.published = published
+        self.fans = fans
+        self.levels = levels
+        self.rank = 0.0
+
+
+class HistoryGenerator:
+    """按天生成一个榜单的合成历史（见模块说明）。"""
+
+    def __init__(
+        self,
+        kind: str,
+        rows_per_day: int,
+        seed: int = 0,
+        carry_over: float = 0.7,
+        drift: float = 0.15,
+        profile: Optional[SampleProfile] = None,
+    ) -> None:
+        if kind not in KINDS:
+            raise ValueError(f"未知的榜单类型: {kind}")
+        self.kind = kind
+        self.rows_per_day = max(1, rows_per_day)
+        self.carry_over = carry_over
+        self.drift = drift
+        self.profile = profile or sample_profile()
+        self.rng = random.Random(f"{kind}:{seed}")
+        self._serial = 0
+        self._names_in_use: set = set()
+        self._items: List[_Item] = []
+
+    def _title(self) -> str:
+        rng = self.rng
+        parts = rng.sample(self.profile.fragments, rng.choice((1, 2, 2, 3)))
+        title = parts[0]
+        for part in parts[1:]:
+            title += rng.choice(_SEPARATORS) + part
+        if rng.random() < 0.3:
+            title += rng.choice(self.profile.emojis)
+        return title
+
+    def _shop_name(self) -> str:
+        rng = self.rng
+        base = rng.choice(self.profile.shop_names)
+        return base if rng.random() < 0.5 else base + rng.choice(self.profile.fragments)[:4]
+
+    def _unique(self, name: str) -> str:
+        # 同一天内自然键（标题 + 昵称 / 店铺名）唯一，冲突时加序号
+        while name in self._names_in_use:
+            self._serial += 1
+            name = f"{name}（{self._serial}）"
+        self._names_in_use.add(name)
+        return name
+
+    def _new_item(self, fetch_date: date) -> _Item:
+        rng = self.rng
+        levels: Dict[str, int] = {}
+        for field, (values, weights) in self.profile.values[self.kind].items():
+            levels[field] = rng.choices(range(len(values)), weights=weights)[0]
+        if self.kind == "note":
+            name = self._unique(self._title())
+            nickname = rng.choice(self.profile.nicknames)
+        else:
+            name = self._unique(self._shop_name())
+            nickname = ""
+        published = fetch_date - timedelta(days=int(rng.expovariate(1 / 6)))
+        fans = int(rng.lognormvariate(7, 1.8))
+        return _Item(name, nickname, published, fans, levels)
+
+    def _drift(self, item: _Item) -> None:
+        rng = self.rng
+        for field, (values, _) in self.profile.values[self.kind].items():
+            if rng.random() < self.drift:
+                level = item.levels[field] + rng.choice((-1, 1))
+                item.levels[field] = min(len(values) - 1, max(0, level))
+        if self.kind == "account":
+            item.fans = max(0, int(item.fans * rng.uniform(0.98, 1.05)))
+
+    def day(self, fetch_date: date) -> List[Dict[str, str]]:
+        """生成一天的榜单行（按名次排序，扩展上报的 camelCase 字段）。"""
+        rng = self.rng
+        survivors = [item for item in self._items if rng.random() < self.carry_over]
+        self._names_in_use = {item.name for item in survivors}
+        for item in survivors:
+            self._drift(item)
+            # 名次扰动：旧名次加噪声后重新排序
+            item.rank += rng.gauss(0, self.rows_per_day * 0.1)
+        for _ in range(self.rows_per_day - len(survivors)):
+            item = self._new_item(fetch_date)
+            item.rank = rng.uniform(0, self.rows_per_day)
+            survivors.append(item)
+        survivors.sort(key=lambda it: it.rank)
+        for idx, item in enumerate(survivors):
+            item.rank = float(idx)
+        self._items = survivors
+        return [self._row(item, fetch_date) for item in survivors]
+
+    def _row(self, item: _Item, fetch_date: date) -> Dict[str, str]:
+        row: Dict[str, str] = {}
+        if self.kind == "note":
+            row["title"] = item.name
+            row["nickname"] = item.nickname
+            row["publishTime"] = item.published.isoformat()
+        else:
+            row["shopName"] = item.name
+            row["fansCount"] = _format_fans(item.fans)
+        for field, (values, _) in self.profile.values[self.kind].items():
+            row[field] = values[item.levels[field]]
+        row["fetchDate"] = fetch_date.isoformat()
+        return row
+
+
+def fetch_dates(days: int, start: date, gap_rate: float, rng: random.Random) -> List[date]:
+    """days 个采集日期：按天推进，以 gap_rate 概率跳过一天。"""
+    dates: List[date] = []
+    current = start
+    while len(dates) < days:
+        if not dates or rng.random() >= gap_rate:
+            dates.append(current)
+        current += timedelta(days=1)
+    return dates
+
+
+def generate_history(
+    kind: str,
+    rows: int,
+    days: int,
+    seed: int = 0,
+    start: date = date(2025, 1, 1),
+    carry_over: float = 0.7,
+    gap_rate: float = 0.05,
+) -> Iterator[Tuple[str, List[Dict[str, str]]]]:
+    """逐天产出 (fetch_date, 当天行)；总行数约为 rows（每天 rows // days 行）。"""
+    days = max(1, days)
+    generator = HistoryGenerator(kind, rows // days, seed=seed, carry_over=carry_over)
+    for day in fetch_dates(days, start, gap_rate, random.Random(f"dates:{seed}")):
+        yield day.isoformat(), generator.day(day)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="生成合成榜单历史（JSONL，可直接交给 import_history.py）")
+    parser.add_argument("output", help="输出 JSONL 文件路径")
+    parser.add_argument("--type", dest="kind", choices=KINDS, default="note")
+    parser.add_argument("--rows", type=int, default=10000, help="总行数（约）")
+    parser.add_argument("--days", type=int, default=30, help="采集天数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    written = 0
+    with open(args.output, "w", encoding="utf-8") as f:
+        for _, rows in generate_history(args.kind, args.rows, args.days, seed=args.seed):
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            written += len(rows)
+    print(f"已写入 {written} 行到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
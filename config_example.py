@@ -58,3 +58,35 @@ FIELD_MAPPING_ACCOUNT = {
 # ========= 4. 可选：本地 API 端口 =========
 
 API_PORT = 8000
+
+# 飞书后台上传线程数（/upload_* 接口只入队，由这些线程写入多维表）
+UPLOAD_WORKERS = 2
+
+# python serve.py 的并发参数：gunicorn 工作进程数、每个进程的请求线程数（waitress 只用线程数）
+SERVER_WORKERS = 2
+SERVER_THREADS = 8
+
+# ASGI 版本（python serve.py --server uvicorn）执行 SQLite 访问的线程数
+ASYNC_DB_THREADS = 8
+
+# 榜单读接口的响应缓存条目数（按接口 + 查询参数缓存，写入新数据后自动失效）
+RESPONSE_CACHE_SIZE = 256
+
+# 慢请求日志：耗时超过 SLOW_REQUEST_MS 毫秒的请求连同其 SQL 文本与参数追加到该文件（设为 None 只打印摘要）
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_LOG = "data/slow_requests.jsonl"
+
+# POST /db_only_ingest（NDJSON / gzip 流式写库）每次校验、写入的行数；整个请求仍是一个事务
+INGEST_CHUNK_SIZE = 1000
+
+# /ingest_*_rank 默认的写入端（sqlite / feishu / csv，可用 ?sinks= 覆盖）与 CSV 归档目录
+INGEST_SINKS = ["sqlite", "feishu"]
+CAPTURE_ARCHIVE_DIR = "data/archive"
+
+# 飞书开放平台地址（一般无需修改；本地压测可指向 python -m benchmarks.fake_feishu_server）
+# FEISHU_BASE_URL = "http://127.0.0.1:18080/open-apis"
+
+# 批量写入参数：每批记录数（上限 500）、并发批次数、令牌桶速率（次/秒，限流时自动降速）
+FEISHU_BATCH_SIZE = 500
+FEISHU_UPLOAD_CONCURRENCY = 4
+FEISHU_RATE_LIMIT = 10.0
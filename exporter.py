@@ -0,0 +1,246 @@
+"""导出编码：把行迭代器逐块编码成 CSV / JSONL / Parquet 字节流，供 /api/export 流式返回。
+
+所有编码函数都是生成器，一次只在内存中保留一个小块（CSV/JSONL 按行数攒批，
+Parquet 按 row group），结果集多大都不会整体读入内存。Parquet 依赖可选的 pyarrow。
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# format -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson; charset=utf-8", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _peek(rows: Iterable[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+    iterator = iter(rows)
+    first = next(iterator, None)
+    return first, iterator
+
+
+def csv_stream(
+    rows: Iterable[Dict[str, Any]], columns: Optional[List[str]] = None, flush_rows: int = 500
+) -> Iterator[bytes]:
+    """带 UTF-8 BOM 的 CSV（Excel 直接打开不乱码）；columns 为空时取第一行的字段。"""
+    first, rest = _peek(rows)
+    if columns is None:
+        columns = list(first) if first is not None else []
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    buffer.write("\ufeff")
+    if columns:
+        writer.writeheader()
+    pending = 0
+    for row in ([first] if first is not None else []):
+        writer.writerow(row)
+        pending += 1
+    for row in rest:
+        writer.writerow(row)
+        pending += 1
+        if pending >= flush_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+def jsonl_stream(rows: Iterable[Dict[str, Any]], flush_rows: int = 500) -> Iterator[bytes]:
+    """每行一个 JSON 对象（保留嵌套结构，如 rank_change 的 current / previous）。"""
+    chunk: List[str] = []
+    for row in rows:
+        chunk.append(json.dumps(row, ensure_ascii=False))
+        if len(chunk) >= flush_rows:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401  # type: ignore
+        import pyarrow.parquet  # noqa: F401  # type: ignore
+    except ImportError:
+        return False
+    return True
+
+
+class _ChunkSink:
+    """只追加的文件对象：ParquetWriter 写入的字节先攒着，由生成器取走。
+
+    tell() 返回累计写入量，Parquet footer 中记录的列块偏移因此保持正确。
+    """
+
+    closed = False
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data: Any) -> int:
+        raw = bytes(data)
+        self._chunks.append(raw)
+        self._position += len(raw)
+        return len(raw)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def readable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _value_type(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "BOOLEAN"
+    if isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    return "TEXT"
+
+
+def sample_types(rows: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """按全部行的取值得出每列的类型名（INTEGER / REAL / BOOLEAN / TEXT），用于已整体取出的结果。"""
+    types: Dict[str, str] = {}
+    for row in rows:
+        for name, value in row.items():
+            kind = _value_type(value)
+            if kind is None or types.get(name) in (kind, "TEXT"):
+                continue
+            if name not in types:
+                types[name] = kind
+            elif {types[name], kind} == {"INTEGER", "REAL"}:
+                types[name] = "REAL"
+            else:
+                types[name] = "TEXT"
+    return types
+
+
+def _arrow_type(declared: Optional[str], values: Iterable[Any]) -> Any:
+    """列的 Arrow 类型：优先按声明的类型名（SQLite 类型亲和规则），未声明时按取值推断。"""
+    import pyarrow as pa  # type: ignore
+
+    if declared is None:
+        declared = next((t for t in map(_value_type, values) if t is not None), "TEXT")
+    declared = declared.upper()
+    if declared == "BOOLEAN":
+        return pa.bool_()
+    if "INT" in declared:
+        return pa.int64()
+    if any(word in declared for word in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return pa.string()
+
+
+def _parquet_value(value: Any, as_text: bool) -> Any:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    if as_text and value is not None and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def parquet_stream(
+    rows: Iterable[Dict[str, Any]],
+    columns: Optional[List[str]] = None,
+    row_group_size: int = 5000,
+    types: Optional[Dict[str, str]] = None,
+) -> Iterator[bytes]:
+    """Parquet（需要 pyarrow）：每 row_group_size 行写一个 row group 并立即输出。
+
+    列类型取 types 中声明的类型名（如 PRAGMA table_info 的 INTEGER / REAL / TEXT），
+    未声明的列按第一个 row group 推断；文本列中的其他取值转成字符串，后续 row group
+    的取值不会与 schema 冲突（响应头发出后再出错只能截断文件）。嵌套值序列化为 JSON 文本。
+    """
+    types = types or {}
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    batch: List[Dict[str, Any]] = []
+
+    def write_batch() -> Iterator[bytes]:
+        nonlocal writer, schema
+        if schema is None:
+            names = columns or list(batch[0])
+            schema = pa.schema(
+                [(name, _arrow_type(types.get(name), (r.get(name) for r in batch))) for name in names]
+            )
+            writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+        data = {
+            field.name: [
+                _parquet_value(r.get(field.name), field.type == pa.string()) for r in batch
+            ]
+            for field in schema
+        }
+        writer.write_table(pa.Table.from_pydict(data, schema=schema))
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group_size:
+            yield from write_batch()
+            batch = []
+    if batch:
+        yield from write_batch()
+    elif writer is None and columns:
+        # 空结果也输出只有表头（schema）的文件
+        writer = pq.ParquetWriter(
+            pa.PythonFile(sink, mode="w"),
+            pa.schema([(name, _arrow_type(types.get(name), ())) for name in columns]),
+        )
+    if writer is not None:
+        writer.close()
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def flatten_rank_change(items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """把 rank_change 条目展开成扁平列（current_<指标> / previous_<指标> / <指标>_band_change），便于 CSV。"""
+    for item in items:
+        flat: Dict[str, Any] = {}
+        for key, value in item.items():
+            if key in ("current", "previous"):
+                for field, field_value in (value or {}).items():
+                    flat[f"{key}_{field}"] = field_value
+            elif key == "band_change":
+                for metric, change in (value or {}).items():
+                    flat[f"{metric}_band_change"] = change
+            else:
+                flat[key] = value
+        yield flat
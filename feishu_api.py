@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import gzip
+import itertools
+import json
+from datetime import date
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import IO, Any, Dict, Iterator, List, Tuple
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 
 from upload_to_feishu import upload_account_rows, upload_note_rows
+from upload_queue import UploadWorkerPool
+from response_cache import ResponseCache, cached_json
+import exporter
+import feishu_sync
+import ingest_pipeline
+import intervals
+import metrics
 import storage_sqlite
 
 try:
@@ -16,12 +28,69 @@ except ImportError:  # pragma: no cover - 运行时检查
 
 API_PORT: int = getattr(_cfg, "API_PORT", 8000) if _cfg is not None else 8000
 SQLITE_PATH: Path = Path(getattr(_cfg, "SQLITE_PATH", "data/xhs_rank.db"))
+UPLOAD_WORKERS: int = getattr(_cfg, "UPLOAD_WORKERS", 2) if _cfg is not None else 2
+RESPONSE_CACHE_SIZE: int = getattr(_cfg, "RESPONSE_CACHE_SIZE", 256) if _cfg is not None else 256
+SLOW_REQUEST_MS: float = getattr(_cfg, "SLOW_REQUEST_MS", 500) if _cfg is not None else 500
+SLOW_REQUEST_LOG: str | None = (
+    getattr(_cfg, "SLOW_REQUEST_LOG", "data/slow_requests.jsonl") if _cfg is not None else "data/slow_requests.jsonl"
+)
+INGEST_CHUNK_SIZE: int = getattr(_cfg, "INGEST_CHUNK_SIZE", 1000) if _cfg is not None else 1000
+INGEST_SINKS: List[str] = list(getattr(_cfg, "INGEST_SINKS", ["sqlite", "feishu"])) if _cfg is not None else ["sqlite", "feishu"]
+CAPTURE_ARCHIVE_DIR: str = getattr(_cfg, "CAPTURE_ARCHIVE_DIR", "data/archive") if _cfg is not None else "data/archive"
 
 app = Flask(__name__)
 
 # 初始化本地 SQLite（作为主数据仓库）
 storage_sqlite.init_db_if_needed(SQLITE_PATH)
 
+# 飞书上传走后台任务队列：接口立即返回 job_id，工作线程在首次提交任务或服务启动时开始运行
+upload_workers = UploadWorkerPool(
+    SQLITE_PATH,
+    {
+        "note": upload_note_rows,
+        "account": upload_account_rows,
+        # 增量同步任务（POST /feishu_sync）：不带行数据，按水位从库中取变化的行
+        "note_sync": partial(feishu_sync.sync_job, "note"),
+        "account_sync": partial(feishu_sync.sync_job, "account"),
+    },
+    workers=UPLOAD_WORKERS,
+)
+
+
+# /ingest_*_rank 的写入端在线程池中并行执行
+fan_out = ingest_pipeline.FanOut()
+
+# 榜单读接口的响应缓存：键中带数据版本号，insert_*_rows 写入后旧响应自动失效
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE)
+cached_by_data_version = cached_json(
+    response_cache, lambda: storage_sqlite.get_data_version(SQLITE_PATH)
+)
+
+
+# 请求耗时 / SQL / 各阶段指标（GET /metrics），超过 SLOW_REQUEST_MS 的请求写入慢请求日志
+metrics.configure_slow_log(SLOW_REQUEST_MS, Path(SLOW_REQUEST_LOG) if SLOW_REQUEST_LOG else None)
+
+
+def _collect_cache_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    stats = response_cache.stats()
+    families = [
+        (f"xhs_response_cache_{name}_total", "counter", f"Response cache {name.replace('_', ' ')}.", [({}, stats[name])])
+        for name in ("hits", "misses", "not_modified", "evictions")
+    ]
+    families.append(("xhs_response_cache_entries", "gauge", "Cached responses.", [({}, stats["entries"])]))
+    families.append(("xhs_response_cache_bytes", "gauge", "Bytes held by the response cache.", [({}, stats["bytes"])]))
+    return families
+
+
+def _collect_upload_job_metrics() -> List[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]:
+    counts = storage_sqlite.count_upload_jobs(SQLITE_PATH)
+    samples = [({"status": status}, count) for status, count in sorted(counts.items())]
+    return [("xhs_upload_jobs", "gauge", "Upload jobs by status.", samples)]
+
+
+metrics.REGISTRY.register_collector(_collect_cache_metrics)
+metrics.REGISTRY.register_collector(_collect_upload_job_metrics)
+
 
 def _validate_rows(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
     if not isinstance(payload, dict):
@@ -41,6 +110,42 @@ def _validate_rows(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
     return normalized
 
 
+def _read_lines(stream: IO[bytes], block_size: int = 64 * 1024) -> Iterator[bytes]:
+    # 按块读取再切行：请求流（werkzeug LimitedStream）逐行读取时是一次一个字节
+    pending = b""
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _iter_ndjson_rows(stream: IO[bytes], gzipped: bool) -> Iterator[Dict[str, Any]]:
+    """边读边解析 NDJSON 请求体（可 gzip 压缩）：每行一个榜单行对象，空行跳过。"""
+    source: IO[bytes] = gzip.GzipFile(fileobj=stream, mode="rb") if gzipped else stream
+    lineno = 0
+    try:
+        for line in _read_lines(source):
+            lineno += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as exc:
+                raise ValueError(f"第 {lineno} 行不是合法 JSON：{exc}") from exc
+            if not isinstance(item, dict):
+                raise ValueError(f"第 {lineno} 行必须是对象")
+            yield item
+    except (OSError, EOFError) as exc:
+        # gzip 头错误（BadGzipFile 是 OSError）或数据被截断
+        raise ValueError(f"gzip 数据损坏或不完整（第 {lineno} 行附近）：{exc}") from exc
+
+
 def _parse_page(param: str | None, default: int = 1) -> int:
     try:
         value = int(param) if param is not None else default
@@ -58,14 +163,58 @@ def _parse_page_size(param: str | None, default: int = 20, max_size: int = 200)
         return default
 
 
+def _parse_band_filters(args: Any, band_metrics: List[str]) -> Dict[str, Tuple[int | None, int | None]]:
+    """读取 `<metric>_band_min` / `<metric>_band_max` 查询参数（档位编码，闭区间）。
+
+    也接受区间文本（如 `read_count_band_min=1万-3万`），按入库时相同的规则换算成档位编码。
+    """
+    filters: Dict[str, Tuple[int | None, int | None]] = {}
+    for metric in band_metrics:
+        bounds: List[int | None] = []
+        for suffix in ("min", "max"):
+            raw = args.get(f"{metric}_band_{suffix}")
+            try:
+                bounds.append(int(raw) if raw not in (None, "") else None)
+            except ValueError:
+                bounds.append(intervals.parse_band(metric, raw)[0])
+        if bounds[0] is not None or bounds[1] is not None:
+            filters[metric] = (bounds[0], bounds[1])
+    return filters
+
+
+def _parse_total_mode(param: str | None, default: str) -> str:
+    value = (param or "").strip().lower()
+    return value if value in storage_sqlite.TOTAL_MODES else default
+
+
+@app.before_request
+def _begin_request_metrics() -> None:
+    g.request_metrics = metrics.begin_request(
+        request.method, request.path, request.query_string.decode("utf-8", "replace")
+    )
+
+
+@app.after_request
+def _end_request_metrics(response):
+    handle = g.pop("request_metrics", None)
+    if handle is not None:
+        # 用路由模板作标签（/api/upload_jobs/<job_id>），避免每个 id 一个时间序列；
+        # 流式导出只计到响应头生成为止
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        metrics.end_request(handle, route, response.status_code)
+    return response
+
+
 @app.after_request
 def _add_cors_headers(response):
     # 允许来自网页（https://ark.xiaohongshu.com）和扩展的跨域访问本地接口
     response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Content-Encoding"
     response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
     # 兼容 Chrome 私有网络访问限制
     response.headers["Access-Control-Allow-Private-Network"] = "true"
+    # 让前端能读取缓存校验头（浏览器自身的条件请求不受影响）
+    response.headers["Access-Control-Expose-Headers"] = "ETag, Last-Modified"
     return response
 
 
@@ -75,14 +224,21 @@ def upload_note_rank() -> Any:
         # 预检请求，直接返回即可
         return ("", 204)
     try:
-        payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
+        with metrics.phase("request.json_parse"):
+            payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
     except Exception:
         return jsonify({"ok": False, "error": "请求体不是合法 JSON"}), 400
 
     try:
-        rows = _validate_rows(payload)  # type: ignore[arg-type]
-        feishu_uploaded = upload_note_rows(rows)  # type: ignore[arg-type]
-        return jsonify({"ok": True, "uploaded": feishu_uploaded})
+        with metrics.phase("request.validate"):
+            rows = _validate_rows(payload)  # type: ignore[arg-type]
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    try:
+        with metrics.phase("db.enqueue_upload"):
+            job_id = upload_workers.submit("note", rows)
+        return jsonify({"ok": True, "job_id": job_id, "status": "pending", "rows": len(rows)}), 202
     except Exception as exc:  # pragma: no cover - 主要用于运行时日志
         return jsonify({"ok": False, "error": str(exc)}), 500
 
@@ -92,14 +248,109 @@ def upload_account_rank() -> Any:
     if request.method == "OPTIONS":
         return ("", 204)
     try:
-        payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
+        with metrics.phase("request.json_parse"):
+            payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
     except Exception:
         return jsonify({"ok": False, "error": "请求体不是合法 JSON"}), 400
 
     try:
-        rows = _validate_rows(payload)  # type: ignore[arg-type]
-        feishu_uploaded = upload_account_rows(rows)  # type: ignore[arg-type]
-        return jsonify({"ok": True, "uploaded": feishu_uploaded})
+        with metrics.phase("request.validate"):
+            rows = _validate_rows(payload)  # type: ignore[arg-type]
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    try:
+        with metrics.phase("db.enqueue_upload"):
+            job_id = upload_workers.submit("account", rows)
+        return jsonify({"ok": True, "job_id": job_id, "status": "pending", "rows": len(rows)}), 202
+    except Exception as exc:  # pragma: no cover - 主要用于运行时日志
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+def _build_sinks(names: List[str]) -> List[ingest_pipeline.Sink]:
+    sinks: List[ingest_pipeline.Sink] = []
+    for name in names:
+        if name == "sqlite":
+            sinks.append(ingest_pipeline.SqliteSink(SQLITE_PATH))
+        elif name == "feishu":
+            sinks.append(ingest_pipeline.FeishuSink(upload_workers))
+        elif name == "csv":
+            sinks.append(ingest_pipeline.CsvArchiveSink(Path(CAPTURE_ARCHIVE_DIR)))
+        else:
+            raise ValueError(f"未知的写入端: {name}（可选 {' / '.join(ingest_pipeline.SINK_NAMES)}）")
+    if not sinks:
+        raise ValueError("至少需要一个写入端")
+    return sinks
+
+
+def _ingest(kind: str) -> Any:
+    """一次请求写入多个写入端：校验、归一化各一次，写入端并行执行。
+
+    返回每个写入端的结果（sinks），并沿用 db_only_* / upload_* 的字段（inserted / job_id 等）。
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+    try:
+        with metrics.phase("request.json_parse"):
+            payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
+    except Exception:
+        return jsonify({"ok": False, "error": "请求体不是合法 JSON"}), 400
+
+    raw_sinks = request.args.get("sinks")
+    names = (
+        [name.strip().lower() for name in raw_sinks.split(",") if name.strip()]
+        if raw_sinks is not None
+        else INGEST_SINKS
+    )
+    try:
+        sinks = _build_sinks(names)
+        with metrics.phase("request.validate"):
+            rows = _validate_rows(payload)  # type: ignore[arg-type]
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+
+    with metrics.phase("request.normalize"):
+        capture = ingest_pipeline.Capture(kind, rows)
+    results = fan_out.run(capture, sinks)
+
+    body: Dict[str, Any] = {"ok": all(r["ok"] for r in results.values()), "rows": len(rows), "sinks": results}
+    sqlite_result = results.get("sqlite", {})
+    if sqlite_result.get("ok"):
+        body.update({name: sqlite_result[name] for name in ("inserted", "updated", "unchanged")})
+    feishu_result = results.get("feishu", {})
+    if feishu_result.get("ok"):
+        body.update(job_id=feishu_result["job_id"], status=feishu_result["status"])
+    if not body["ok"]:
+        body["error"] = "；".join(f"{name}: {r['error']}" for name, r in results.items() if not r["ok"])
+        return jsonify(body), 500
+    return jsonify(body), 202 if "job_id" in body else 200
+
+
+@app.route("/ingest_note_rank", methods=["POST", "OPTIONS"])
+def ingest_note_rank() -> Any:
+    return _ingest("note")
+
+
+@app.route("/ingest_account_rank", methods=["POST", "OPTIONS"])
+def ingest_account_rank() -> Any:
+    return _ingest("account")
+
+
+@app.route("/feishu_sync", methods=["POST", "OPTIONS"])
+def feishu_sync_route() -> Any:
+    """提交增量同步任务：?type=note|account|all（默认 all），每个榜单一个任务，返回 job_id。"""
+    if request.method == "OPTIONS":
+        return ("", 204)
+    kind = (request.args.get("type") or "all").strip().lower()
+    if kind not in (*feishu_sync.KINDS, "all"):
+        return jsonify({"ok": False, "error": "type 只能是 note / account / all"}), 400
+    try:
+        with metrics.phase("db.enqueue_upload"):
+            jobs = {
+                name: upload_workers.submit(f"{name}_sync", [])
+                for name in (feishu_sync.KINDS if kind == "all" else (kind,))
+            }
+        return jsonify({"ok": True, "jobs": jobs, "status": "pending"}), 202
     except Exception as exc:  # pragma: no cover - 主要用于运行时日志
         return jsonify({"ok": False, "error": str(exc)}), 500
 
@@ -109,14 +360,17 @@ def db_only_note_rank() -> Any:
     if request.method == "OPTIONS":
         return ("", 204)
     try:
-        payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
+        with metrics.phase("request.json_parse"):
+            payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
     except Exception:
         return jsonify({"ok": False, "error": "请求体不是合法 JSON"}), 400
 
     try:
-        rows = _validate_rows(payload)  # type: ignore[arg-type]
-        inserted = storage_sqlite.insert_note_rows(rows, SQLITE_PATH)
-        return jsonify({"ok": True, "inserted": inserted})
+        with metrics.phase("request.validate"):
+            rows = _validate_rows(payload)  # type: ignore[arg-type]
+        with metrics.phase("db.insert_rows"):
+            counts = storage_sqlite.insert_note_rows(rows, SQLITE_PATH)
+        return jsonify({"ok": True, **counts})
     except Exception as exc:
         return jsonify({"ok": False, "error": str(exc)}), 500
 
@@ -126,25 +380,77 @@ def db_only_account_rank() -> Any:
     if request.method == "OPTIONS":
         return ("", 204)
     try:
-        payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
+        with metrics.phase("request.json_parse"):
+            payload = request.get_json(force=True, silent=False)  # type: ignore[assignment]
     except Exception:
         return jsonify({"ok": False, "error": "请求体不是合法 JSON"}), 400
 
     try:
-        rows = _validate_rows(payload)  # type: ignore[arg-type]
-        inserted = storage_sqlite.insert_account_rows(rows, SQLITE_PATH)
-        return jsonify({"ok": True, "inserted": inserted})
+        with metrics.phase("request.validate"):
+            rows = _validate_rows(payload)  # type: ignore[arg-type]
+        with metrics.phase("db.insert_rows"):
+            counts = storage_sqlite.insert_account_rows(rows, SQLITE_PATH)
+        return jsonify({"ok": True, **counts})
+    except Exception as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+@app.route("/db_only_ingest", methods=["POST", "OPTIONS"])
+def db_only_ingest() -> Any:
+    """流式写库：请求体为 NDJSON（Content-Encoding: gzip 时先解压），type=note|account。
+
+    边读边解析，按 INGEST_CHUNK_SIZE 行分块校验、写入，整个请求一个事务：内存占用与
+    请求体大小无关，任何一行出错都整体回滚。适合回放扩展多天的采集记录。
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
+    kind = (request.args.get("type") or "").strip().lower()
+    if kind not in ("note", "account"):
+        return jsonify({"ok": False, "error": "type 参数必须为 note 或 account"}), 400
+    gzipped = (request.headers.get("Content-Encoding") or "").strip().lower() == "gzip"
+
+    try:
+        with metrics.phase("db.ingest_stream"):
+            counts = storage_sqlite.ingest_rows(
+                kind, _iter_ndjson_rows(request.stream, gzipped), SQLITE_PATH, chunk_size=INGEST_CHUNK_SIZE
+            )
+        return jsonify({"ok": True, "rows": sum(counts.values()), **counts})
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
     except Exception as exc:
         return jsonify({"ok": False, "error": str(exc)}), 500
 
 
 @app.route("/api/note_rank", methods=["GET"])
+@cached_by_data_version
 def api_note_rank() -> Any:
     page = _parse_page(request.args.get("page"))
     page_size = _parse_page_size(request.args.get("page_size"))
     q = request.args.get("q") or None
     fetch_date_from = request.args.get("fetch_date_from") or None
     fetch_date_to = request.args.get("fetch_date_to") or None
+    band_filters = _parse_band_filters(request.args, storage_sqlite.NOTE_BAND_METRICS)
+
+    # 携带 cursor 参数（首页传空字符串）时走游标分页，深翻页与首页代价一致
+    if "cursor" in request.args:
+        try:
+            items, next_cursor, total = storage_sqlite.list_note_rows_by_cursor(
+                SQLITE_PATH,
+                q=q,
+                fetch_date_from=fetch_date_from,
+                fetch_date_to=fetch_date_to,
+                cursor=request.args.get("cursor") or None,
+                page_size=page_size,
+                band_filters=band_filters,
+                total_mode=_parse_total_mode(request.args.get("total"), "approx"),
+            )
+        except ValueError as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 400
+        except Exception as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 500
+        return jsonify(
+            {"ok": True, "data": {"items": items, "total": total, "next_cursor": next_cursor}}
+        )
 
     try:
         items, total = storage_sqlite.list_note_rows(
@@ -154,6 +460,9 @@ def api_note_rank() -> Any:
             fetch_date_to=fetch_date_to,
             page=page,
             page_size=page_size,
+            band_filters=band_filters,
+            order_by=request.args.get("order_by") or "fetch_date",
+            order=request.args.get("order") or "desc",
         )
         return jsonify({"ok": True, "data": {"items": items, "total": total}})
     except Exception as exc:
@@ -161,12 +470,35 @@ def api_note_rank() -> Any:
 
 
 @app.route("/api/account_rank", methods=["GET"])
+@cached_by_data_version
 def api_account_rank() -> Any:
     page = _parse_page(request.args.get("page"))
     page_size = _parse_page_size(request.args.get("page_size"))
     q = request.args.get("q") or None
     fetch_date_from = request.args.get("fetch_date_from") or None
     fetch_date_to = request.args.get("fetch_date_to") or None
+    band_filters = _parse_band_filters(request.args, storage_sqlite.ACCOUNT_BAND_METRICS)
+
+    # 携带 cursor 参数（首页传空字符串）时走游标分页，深翻页与首页代价一致
+    if "cursor" in request.args:
+        try:
+            items, next_cursor, total = storage_sqlite.list_account_rows_by_cursor(
+                SQLITE_PATH,
+                q=q,
+                fetch_date_from=fetch_date_from,
+                fetch_date_to=fetch_date_to,
+                cursor=request.args.get("cursor") or None,
+                page_size=page_size,
+                band_filters=band_filters,
+                total_mode=_parse_total_mode(request.args.get("total"), "approx"),
+            )
+        except ValueError as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 400
+        except Exception as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 500
+        return jsonify(
+            {"ok": True, "data": {"items": items, "total": total, "next_cursor": next_cursor}}
+        )
 
     try:
         items, total = storage_sqlite.list_account_rows(
@@ -176,6 +508,9 @@ def api_account_rank() -> Any:
             fetch_date_to=fetch_date_to,
             page=page,
             page_size=page_size,
+            band_filters=band_filters,
+            order_by=request.args.get("order_by") or "fetch_date",
+            order=request.args.get("order") or "desc",
         )
         return jsonify({"ok": True, "data": {"items": items, "total": total}})
     except Exception as exc:
@@ -192,6 +527,26 @@ def api_audit_log() -> Any:
     created_from = request.args.get("created_from") or None
     created_to = request.args.get("created_to") or None
 
+    if "cursor" in request.args:
+        try:
+            items, next_cursor, total = storage_sqlite.list_audit_logs_by_cursor(
+                SQLITE_PATH,
+                action=action,
+                detail_q=detail_q,
+                created_from=created_from,
+                created_to=created_to,
+                cursor=request.args.get("cursor") or None,
+                page_size=page_size,
+                total_mode=_parse_total_mode(request.args.get("total"), "approx"),
+            )
+        except ValueError as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 400
+        except Exception as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 500
+        return jsonify(
+            {"ok": True, "data": {"items": items, "total": total, "next_cursor": next_cursor}}
+        )
+
     try:
         items, total = storage_sqlite.list_audit_logs(
             SQLITE_PATH,
@@ -208,16 +563,25 @@ def api_audit_log() -> Any:
 
 
 @app.route("/api/rank_change", methods=["GET"])
+@cached_by_data_version
 def api_rank_change() -> Any:
     view_type = request.args.get("type", "note").strip().lower()
     if view_type not in {"note", "account"}:
         return jsonify({"ok": False, "error": "type 参数必须为 note 或 account"}), 400
 
+    # 不传日期时对比最新两天；可指定任意两天，或只给 current_date（与其前一天对比）
+    current_date = request.args.get("current_date") or None
+    previous_date = request.args.get("previous_date") or None
+
     try:
         if view_type == "note":
-            current_date, previous_date, items = storage_sqlite.get_note_rank_changes(SQLITE_PATH)
+            current_date, previous_date, items = storage_sqlite.get_note_rank_changes(
+                SQLITE_PATH, current_date, previous_date
+            )
         else:
-            current_date, previous_date, items = storage_sqlite.get_account_rank_changes(SQLITE_PATH)
+            current_date, previous_date, items = storage_sqlite.get_account_rank_changes(
+                SQLITE_PATH, current_date, previous_date
+            )
 
         return jsonify(
             {
@@ -229,10 +593,217 @@ def api_rank_change() -> Any:
                 },
             }
         )
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
     except Exception as exc:
         return jsonify({"ok": False, "error": str(exc)}), 500
 
 
+@app.route("/api/rank_trajectory", methods=["GET"])
+@cached_by_data_version
+def api_rank_trajectory() -> Any:
+    view_type = request.args.get("type", "note").strip().lower()
+    if view_type not in {"note", "account"}:
+        return jsonify({"ok": False, "error": "type 参数必须为 note 或 account"}), 400
+
+    days = _parse_page_size(request.args.get("days"), default=7, max_size=365)
+    limit_param = request.args.get("limit")
+    limit = _parse_page_size(limit_param, default=200, max_size=1000) if limit_param else None
+    keys = request.args.getlist("key") or None
+
+    try:
+        dates, items = storage_sqlite.get_rank_trajectory(
+            SQLITE_PATH,
+            kind=view_type,
+            days=days,
+            end_date=request.args.get("end_date") or None,
+            keys=keys,
+            limit=limit,
+        )
+        return jsonify({"ok": True, "data": {"dates": dates, "items": items}})
+    except Exception as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+def _band_stat_args() -> Tuple[str, List[str], int, str | None]:
+    view_type = request.args.get("type", "note").strip().lower()
+    if view_type not in {"note", "account"}:
+        raise ValueError("type 参数必须为 note 或 account")
+    days = _parse_page_size(request.args.get("days"), default=7, max_size=365)
+    return view_type, request.args.getlist("metric"), days, request.args.get("end_date") or None
+
+
+@app.route("/api/band_distribution", methods=["GET"])
+@cached_by_data_version
+def api_band_distribution() -> Any:
+    try:
+        view_type, band_metrics, days, end_date = _band_stat_args()
+        data = storage_sqlite.get_band_distribution(
+            SQLITE_PATH, kind=view_type, metrics=band_metrics, days=days, end_date=end_date
+        )
+        return jsonify({"ok": True, "data": data})
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+    except Exception as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+@app.route("/api/band_transitions", methods=["GET"])
+@cached_by_data_version
+def api_band_transitions() -> Any:
+    try:
+        view_type, band_metrics, days, end_date = _band_stat_args()
+        data = storage_sqlite.get_band_transitions(
+            SQLITE_PATH, kind=view_type, metrics=band_metrics, days=days, end_date=end_date
+        )
+        return jsonify({"ok": True, "data": data})
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+    except Exception as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+EXPORT_TABLES = ("note_rank", "account_rank", "audit_log", "rank_change")
+
+
+def _export_rows(table: str, args: Any) -> Tuple[Any, List[str] | None]:
+    """按与列表接口相同的筛选参数返回 (行迭代器, 表头)；表头为 None 时取第一行的字段。"""
+    if table in ("note_rank", "account_rank"):
+        band_metrics = (
+            storage_sqlite.NOTE_BAND_METRICS if table == "note_rank" else storage_sqlite.ACCOUNT_BAND_METRICS
+        )
+        iterate = storage_sqlite.iter_note_rows if table == "note_rank" else storage_sqlite.iter_account_rows
+        rows = iterate(
+            SQLITE_PATH,
+            q=args.get("q") or None,
+            fetch_date_from=args.get("fetch_date_from") or None,
+            fetch_date_to=args.get("fetch_date_to") or None,
+            band_filters=_parse_band_filters(args, band_metrics),
+            order_by=args.get("order_by") or "fetch_date",
+            order=args.get("order") or "desc",
+        )
+        return rows, storage_sqlite.table_columns(SQLITE_PATH, table) + ["rank"]
+
+    if table == "audit_log":
+        rows = storage_sqlite.iter_audit_logs(
+            SQLITE_PATH,
+            action=args.get("action") or None,
+            detail_q=args.get("detail_q") or None,
+            created_from=args.get("created_from") or None,
+            created_to=args.get("created_to") or None,
+        )
+        return rows, storage_sqlite.table_columns(SQLITE_PATH, "audit_log")
+
+    # rank_change：两天的对比结果本身有界（约一天的榜单行数），一次取出
+    view_type = (args.get("type") or "note").strip().lower()
+    if view_type not in {"note", "account"}:
+        raise ValueError("type 参数必须为 note 或 account")
+    read_changes = (
+        storage_sqlite.get_note_rank_changes if view_type == "note" else storage_sqlite.get_account_rank_changes
+    )
+    _, _, items = read_changes(
+        SQLITE_PATH, args.get("current_date") or None, args.get("previous_date") or None
+    )
+    return iter(items), None
+
+
+@app.route("/api/export", methods=["GET"])
+def api_export() -> Any:
+    """流式导出当前筛选结果：table=note_rank|account_rank|audit_log|rank_change，format=csv|jsonl|parquet。
+
+    行通过服务端游标逐批读取并边编码边返回，内存占用与结果集大小无关。
+    """
+    table = (request.args.get("table") or "note_rank").strip().lower()
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if table not in EXPORT_TABLES:
+        return jsonify({"ok": False, "error": f"table 参数必须为 {' / '.join(EXPORT_TABLES)}"}), 400
+    if fmt not in exporter.EXPORT_FORMATS:
+        return jsonify({"ok": False, "error": "format 参数必须为 csv / jsonl / parquet"}), 400
+    if fmt == "parquet" and not exporter.parquet_available():
+        return jsonify({"ok": False, "error": "导出 Parquet 需要安装 pyarrow"}), 400
+
+    try:
+        rows, columns = _export_rows(table, request.args)
+        # 先取出第一行：查询错误在开始输出前就能以 JSON 返回
+        first = next(rows, None)
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+    except Exception as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 500
+    rows = itertools.chain([first], rows) if first is not None else iter(())
+
+    if table == "rank_change" and fmt != "jsonl":
+        # 新上榜条目没有 previous_* 字段：表头取所有行字段的并集
+        flat = list(exporter.flatten_rank_change(rows))
+        columns = list(dict.fromkeys(key for item in flat for key in item))
+        rows = iter(flat)
+    if fmt == "csv":
+        body = exporter.csv_stream(rows, columns)
+    elif fmt == "jsonl":
+        body = exporter.jsonl_stream(rows)
+    else:
+        # 列类型按声明类型确定，不靠首个 row group 的取值推断（前几千行全为空的列后面可能有整数）
+        if table == "rank_change":
+            types = exporter.sample_types(flat)
+        else:
+            types = {**storage_sqlite.table_column_types(SQLITE_PATH, table), "rank": "INTEGER"}
+        body = exporter.parquet_stream(rows, columns, types=types)
+
+    mimetype, extension = exporter.EXPORT_FORMATS[fmt]
+    filename = f"xhs_{table}_{date.today().strftime('%Y%m%d')}.{extension}"
+    return Response(
+        body,
+        content_type=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.route("/api/upload_jobs", methods=["GET"])
+def api_upload_jobs() -> Any:
+    page = _parse_page(request.args.get("page"))
+    page_size = _parse_page_size(request.args.get("page_size"))
+    status = request.args.get("status") or None
+    if status is not None and status not in storage_sqlite.UPLOAD_JOB_STATUSES:
+        return jsonify({"ok": False, "error": "status 参数无效"}), 400
+
+    try:
+        items, total = storage_sqlite.list_upload_jobs(
+            SQLITE_PATH,
+            status=status,
+            kind=request.args.get("type") or None,
+            page=page,
+            page_size=page_size,
+        )
+        return jsonify({"ok": True, "data": {"items": items, "total": total}})
+    except Exception as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 500
+
+
+@app.route("/api/upload_jobs/<job_id>", methods=["GET"])
+def api_upload_job(job_id: str) -> Any:
+    job = storage_sqlite.get_upload_job(job_id, SQLITE_PATH)
+    if job is None:
+        return jsonify({"ok": False, "error": "任务不存在"}), 404
+    return jsonify({"ok": True, "data": job})
+
+
+@app.route("/api/upload_jobs/<job_id>/retry", methods=["POST", "OPTIONS"])
+def api_upload_job_retry(job_id: str) -> Any:
+    if request.method == "OPTIONS":
+        return ("", 204)
+    if not storage_sqlite.retry_upload_job(job_id, SQLITE_PATH):
+        return jsonify({"ok": False, "error": "只有失败的任务可以重试"}), 409
+    upload_workers.notify()
+    return jsonify({"ok": True, "job_id": job_id, "status": "pending"})
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics() -> Any:
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 if __name__ == "__main__":
+    # 启动时即运行上传线程，继续处理上次退出时未完成的任务
+    upload_workers.start()
     # 仅在本机使用，不开启对外访问
     app.run(host="127.0.0.1", port=API_PORT)
@@ -0,0 +1,302 @@
+"""feishu_api 的 ASGI 版本：一个进程、一个事件循环承载大量并发的扩展上报与看板查询。
+
+- 路由与 feishu_api.py 完全一致：每个请求的正文先在事件循环里读完，再把 Flask 视图
+  放到专用的 SQLite 执行器（固定线程数）中运行，响应按块回写。慢客户端上传 / 下载时
+  只占用协程，不占线程；执行器排满时请求在事件循环里排队，不会耗尽线程。
+- 流式写库接口（STREAMING_PATHS，如 /db_only_ingest）例外：正文经有界队列边收边交给
+  执行器中的视图，内存占用与请求体大小无关；代价是接收正文期间占用一个执行器线程。
+- 飞书上传由 AsyncUploadWorkerPool 在事件循环中执行，token 与 batch_create 请求走
+  httpx 异步客户端（AsyncFeishuClient），在途上传不占线程；检查点 / 进度写库同样经执行器。
+
+依赖 httpx 与任意 ASGI 服务器（推荐 uvicorn），均为可选依赖：
+
+    pip install httpx uvicorn
+    python serve.py --server uvicorn
+    # 或：uvicorn feishu_api_async:app --host 127.0.0.1 --port 8000
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import feishu_api
+import feishu_sync
+import upload_to_feishu
+from upload_queue import AsyncUploadWorkerPool
+
+try:
+    import config_local as _cfg  # type: ignore
+except ImportError:  # pragma: no cover - 运行时检查
+    _cfg = None  # type: ignore
+
+# 执行 Flask 视图（SQLite 查询 / 写入）的线程数；读连接池默认 4 个，再多只会排队
+ASYNC_DB_THREADS: int = getattr(_cfg, "ASYNC_DB_THREADS", 8) if _cfg is not None else 8
+
+# 请求体边收边读的路由；正文在事件循环与执行器之间最多缓冲 BODY_QUEUE_CHUNKS 块
+STREAMING_PATHS = frozenset({"/db_only_ingest"})
+BODY_QUEUE_CHUNKS = 16
+
+_DISCONNECTED = object()
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Any]
+Send = Callable[[Dict[str, Any]], Any]
+
+
+class _BodyStream(io.RawIOBase):
+    """执行器线程中读取的请求体：事件循环把 receive() 收到的块放进有界队列，这里逐块取出。"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: "asyncio.Queue[Any]") -> None:
+        self._loop = loop
+        self._queue = queue
+        self._pending = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while not self._pending:
+            if self._eof:
+                return 0
+            chunk = asyncio.run_coroutine_threadsafe(self._queue.get(), self._loop).result()
+            if chunk is _DISCONNECTED:
+                raise ConnectionError("客户端在请求体发送完之前断开")
+            if chunk is None:
+                self._eof = True
+                return 0
+            self._pending = chunk
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _wsgi_environ(scope: Scope, body: IO[bytes], content_length: Optional[int]) -> Dict[str, Any]:
+    """由 ASGI scope 与请求体构造 WSGI environ（PEP 3333：路径按 latin-1 解码）。
+
+    content_length 为 None 表示流式正文：沿用请求头里的 Content-Length，没有时（分块传输）
+    标记 wsgi.input_terminated，由 Flask 读到流结束为止。
+    """
+    server = scope.get("server") or ("127.0.0.1", feishu_api.API_PORT)
+    client = scope.get("client") or ("", 0)
+    raw_path = scope.get("raw_path") or scope["path"].encode("utf-8")
+    environ: Dict[str, Any] = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": raw_path.split(b"?", 1)[0].decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": content_length is None,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            if content_length is None:
+                environ["CONTENT_LENGTH"] = value
+                environ["wsgi.input_terminated"] = False
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if content_length is not None:
+        environ["CONTENT_LENGTH"] = str(content_length)
+    return environ
+
+
+def _call_wsgi(
+    environ: Dict[str, Any],
+) -> Tuple[int, List[Tuple[bytes, bytes]], List[bytes], Optional["_ClosingIterator"]]:
+    """在执行器中运行 Flask 应用，返回 (状态码, 响应头, 已生成的正文块, 剩余正文)。
+
+    先取前两块：JSON 接口只有一块，整个响应一次调度即可完成（剩余正文为 None）；
+    流式导出则返回剩余部分的迭代器，由调用方逐块在执行器中取出。
+    """
+    captured: Dict[str, Any] = {}
+    written: List[bytes] = []
+
+    def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> Callable:
+        captured["status"] = int(status.split(" ", 1)[0])
+        captured["headers"] = [
+            (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+        ]
+        return written.append
+
+    result = feishu_api.app(environ, start_response)
+    rest = _ClosingIterator(result)
+    chunks: List[bytes] = []
+    for _ in range(2):
+        chunk = rest.next_chunk()
+        if chunk is None:
+            rest.close()
+            return captured["status"], captured["headers"], written + chunks, None
+        chunks.append(chunk)
+    return captured["status"], captured["headers"], written + chunks, rest
+
+
+class _ClosingIterator:
+    """WSGI 正文迭代器；发送完（或客户端断开）后在执行器里调用结果对象的 close()。"""
+
+    def __init__(self, result: Iterable[bytes]) -> None:
+        self.result = result
+        self.iterator: Iterator[bytes] = iter(result)
+
+    def next_chunk(self) -> Optional[bytes]:
+        return next(self.iterator, None)
+
+    def close(self) -> None:
+        close = getattr(self.result, "close", None)
+        if close is not None:
+            close()
+
+
+class AsyncAPI:
+    """ASGI 应用：http 请求转给执行器中的 Flask 视图，lifespan 中启停异步上传任务。"""
+
+    def __init__(self, db_threads: int = ASYNC_DB_THREADS) -> None:
+        self.db_threads = max(1, db_threads)
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.feishu: Optional[upload_to_feishu.AsyncFeishuClient] = None
+        self.upload_workers: Optional[AsyncUploadWorkerPool] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    # ---- 生命周期 ----
+
+    async def startup(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=self.db_threads, thread_name_prefix="sqlite")
+        self.feishu = upload_to_feishu.new_async_client()
+        self.upload_workers = AsyncUploadWorkerPool(
+            feishu_api.SQLITE_PATH,
+            {
+                "note": partial(upload_to_feishu.upload_note_rows_async, self.feishu),
+                "account": partial(upload_to_feishu.upload_account_rows_async, self.feishu),
+                "note_sync": partial(feishu_sync.sync_job_async, "note"),
+                "account_sync": partial(feishu_sync.sync_job_async, "account"),
+            },
+            self.executor,
+            workers=feishu_api.UPLOAD_WORKERS,
+        )
+        # Flask 视图通过模块全局 upload_workers 入队 / 唤醒，换成异步版本后不再启动上传线程
+        feishu_api.upload_workers = self.upload_workers  # type: ignore[assignment]
+        # 启动时即继续处理上次退出时未完成的任务
+        await self.upload_workers.start()
+
+    async def shutdown(self) -> None:
+        if self.upload_workers is not None:
+            await self.upload_workers.stop()
+        if self.feishu is not None:
+            await self.feishu.aclose()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except BaseException as exc:
+                    await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---- 请求 ----
+
+    async def _read_body(self, receive: Receive) -> Optional[bytes]:
+        chunks: List[bytes] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    async def _pump_body(self, receive: Receive, queue: "asyncio.Queue[Any]") -> None:
+        """把请求体逐块放进有界队列（满时等待视图读取），结束放 None，断开放 _DISCONNECTED。"""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                await queue.put(_DISCONNECTED)
+                return
+            body = message.get("body", b"")
+            if body:
+                await queue.put(body)
+            if not message.get("more_body"):
+                await queue.put(None)
+                return
+
+    async def _http(self, scope: Scope, receive: Receive, send: Send) -> None:
+        loop = asyncio.get_running_loop()
+        pump: Optional["asyncio.Task[None]"] = None
+        if scope["method"] == "POST" and scope["path"] in STREAMING_PATHS:
+            queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=BODY_QUEUE_CHUNKS)
+            pump = asyncio.ensure_future(self._pump_body(receive, queue))
+            environ = _wsgi_environ(scope, _BodyStream(loop, queue), None)
+        else:
+            body = await self._read_body(receive)
+            if body is None:
+                return
+            environ = _wsgi_environ(scope, io.BytesIO(body), len(body))
+        try:
+            status, headers, chunks, rest = await loop.run_in_executor(self.executor, _call_wsgi, environ)
+        finally:
+            # 视图没有读完正文（如参数错误直接返回）时，不再接收剩余部分
+            if pump is not None:
+                pump.cancel()
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            for chunk in chunks:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            while rest is not None:
+                # 流式导出：每块在执行器中生成（读 SQLite / 编码），发送时在事件循环里等待客户端
+                chunk = await loop.run_in_executor(self.executor, rest.next_chunk)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if rest is not None:
+                await loop.run_in_executor(self.executor, rest.close)
+
+
+app = AsyncAPI()
+
+
+if __name__ == "__main__":
+    try:
+        import uvicorn  # type: ignore
+    except ImportError:
+        raise SystemExit("未安装 uvicorn，请先执行 pip install uvicorn（或用其他 ASGI 服务器加载 feishu_api_async:app）。")
+    # 仅在本机使用，不开启对外访问
+    uvicorn.run(app, host="127.0.0.1", port=feishu_api.API_PORT)
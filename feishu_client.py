@@ -0,0 +1,620 @@
+"""飞书开放平台 HTTP 客户端：缓存 tenant_access_token，并复用 keep-alive 连接池。
+
+批量写入时通过自适应令牌桶（RateLimiter）限速，遇到限流错误码 / Retry-After
+自动降速重试；batch_create_many 以有限并发把大批记录拆成多次 batch_create。
+AsyncFeishuClient 是基于 httpx（可选依赖）的 asyncio 版本，供 ASGI 服务使用。
+
+不依赖 config_local.py，便于在基准脚本里指向本地的假飞书服务。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+FEISHU_BASE_URL = "https://open.feishu.cn/open-apis"
+
+# token 失效/非法时飞书返回的业务错误码，遇到后强制刷新 token 重试一次
+TOKEN_INVALID_CODES = {99991661, 99991663, 99991668}
+
+# 频率限制（HTTP 429 / code 99991400）与多维表写冲突（1254291），等待后重试
+RATE_LIMIT_CODES = {99991400}
+RETRYABLE_CODES = RATE_LIMIT_CODES | {1254291}
+
+# batch_create 单次最多写入的记录数
+MAX_BATCH_SIZE = 500
+
+
+class FeishuAPIError(RuntimeError):
+    """飞书接口返回 code != 0。"""
+
+    def __init__(self, message: str, code: Optional[int] = None, payload: Any = None) -> None:
+        super().__init__(message)
+        self.code = code
+        self.payload = payload
+
+
+class FeishuRateLimited(FeishuAPIError):
+    """重试次数用尽后仍被限流。"""
+
+
+class RateLimiter:
+    """自适应令牌桶：按 rate 次/秒放行请求，被限流时减半并暂停，成功后缓慢回升。
+
+    - acquire() 阻塞到拿到令牌（或限流暂停结束）为止，可被多个线程同时调用；
+    - on_throttle(retry_after) 在收到限流响应时调用：速率乘以 backoff_factor，
+      并在 retry_after 秒内暂停所有请求；
+    - on_success() 每次成功后速率加 recover_step，直到 max_rate。
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: Optional[float] = None,
+        min_rate: float = 0.5,
+        max_rate: Optional[float] = None,
+        backoff_factor: float = 0.5,
+        recover_step: float = 0.5,
+    ) -> None:
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.backoff_factor = backoff_factor
+        self.recover_step = recover_step
+        self.throttled = 0
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """取一个令牌：拿到时返回 0，否则返回需要等待的秒数（不阻塞，供 asyncio 客户端使用）。"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        while True:
+            delay = self.reserve()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recover_step)
+
+    def on_throttle(self, retry_after: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class FeishuClient:
+    """线程安全的飞书客户端。
+
+    - tenant_access_token 缓存到过期前 refresh_margin 秒，并发刷新时只发一次请求；
+    - 所有请求复用同一个 requests.Session（连接池大小 pool_maxsize），避免每批重新握手；
+    - 传入 rate_limiter 时每个请求先取令牌，限流 / 写冲突响应最多重试 max_retries 次。
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        app_secret: str,
+        base_url: str = FEISHU_BASE_URL,
+        pool_maxsize: int = 8,
+        refresh_margin: float = 300.0,
+        timeout: float = 15.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+    ) -> None:
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = base_url.rstrip("/")
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self.token_fetches = 0
+
+    # ---- token ----
+
+    def _token_valid(self) -> bool:
+        return (
+            self._token is not None
+            and time.monotonic() < self._token_expires_at - self.refresh_margin
+        )
+
+    def get_tenant_access_token(self, force_refresh: bool = False) -> str:
+        """返回缓存的 tenant_access_token；即将过期或 force_refresh 时刷新。"""
+        if not force_refresh and self._token_valid():
+            return self._token  # type: ignore[return-value]
+
+        stale = self._token
+        with self._token_lock:
+            # 等锁期间其他线程可能已经刷新过
+            if self._token_valid() and (not force_refresh or self._token != stale):
+                return self._token  # type: ignore[return-value]
+            if not self.app_id or not self.app_secret:
+                raise SystemExit("APP_ID / APP_SECRET 未配置，请在 config_local.py 中填写。")
+
+            with metrics.phase("feishu.token"):
+                resp = self.session.post(
+                    f"{self.base_url}/auth/v3/tenant_access_token/internal",
+                    json={"app_id": self.app_id, "app_secret": self.app_secret},
+                    timeout=10,
+                )
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("code") != 0:
+                raise FeishuAPIError(
+                    f"get tenant_access_token failed: {data}", data.get("code"), data
+                )
+            self._token = data["tenant_access_token"]
+            self._token_expires_at = time.monotonic() + float(data.get("expire", 7200))
+            self.token_fetches += 1
+            return self._token
+
+    def invalidate_token(self) -> None:
+        with self._token_lock:
+            self._token = None
+            self._token_expires_at = 0.0
+
+    # ---- 通用请求 ----
+
+    def post(
+        self,
+        path: str,
+        body: Dict[str, Any],
+        params: Optional[Dict[str, Any]] = None,
+        token: Optional[str] = None,
+    ) -> requests.Response:
+        """带鉴权的 POST，返回原始 Response（不检查业务 code）。
+
+        未显式传 token 时使用缓存 token，遇到 token 失效错误码会刷新后重试一次；
+        遇到限流 / 写冲突按 Retry-After（或指数退避）等待后重试。
+        """
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        limiter = self.rate_limiter
+        refresh = False
+        token_retried = False
+        retries = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            bearer = token or self.get_tenant_access_token(force_refresh=refresh)
+            refresh = False
+            resp = self.session.post(
+                url,
+                params=params,
+                json=body,
+                headers={"Authorization": f"Bearer {bearer}"},
+                timeout=self.timeout,
+            )
+            code = _response_code(resp)
+            if resp.status_code == 429 or code in RETRYABLE_CODES:
+                retries += 1
+                if retries > self.max_retries:
+                    return resp
+                delay = _retry_after(resp, retries)
+                if limiter is not None:
+                    limiter.on_throttle(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            if token is None and not token_retried and code in TOKEN_INVALID_CODES:
+                refresh = token_retried = True
+                continue
+            if limiter is not None and resp.status_code < 400:
+                limiter.on_success()
+            return resp
+
+    def post_json(
+        self,
+        path: str,
+        body: Dict[str, Any],
+        params: Optional[Dict[str, Any]] = None,
+        token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """POST 并校验 HTTP 状态与业务 code，返回 data 字段。"""
+        resp = self.post(path, body, params=params, token=token)
+        code = _response_code(resp)
+        if resp.status_code == 429 or code in RATE_LIMIT_CODES:
+            raise FeishuRateLimited(f"{path} rate limited: {resp.text}", code, resp.text)
+        if resp.status_code >= 400:
+            print("HTTP error:", resp.status_code, resp.text)
+            resp.raise_for_status()
+        data = resp.json()
+        if data.get("code") != 0:
+            raise FeishuAPIError(f"{path} failed: {data}", data.get("code"), data)
+        return data.get("data", {}) or {}
+
+    # ---- 多维表 ----
+
+    @staticmethod
+    def records_path(app_token: str, table_id: str, action: str) -> str:
+        return f"/bitable/v1/apps/{app_token}/tables/{table_id}/records/{action}"
+
+    def batch_create(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]],
+        token: Optional[str] = None,
+        client_token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """写入一批记录（单次不超过 500 条），返回飞书生成的记录列表。
+
+        client_token（uuid4 格式）相同的请求由飞书幂等处理，重发不会重复建记录。
+        耗时（含限流等待与重试）计入 metrics 的 feishu.batch_create 阶段。
+        """
+        with metrics.phase("feishu.batch_create"):
+            data = self.post_json(
+                self.records_path(app_token, table_id, "batch_create"),
+                {"records": records},
+                params={"client_token": client_token} if client_token else None,
+                token=token,
+            )
+        return data.get("records", []) or []
+
+    def batch_update(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]],
+        token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """按 record_id 更新一批记录（[{"record_id", "fields"}]，单次不超过 500 条）。
+
+        只覆盖传入的字段；耗时计入 metrics 的 feishu.batch_update 阶段。
+        """
+        with metrics.phase("feishu.batch_update"):
+            data = self.post_json(
+                self.records_path(app_token, table_id, "batch_update"),
+                {"records": records},
+                token=token,
+            )
+        return data.get("records", []) or []
+
+    def create_batches(
+        self,
+        app_token: str,
+        table_id: str,
+        batches: List[Tuple[Optional[str], List[Dict[str, Any]]]],
+        max_workers: int = 4,
+        token: Optional[str] = None,
+        on_batch: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
+    ) -> int:
+        """并发写入 [(client_token, records), ...]，最多 max_workers 批同时在途，返回写入总条数。
+
+        on_batch(index, created) 在调用线程里按完成顺序回调。任一批失败时不再启动
+        新的批次，等已在途的批次结束（成功的照常回调）后抛出第一个异常。
+        """
+        if not batches:
+            return 0
+
+        created_total = 0
+        error: Optional[BaseException] = None
+        workers = max(1, min(max_workers, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feishu-batch") as pool:
+            futures = {
+                pool.submit(self.batch_create, app_token, table_id, records, token, client_token): idx
+                for idx, (client_token, records) in enumerate(batches)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    exc = future.exception()
+                    if exc is not None:
+                        if error is None:
+                            error = exc
+                            for other in pending:
+                                other.cancel()
+                        continue
+                    created = future.result()
+                    created_total += len(created)
+                    if on_batch is not None:
+                        on_batch(futures[future], created)
+        if error is not None:
+            raise error
+        return created_total
+
+    def batch_create_many(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]],
+        batch_size: int = MAX_BATCH_SIZE,
+        max_workers: int = 4,
+        token: Optional[str] = None,
+        on_batch: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None,
+    ) -> int:
+        """按 batch_size（不超过 500）拆批后交给 create_batches，不带 client_token。"""
+        batch_size = max(1, min(MAX_BATCH_SIZE, batch_size))
+        batches: List[Tuple[Optional[str], List[Dict[str, Any]]]] = [
+            (None, records[i : i + batch_size]) for i in range(0, len(records), batch_size)
+        ]
+        return self.create_batches(
+            app_token, table_id, batches, max_workers=max_workers, token=token, on_batch=on_batch
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncFeishuClient:
+    """FeishuClient 的 asyncio 版本（需要可选依赖 httpx），供 ASGI 服务在事件循环里上传。
+
+    token 缓存、限流重试与 create_batches 的语义与同步客户端一致，等待都用 asyncio.sleep，
+    在途请求不占线程。RateLimiter 可与同步客户端共用（只调用不阻塞的 reserve）。
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        app_secret: str,
+        base_url: str = FEISHU_BASE_URL,
+        pool_maxsize: int = 8,
+        refresh_margin: float = 300.0,
+        timeout: float = 15.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_retries: int = 5,
+    ) -> None:
+        try:
+            import httpx  # type: ignore
+        except ImportError:
+            raise SystemExit("异步客户端需要 httpx，请先执行 pip install httpx。")
+
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.base_url = base_url.rstrip("/")
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+        )
+
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self.token_fetches = 0
+
+    # ---- token ----
+
+    def _token_valid(self) -> bool:
+        return (
+            self._token is not None
+            and time.monotonic() < self._token_expires_at - self.refresh_margin
+        )
+
+    async def get_tenant_access_token(self, force_refresh: bool = False) -> str:
+        """返回缓存的 tenant_access_token；即将过期或 force_refresh 时刷新（并发时只请求一次）。"""
+        if not force_refresh and self._token_valid():
+            return self._token  # type: ignore[return-value]
+
+        stale = self._token
+        async with self._token_lock:
+            if self._token_valid() and (not force_refresh or self._token != stale):
+                return self._token  # type: ignore[return-value]
+            if not self.app_id or not self.app_secret:
+                raise SystemExit("APP_ID / APP_SECRET 未配置，请在 config_local.py 中填写。")
+
+            with metrics.phase("feishu.token"):
+                resp = await self.http.post(
+                    f"{self.base_url}/auth/v3/tenant_access_token/internal",
+                    json={"app_id": self.app_id, "app_secret": self.app_secret},
+                    timeout=10,
+                )
+            resp.raise_for_status()
+            data = resp.json()
+            if data.get("code") != 0:
+                raise FeishuAPIError(
+                    f"get tenant_access_token failed: {data}", data.get("code"), data
+                )
+            self._token = data["tenant_access_token"]
+            self._token_expires_at = time.monotonic() + float(data.get("expire", 7200))
+            self.token_fetches += 1
+            return self._token
+
+    def invalidate_token(self) -> None:
+        self._token = None
+        self._token_expires_at = 0.0
+
+    # ---- 通用请求 ----
+
+    async def _acquire(self) -> None:
+        limiter = self.rate_limiter
+        if limiter is None:
+            return
+        while True:
+            delay = limiter.reserve()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def post(
+        self,
+        path: str,
+        body: Dict[str, Any],
+        params: Optional[Dict[str, Any]] = None,
+        token: Optional[str] = None,
+    ) -> Any:
+        """带鉴权的 POST，返回 httpx.Response（不检查业务 code），重试规则同 FeishuClient.post。"""
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        limiter = self.rate_limiter
+        refresh = False
+        token_retried = False
+        retries = 0
+        while True:
+            await self._acquire()
+            bearer = token or await self.get_tenant_access_token(force_refresh=refresh)
+            refresh = False
+            resp = await self.http.post(
+                url,
+                params=params,
+                json=body,
+                headers={"Authorization": f"Bearer {bearer}"},
+            )
+            code = _response_code(resp)
+            if resp.status_code == 429 or code in RETRYABLE_CODES:
+                retries += 1
+                if retries > self.max_retries:
+                    return resp
+                delay = _retry_after(resp, retries)
+                if limiter is not None:
+                    limiter.on_throttle(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            if token is None and not token_retried and code in TOKEN_INVALID_CODES:
+                refresh = token_retried = True
+                continue
+            if limiter is not None and resp.status_code < 400:
+                limiter.on_success()
+            return resp
+
+    async def post_json(
+        self,
+        path: str,
+        body: Dict[str, Any],
+        params: Optional[Dict[str, Any]] = None,
+        token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """POST 并校验 HTTP 状态与业务 code，返回 data 字段。"""
+        resp = await self.post(path, body, params=params, token=token)
+        code = _response_code(resp)
+        if resp.status_code == 429 or code in RATE_LIMIT_CODES:
+            raise FeishuRateLimited(f"{path} rate limited: {resp.text}", code, resp.text)
+        if resp.status_code >= 400:
+            print("HTTP error:", resp.status_code, resp.text)
+            resp.raise_for_status()
+        data = resp.json()
+        if data.get("code") != 0:
+            raise FeishuAPIError(f"{path} failed: {data}", data.get("code"), data)
+        return data.get("data", {}) or {}
+
+    # ---- 多维表 ----
+
+    records_path = staticmethod(FeishuClient.records_path)
+
+    async def batch_create(
+        self,
+        app_token: str,
+        table_id: str,
+        records: List[Dict[str, Any]],
+        token: Optional[str] = None,
+        client_token: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        with metrics.phase("feishu.batch_create"):
+            data = await self.post_json(
+                self.records_path(app_token, table_id, "batch_create"),
+                {"records": records},
+                params={"client_token": client_token} if client_token else None,
+                token=token,
+            )
+        return data.get("records", []) or []
+
+    async def create_batches(
+        self,
+        app_token: str,
+        table_id: str,
+        batches: List[Tuple[Optional[str], List[Dict[str, Any]]]],
+        max_workers: int = 4,
+        token: Optional[str] = None,
+        on_batch: Optional[Callable[[int, List[Dict[str, Any]]], Awaitable[None]]] = None,
+    ) -> int:
+        """并发写入 [(client_token, records), ...]，最多 max_workers 批在途，返回写入总条数。
+
+        on_batch(index, created) 是协程，按完成顺序 await。任一批失败后不再发起新批次，
+        等在途批次结束后抛出第一个异常。
+        """
+        created_total = 0
+        error: Optional[BaseException] = None
+        next_index = 0
+
+        async def worker() -> None:
+            nonlocal created_total, error, next_index
+            while error is None and next_index < len(batches):
+                idx = next_index
+                next_index += 1
+                client_token, records = batches[idx]
+                try:
+                    created = await self.batch_create(app_token, table_id, records, token, client_token)
+                    created_total += len(created)
+                    if on_batch is not None:
+                        await on_batch(idx, created)
+                except Exception as exc:
+                    if error is None:
+                        error = exc
+                    return
+
+        workers = max(1, min(max_workers, len(batches)))
+        if batches:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        if error is not None:
+            raise error
+        return created_total
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+def _response_code(resp: requests.Response) -> Optional[int]:
+    try:
+        return resp.json().get("code")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _retry_after(resp: requests.Response, attempt: int) -> float:
+    """限流等待秒数：Retry-After / x-ogw-ratelimit-reset，缺省时指数退避（上限 30 秒）。"""
+    for header in ("Retry-After", "x-ogw-ratelimit-reset"):
+        value = resp.headers.get(header)
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                continue
+    return min(30.0, 0.5 * (2 ** (attempt - 1)))
@@ -0,0 +1,235 @@
+"""飞书多维表增量同步：只推送上次同步成功之后新增或变化的行。
+
+- 每次写入榜单行时记下当时的数据版本号（row_version，见 storage_sqlite 的 v9 迁移）；
+  每张多维表按榜单类型保存一个水位 (row_version, rowid)，同步时只扫描水位之后的行，按批推进水位；
+- 本地 uuid -> 飞书 record_id 的映射保存在 feishu_sync_record 表：已同步过的行按 record_id
+  走 batch_update，记录内容哈希未变的直接跳过；新行走 batch_create（client_token 由
+  行 uuid 与内容确定，失败重跑不会重复建记录）；上传任务已写入过相同内容的，直接沿用其 record_id。
+
+请求次数与变化的行数成正比，与库的总行数无关。暂不处理本地删除的行。
+
+    python feishu_sync.py --type all
+    python feishu_sync.py --type note --dry-run
+    python feishu_sync.py --type account --full   # 从头重扫（内容未变的仍会跳过）
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+import storage_sqlite
+import upload_to_feishu
+from feishu_client import FeishuClient
+from import_history import CSV_HEADERS
+
+KINDS = ("note", "account")
+
+_SNAKE_RE = re.compile(r"_([a-z])")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _table_lock(table_key: str) -> threading.Lock:
+    # 同一进程内同一张表的同步串行执行，避免两次同步同时创建相同的新行
+    with _locks_guard:
+        return _locks.setdefault(table_key, threading.Lock())
+
+
+def bitable_target(kind: str) -> Tuple[str, str, str, Dict[str, str]]:
+    """榜单类型对应的 (app_token, table_id, table_key, 字段映射)。"""
+    if kind == "note":
+        app_token, table_id = upload_to_feishu.BITABLE_NOTE_APP_TOKEN, upload_to_feishu.BITABLE_NOTE_TABLE_ID
+        mapping = upload_to_feishu.FIELD_MAPPING_NOTE
+    elif kind == "account":
+        app_token, table_id = upload_to_feishu.BITABLE_ACCOUNT_APP_TOKEN, upload_to_feishu.BITABLE_ACCOUNT_TABLE_ID
+        mapping = upload_to_feishu.FIELD_MAPPING_ACCOUNT
+    else:
+        raise ValueError(f"未知的榜单类型: {kind}")
+    return (*upload_to_feishu.bitable_table_key(app_token, table_id), mapping)
+
+
+def _source_row(kind: str, row: Dict[str, Any]) -> Dict[str, str]:
+    """把库中的行展开成字段映射可能引用的各种列名：库列名、扩展上报的 camelCase、CSV 中文表头与排名。"""
+    source: Dict[str, str] = {}
+    for column, value in row.items():
+        text = "" if value is None else str(value)
+        source[column] = text
+        source[_SNAKE_RE.sub(lambda m: m.group(1).upper(), column)] = text
+    for header, column in CSV_HEADERS[kind].items():
+        source[header] = source.get(column, "")
+    rank = "" if row.get("rank") is None else str(row["rank"])
+    source["__rank"] = source["排名"] = rank
+    return source
+
+
+def sync_kind(
+    kind: str,
+    db_path: Path = storage_sqlite.DB_PATH,
+    client: Optional[FeishuClient] = None,
+    batch_size: int = upload_to_feishu.BATCH_SIZE,
+    full: bool = False,
+    dry_run: bool = False,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, int]:
+    """把一个榜单自上次同步以来的变化推送到对应多维表，返回各类计数。
+
+    每批（不超过 batch_size 行）先发 batch_update / batch_create，成功后在同一个事务里保存
+    record_id 映射并推进水位；中途失败时已完成的批次不会重发。dry_run 只统计不请求、不落库。
+    on_progress 以累计写入（新建 + 更新 + 沿用）条数回调。
+    """
+    app_token, table_id, table_key, mapping = bitable_target(kind)
+    batch_size = max(1, min(upload_to_feishu.MAX_BATCH_SIZE, batch_size))
+    stats = {"scanned": 0, "created": 0, "updated": 0, "adopted": 0, "unchanged": 0, "requests": 0}
+
+    with _table_lock(table_key):
+        if full and not dry_run:
+            storage_sqlite.reset_sync_state(table_key, kind, db_path)
+        state = storage_sqlite.get_sync_state(table_key, kind, db_path)
+        mark = (0, 0) if full else (state["version"], state["rowid"])
+        # 只同步到开始时已提交的数据版本；同步期间写入的行留给下一次
+        upto_version = storage_sqlite.get_data_version(db_path)[0]
+        if client is None and not dry_run:
+            client = upload_to_feishu.get_client()
+
+        while True:
+            rows = storage_sqlite.list_changed_rows(
+                kind, mark[0], mark[1], upto_version, batch_size, db_path
+            )
+            if not rows:
+                break
+            stats["scanned"] += len(rows)
+            records = upload_to_feishu.to_bitable_records([_source_row(kind, r) for r in rows], mapping)
+            hashes = [upload_to_feishu.record_hash(record) for record in records]
+            synced = storage_sqlite.load_sync_records(table_key, [r["uuid"] for r in rows], db_path)
+
+            done: List[Tuple[str, str, str]] = []
+            updates: List[Tuple[str, str, Dict[str, Any], str]] = []
+            creates: List[Tuple[str, Dict[str, Any], str]] = []
+            for row, record, content_hash in zip(rows, records, hashes):
+                previous = synced.get(row["uuid"])
+                if previous is None:
+                    creates.append((row["uuid"], record, content_hash))
+                elif previous[1] == content_hash:
+                    stats["unchanged"] += 1
+                else:
+                    updates.append((row["uuid"], previous[0], record, content_hash))
+
+            # 上传任务已写入过相同内容的记录：直接沿用 record_id（每条记录只认领一次）
+            existing = storage_sqlite.feishu_record_ids(table_key, [c[2] for c in creates], db_path)
+            fresh: List[Tuple[str, Dict[str, Any], str]] = []
+            for row_uuid, record, content_hash in creates:
+                record_id = existing.pop(content_hash, None)
+                if record_id is not None:
+                    done.append((row_uuid, record_id, content_hash))
+                    stats["adopted"] += 1
+                else:
+                    fresh.append((row_uuid, record, content_hash))
+
+            next_mark = (rows[-1]["row_version"], rows[-1]["rowid"])
+            if dry_run:
+                stats["updated"] += len(updates)
+                stats["created"] += len(fresh)
+                stats["requests"] += bool(updates) + bool(fresh)
+                mark = next_mark
+                continue
+
+            assert client is not None
+            if updates:
+                client.batch_update(
+                    app_token,
+                    table_id,
+                    [{"record_id": record_id, "fields": record["fields"]} for _, record_id, record, _ in updates],
+                )
+                stats["requests"] += 1
+                stats["updated"] += len(updates)
+                done.extend((row_uuid, record_id, content_hash) for row_uuid, record_id, _, content_hash in updates)
+                if fresh:
+                    # 先落库已更新的映射，batch_create 失败重跑时不再重发这些更新
+                    storage_sqlite.save_sync_batch(table_key, kind, done, mark, db_path)
+                    done = []
+            if fresh:
+                client_token = upload_to_feishu.batch_client_token(
+                    f"sync:{table_key}", [f"{row_uuid}:{content_hash}" for row_uuid, _, content_hash in fresh]
+                )
+                created = client.batch_create(
+                    app_token, table_id, [record for _, record, _ in fresh], client_token=client_token
+                )
+                stats["requests"] += 1
+                if len(created) != len(fresh):
+                    raise RuntimeError(f"batch_create 返回 {len(created)} 条记录，预期 {len(fresh)} 条")
+                stats["created"] += len(fresh)
+                done.extend(
+                    (row_uuid, item["record_id"], content_hash)
+                    for (row_uuid, _, content_hash), item in zip(fresh, created)
+                )
+            storage_sqlite.save_sync_batch(table_key, kind, done, next_mark, db_path)
+            mark = next_mark
+            if on_progress is not None:
+                on_progress(stats["created"] + stats["updated"] + stats["adopted"])
+    return stats
+
+
+# ---- 上传任务队列的处理函数（kind 为 note_sync / account_sync，任务行数据为空） ----
+
+
+def sync_job(
+    kind: str,
+    rows: List[Dict[str, str]],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+) -> int:
+    """作为 UploadWorkerPool 的处理函数执行一次增量同步，返回写入条数。
+
+    失败重试时从已推进的水位继续；数据库路径取自任务的 checkpoint。
+    """
+    db_path = checkpoint.db_path if checkpoint is not None else storage_sqlite.DB_PATH
+    with metrics.phase(f"feishu.sync.{kind}"):
+        stats = sync_kind(kind, db_path, on_progress=on_progress)
+    print(f"增量同步（{kind}）：{stats}")
+    return stats["created"] + stats["updated"] + stats["adopted"]
+
+
+async def sync_job_async(
+    kind: str,
+    rows: List[Dict[str, str]],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+    offload: Optional[Any] = None,
+) -> int:
+    """AsyncUploadWorkerPool 的处理函数：同步引擎整体放到单独线程执行，不占 SQLite 执行器。"""
+    return await asyncio.to_thread(sync_job, kind, rows, on_progress, checkpoint)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="把本地库的变化增量同步到飞书多维表")
+    parser.add_argument("--type", dest="kind", choices=(*KINDS, "all"), default="all")
+    parser.add_argument("--db", default=str(storage_sqlite.DB_PATH), help="SQLite 文件路径")
+    parser.add_argument("--full", action="store_true", help="忽略水位从头扫描（内容未变的行仍跳过）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要新建 / 更新的条数，不调用飞书")
+    parser.add_argument(
+        "--batch-size", type=int, default=upload_to_feishu.BATCH_SIZE, help="每批行数（不超过 500）"
+    )
+    args = parser.parse_args()
+
+    for kind in KINDS if args.kind == "all" else (args.kind,):
+        started = time.perf_counter()
+        stats = sync_kind(
+            kind, Path(args.db), batch_size=args.batch_size, full=args.full, dry_run=args.dry_run
+        )
+        print(
+            f"{kind}：扫描 {stats['scanned']} 行，新建 {stats['created']}，更新 {stats['updated']}，"
+            f"沿用 {stats['adopted']}，未变化 {stats['unchanged']}，请求 {stats['requests']} 次，"
+            f"耗时 {time.perf_counter() - started:.1f}s" + ("（dry-run）" if args.dry_run else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""离线解析浏览器另存的「市场行情」榜单页面（热卖榜-优秀内容排行 / 成交榜-优秀账号排行）。
+
+抽取规则与扩展的 note-rank-content.js 一致（按表头文字定位列，标题 / 昵称 / 发布时间 /
+粉丝数按同样的 class 取值），产出的行与扩展上报的格式相同（camelCase 字段），可直接交给
+storage_sqlite.insert_note_rows / insert_account_rows。
+
+另存的页面约 3 MB，其中榜单表格只有几十 KB，其余是内联样式与脚本：解析时按块读取文件，
+跳过 `<table` 之前的内容，只把表格交给增量的 HTMLParser，读到 `</table>` 即停止。
+目录批量模式用多进程并行解析。
+
+用法：
+
+    python html_snapshot_parser.py 热卖榜-优秀内容排行html/ 成交榜-优秀账号排行html/ --workers 4
+    python html_snapshot_parser.py snapshots/ --fetch-date 2025-11-21 --dry-run --jsonl rows.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import codecs
+import json
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import storage_sqlite
+
+CHUNK_SIZE = 256 * 1024
+
+_VOID_TAGS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+)
+# innerText 会在这些块级元素之间断行；这里用空格代替，最后再合并空白
+_BLOCK_TAGS = frozenset({"div", "p", "li", "tr", "td", "th", "br"})
+# 单元格内需要单独取值的 class（对应扩展中的 querySelector）
+_CAPTURE_CLASSES = frozenset(
+    {"title", "anchor-name", "note-time", "publish-time", "user-fans", "anchor-fans", "fans"}
+)
+_WHITESPACE_RE = re.compile(r"\s+")
+_PUBLISH_PREFIX_RE = re.compile(r".*?发布时间[:：]?\s*")
+_FANS_FALLBACK_RE = re.compile(r"粉丝[:：]?\s*([\d,.\w万W]+)")
+
+
+def _clean(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _normalize_header(text: str) -> str:
+    # 与扩展的 normalizeText 相同：去掉所有空白与替换字符
+    return _WHITESPACE_RE.sub("", text).replace("\ufffd", "")
+
+
+def logical_fetch_date(moment: datetime) -> str:
+    """扩展的「逻辑获取日期」：按东八区，10 点前视为前一天的数据。"""
+    cst = moment.astimezone(timezone(timedelta(hours=8)))
+    if cst.hour < 10:
+        cst -= timedelta(days=1)
+    return cst.strftime("%Y-%m-%d")
+
+
+def snapshot_fetch_date(path: Path) -> str:
+    """另存页面不含采集时间：取文件修改时间按逻辑获取日期换算。"""
+    return logical_fetch_date(datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.utc))
+
+
+class _Cell:
+    """一个 <td>/<th>：整格文本，以及格内各目标 class 第一次出现的文本。"""
+
+    __slots__ = ("parts", "texts", "in_title_wrapper")
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.texts: Dict[str, str] = {}
+        self.in_title_wrapper: Dict[str, str] = {}
+
+    @property
+    def text(self) -> str:
+        return _clean("".join(self.parts))
+
+
+class RankTableParser(HTMLParser):
+    """增量解析页面中的第一张表格，收集表头文字与 tbody 各行的单元格。
+
+    feed() 可以多次调用；读到 </table> 后 done 为 True，调用方即可停止读取。
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.headers: List[str] = []
+        self.rows: List[List[_Cell]] = []
+        self.done = False
+        self._in_table = False
+        self._section: Optional[str] = None
+        self._row: Optional[List[_Cell]] = None
+        self._cell: Optional[_Cell] = None
+        # 单元格内打开的元素：(tag, 需要取值的 class, 文本缓冲, 是否位于 .note-title-wrapper / .user-info-top 内)
+        self._stack: List[Tuple[str, Tuple[str, ...], Optional[List[str]], bool]] = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self.done:
+            return
+        if not self._in_table:
+            if tag == "table":
+                self._in_table = True
+            return
+        if tag in ("thead", "tbody"):
+            self._section = tag
+        elif tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = _Cell()
+            self._stack = []
+        elif self._cell is not None:
+            if tag in _BLOCK_TAGS:
+                self._cell.parts.append(" ")
+            if tag in _VOID_TAGS:
+                return
+            classes: Tuple[str, ...] = ()
+            wrapper = bool(self._stack and self._stack[-1][3])
+            for name, value in attrs:
+                if name == "class" and value:
+                    tokens = value.split()
+                    classes = tuple(t for t in tokens if t in _CAPTURE_CLASSES)
+                    wrapper = wrapper or "note-title-wrapper" in tokens or "user-info-top" in tokens
+                    break
+            if tag == "a":
+                classes += ("a",)
+            self._stack.append((tag, classes, [] if classes else None, wrapper))
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.done or not self._in_table:
+            return
+        if tag == "table":
+            self.done = True
+        elif tag in ("thead", "tbody"):
+            self._section = None
+        elif tag in ("td", "th") and self._cell is not None:
+            if self._section == "thead":
+                self.headers.append(_normalize_header("".join(self._cell.parts)))
+            elif self._row is not None:
+                self._row.append(self._cell)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._section == "tbody" and self._row:
+                self.rows.append(self._row)
+            self._row = None
+        elif self._cell is not None:
+            if tag in _BLOCK_TAGS:
+                self._cell.parts.append(" ")
+            for index in range(len(self._stack) - 1, -1, -1):
+                if self._stack[index][0] == tag:
+                    for _tag, classes, buffer, wrapper in self._stack[index:]:
+                        if buffer is None:
+                            continue
+                        text = _clean("".join(buffer))
+                        for name in classes:
+                            self._cell.texts.setdefault(name, text)
+                            if wrapper:
+                                self._cell.in_title_wrapper.setdefault(name, text)
+                    del self._stack[index:]
+                    break
+
+    def handle_data(self, data: str) -> None:
+        if self._cell is None:
+            return
+        self._cell.parts.append(data)
+        for _tag, _classes, buffer, _wrapper in self._stack:
+            if buffer is not None:
+                buffer.append(data)
+
+
+def _column_index(headers: List[str]) -> Dict[str, int]:
+    """按表头文字定位各列（规则同扩展的 collectNoteRankFromDom / collectAccountRankFromDom）。"""
+    index = {"noteInfo": -1, "accountInfo": -1, "readCount": -1, "clickRate": -1, "payConversionRate": -1, "gmv": -1}
+    for i, text in enumerate(headers):
+        if not text:
+            continue
+        if "笔记" in text and not any(word in text for word in ("阅读", "商品", "支付", "成交")):
+            index["noteInfo"] = i
+        elif ("账号" in text or "店铺" in text) and not any(word in text for word in ("粉丝", "阅读", "成交")):
+            index["accountInfo"] = i
+        elif "阅读" in text:
+            index["readCount"] = i
+        elif "商品" in text and "点击" in text:
+            index["clickRate"] = i
+        elif "支付" in text and "转化" in text:
+            index["payConversionRate"] = i
+        elif "成交" in text and "金额" in text:
+            index["gmv"] = i
+    return index
+
+
+def _cell_at(cells: List[_Cell], idx: int) -> str:
+    return cells[idx].text if 0 <= idx < len(cells) else ""
+
+
+def _note_row(cells: List[_Cell], columns: Dict[str, int], fetch_date: str) -> Dict[str, str]:
+    note = cells[columns["noteInfo"]] if columns["noteInfo"] < len(cells) else _Cell()
+    title = note.in_title_wrapper.get("title") or note.texts.get("title") or note.texts.get("a")
+    publish_raw = note.texts.get("note-time") or note.texts.get("publish-time")
+    return {
+        "title": title if title is not None else note.text,
+        "nickname": note.texts.get("anchor-name", ""),
+        "publishTime": _PUBLISH_PREFIX_RE.sub("", publish_raw, count=1) if publish_raw else "",
+        "readCount": _cell_at(cells, columns["readCount"]),
+        "clickRate": _cell_at(cells, columns["clickRate"]),
+        "payConversionRate": _cell_at(cells, columns["payConversionRate"]),
+        "gmv": _cell_at(cells, columns["gmv"]),
+        "fetchDate": fetch_date,
+    }
+
+
+def _account_row(cells: List[_Cell], columns: Dict[str, int], fetch_date: str) -> Dict[str, str]:
+    account = cells[columns["accountInfo"]] if columns["accountInfo"] < len(cells) else _Cell()
+    shop_name = (
+        account.texts.get("anchor-name")
+        or account.in_title_wrapper.get("title")
+        or account.texts.get("title")
+    )
+    fans_raw = next(
+        (account.texts[name] for name in ("user-fans", "anchor-fans", "fans") if name in account.texts), None
+    )
+    if fans_raw is not None:
+        fans_count = fans_raw.replace("粉丝", "").strip()
+    else:
+        match = _FANS_FALLBACK_RE.search(account.text)
+        fans_count = match.group(1).strip() if match else ""
+    return {
+        "shopName": shop_name if shop_name is not None else account.text,
+        "fansCount": fans_count,
+        "readCount": _cell_at(cells, columns["readCount"]),
+        "clickRate": _cell_at(cells, columns["clickRate"]),
+        "payConversionRate": _cell_at(cells, columns["payConversionRate"]),
+        "gmv": _cell_at(cells, columns["gmv"]),
+        "fetchDate": fetch_date,
+    }
+
+
+def _feed_table(parser: RankTableParser, path: Path, skip_to_table: bool) -> None:
+    """按块读取文件喂给解析器。
+
+    skip_to_table 时只把 `<table` 到 `</table>` 之间的内容解码后交给解析器（榜单表格没有嵌套
+    表格），前面约 2.5 MB 的样式与脚本只做字节查找、不解码；否则整页逐块解码解析。
+    UTF-8 中 ASCII 字节不会出现在多字节字符内部，按字节查找标记是安全的。
+    """
+    start_marker, end_marker = b"<table", b"</table>"
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    seeking = skip_to_table
+    carry = b""
+    with open(path, "rb") as f:
+        while not parser.done:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if skip_to_table:
+                chunk = carry + chunk
+                if seeking:
+                    pos = chunk.find(start_marker)
+                    if pos < 0:
+                        # 保留末尾几个字节，防止标记被块边界切开
+                        carry = chunk[-(len(start_marker) - 1) :]
+                        continue
+                    chunk = chunk[pos:]
+                    seeking = False
+                pos = chunk.find(end_marker)
+                if pos >= 0:
+                    parser.feed(decoder.decode(chunk[: pos + len(end_marker)], final=True))
+                    break
+                carry = chunk[-(len(end_marker) - 1) :]
+                chunk = chunk[: -(len(end_marker) - 1)]
+            parser.feed(decoder.decode(chunk))
+    parser.close()
+
+
+def parse_snapshot(
+    path: Path,
+    kind: Optional[str] = None,
+    fetch_date: Optional[str] = None,
+    exclude_first_row: bool = False,
+    skip_to_table: bool = True,
+) -> Tuple[str, List[Dict[str, str]]]:
+    """解析一个另存页面，返回 (kind, rows)；kind 为空时按表头判断是内容榜还是账号榜。"""
+    path = Path(path)
+    parser = RankTableParser()
+    _feed_table(parser, path, skip_to_table)
+    if not parser.headers:
+        raise ValueError(f"{path}: 未找到榜单表格或表头")
+
+    columns = _column_index(parser.headers)
+    if kind is None:
+        if columns["noteInfo"] >= 0:
+            kind = "note"
+        elif columns["accountInfo"] >= 0:
+            kind = "account"
+        else:
+            raise ValueError(f"{path}: 无法从表头判断榜单类型，请使用 --type 指定")
+    info_key = "noteInfo" if kind == "note" else "accountInfo"
+    if columns[info_key] < 0:
+        raise ValueError(f"{path}: 表头中没有{'笔记' if kind == 'note' else '账号'}信息列")
+
+    fetch_date = fetch_date or snapshot_fetch_date(path)
+    build = _note_row if kind == "note" else _account_row
+    rows = parser.rows[1:] if exclude_first_row else parser.rows
+    return kind, [build(cells, columns, fetch_date) for cells in rows]
+
+
+def expand_snapshot_paths(inputs: Iterable[str]) -> List[Path]:
+    """展开文件 / 目录参数（目录下递归查找 *.html，跳过另存时生成的 *_files 资源目录）。"""
+    files: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(
+                p for p in path.rglob("*.htm*") if not any(part.endswith("_files") for part in p.parts)
+            )
+        elif path.exists():
+            files.append(path)
+    return sorted(set(files))
+
+
+def _parse_task(args: Tuple[str, Optional[str], Optional[str], bool]) -> Tuple[str, List[Dict[str, str]]]:
+    path, kind, fetch_date, exclude_first_row = args
+    return parse_snapshot(Path(path), kind, fetch_date, exclude_first_row)
+
+
+def parse_snapshots(
+    paths: List[Path],
+    kind: Optional[str] = None,
+    fetch_date: Optional[str] = None,
+    exclude_first_row: bool = False,
+    workers: int = 1,
+) -> Iterator[Tuple[Path, str, List[Dict[str, str]]]]:
+    """按输入顺序产出 (path, kind, rows)；workers > 1 时在多个进程中并行解析。"""
+    tasks = [(str(path), kind, fetch_date, exclude_first_row) for path in paths]
+    if workers <= 1 or len(tasks) <= 1:
+        for path, task in zip(paths, tasks):
+            yield (path, *_parse_task(task))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path, (row_kind, rows) in zip(paths, pool.map(_parse_task, tasks)):
+            yield path, row_kind, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="解析另存的市场行情榜单页面并写入本地 SQLite")
+    parser.add_argument("paths", nargs="+", help="HTML 文件或目录")
+    parser.add_argument("--db", default=str(storage_sqlite.DB_PATH), help="SQLite 文件路径")
+    parser.add_argument("--type", choices=["note", "account"], default=None, help="榜单类型（默认按表头判断）")
+    parser.add_argument("--fetch-date", default=None, help="获取日期 YYYY-MM-DD（默认按文件修改时间换算）")
+    parser.add_argument("--exclude-first-row", action="store_true", help="跳过每页第一行（同扩展的开关）")
+    parser.add_argument("--workers", type=int, default=1, help="并行解析的进程数")
+    parser.add_argument("--jsonl", default=None, help="同时把解析出的行写入该 JSONL 文件")
+    parser.add_argument("--dry-run", action="store_true", help="只解析，不写入数据库")
+    args = parser.parse_args()
+
+    files = expand_snapshot_paths(args.paths)
+    if not files:
+        raise SystemExit("没有找到 HTML 文件。")
+
+    db_path = Path(args.db)
+    if not args.dry_run:
+        storage_sqlite.init_db_if_needed(db_path)
+    inserters = {"note": storage_sqlite.insert_note_rows, "account": storage_sqlite.insert_account_rows}
+    out = open(args.jsonl, "w", encoding="utf-8") if args.jsonl else None
+    started = time.perf_counter()
+    total = 0
+    try:
+        for path, kind, rows in parse_snapshots(
+            files, args.type, args.fetch_date, args.exclude_first_row, max(1, args.workers)
+        ):
+            total += len(rows)
+            if out is not None:
+                out.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+            summary = ""
+            if not args.dry_run and rows:
+                counts: Dict[str, Any] = inserters[kind](rows, db_path)
+                summary = f"（新增 {counts['inserted']} / 更新 {counts['updated']} / 未变化 {counts['unchanged']}）"
+            print(f"  {path}: {kind} {len(rows)} 行{summary}")
+    finally:
+        if out is not None:
+            out.close()
+    print(f"完成：{len(files)} 个页面，{total} 行，耗时 {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
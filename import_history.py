@@ -0,0 +1,281 @@
+"""历史数据批量导入：把导出的 CSV / JSONL 直接流式写入本地 SQLite（不经过 Flask）。
+
+支持的输入：
+
+- `xhs_note_rank_*.csv` / `xhs_account_rank_*.csv`：扩展「下载 CSV」导出的格式（中文表头）；
+- `*.jsonl`：每行一个 JSON 对象，字段与扩展上报的行一致（camelCase 或 snake_case 均可）。
+
+参数可以是文件、目录（递归查找上述文件）或通配符。数据按 --chunk-size 行分块，
+每块一次事务（storage_sqlite 的 upsert 路径，重复导入只会更新变化的行），
+内存占用与文件数量无关。--workers > 1 时由多个进程并行解析文件并预先计算档位与
+检索词元，主进程按文件顺序依次写入。
+
+用法：
+
+    python import_history.py --db data/xhs_rank.db archive/2025-10/ archive/*.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import json
+import re
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import storage_sqlite
+
+# CSV 中文表头 -> storage_sqlite 列名
+NOTE_CSV_HEADERS: Dict[str, str] = {
+    "笔记标题": "title",
+    "账号昵称": "nickname",
+    "发布时间": "publish_time",
+    "笔记阅读数": "read_count",
+    "笔记商品点击率": "click_rate",
+    "笔记支付转化率": "pay_conversion_rate",
+    "笔记成交金额（元）": "gmv",
+    "获取时间": "fetch_date",
+}
+
+ACCOUNT_CSV_HEADERS: Dict[str, str] = {
+    "店铺名": "shop_name",
+    "粉丝数": "fans_count",
+    "笔记阅读数": "read_count",
+    "笔记商品点击率": "click_rate",
+    "笔记支付转化率": "pay_conversion_rate",
+    "笔记成交金额（元）": "gmv",
+    "获取时间": "fetch_date",
+}
+
+CSV_HEADERS: Dict[str, Dict[str, str]] = {
+    "note": NOTE_CSV_HEADERS,
+    "account": ACCOUNT_CSV_HEADERS,
+}
+
+INSERTERS = {
+    "note": storage_sqlite.insert_note_rows,
+    "account": storage_sqlite.insert_account_rows,
+}
+
+_FILE_RE = re.compile(r"xhs_(note|account)_rank_(\d{4})(\d{2})(\d{2})")
+_PATTERNS = ("xhs_note_rank_*.csv", "xhs_account_rank_*.csv", "*.jsonl")
+
+
+def detect_kind(path: Path, row: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """根据文件名（xhs_note_rank_* / xhs_account_rank_*）或行内字段判断榜单类型。"""
+    match = _FILE_RE.search(path.name)
+    if match:
+        return match.group(1)
+    if row is not None:
+        if "shopName" in row or "shop_name" in row or "店铺名" in row:
+            return "account"
+        if "title" in row or "笔记标题" in row:
+            return "note"
+    return None
+
+
+def _default_fetch_date(path: Path) -> str:
+    """文件名中的日期（xhs_note_rank_20251118.csv -> 2025-11-18），行内缺少获取时间时使用。"""
+    match = _FILE_RE.search(path.name)
+    if not match:
+        return ""
+    return f"{match.group(2)}-{match.group(3)}-{match.group(4)}"
+
+
+def expand_paths(inputs: Iterable[str]) -> List[Path]:
+    """展开文件 / 目录 / 通配符参数，按文件名排序（通常即按日期）。"""
+    files: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            for pattern in _PATTERNS:
+                files.extend(path.rglob(pattern))
+        elif path.exists():
+            files.append(path)
+        else:
+            files.extend(Path(p) for p in glob.glob(item, recursive=True))
+    seen = set()
+    unique = []
+    for path in sorted(files, key=lambda p: (p.name, str(p))):
+        key = path.resolve()
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def iter_rows(path: Path, kind: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """逐行产出 (kind, row)；CSV 行映射为 storage_sqlite 列名，JSONL 行原样交给入库函数归一化。"""
+    fallback_date = _default_fetch_date(path)
+    if path.suffix.lower() == ".jsonl":
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for lineno, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"{path}:{lineno}: JSON 解析失败：{exc}") from exc
+                row_kind = kind or detect_kind(path, row)
+                if row_kind is None:
+                    raise ValueError(f"{path}:{lineno}: 无法判断榜单类型，请使用 --type 指定")
+                if fallback_date and not (row.get("fetchDate") or row.get("fetch_date")):
+                    row["fetch_date"] = fallback_date
+                yield row_kind, row
+        return
+
+    file_kind = kind or detect_kind(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        if file_kind is None:
+            file_kind = detect_kind(path, dict.fromkeys(reader.fieldnames or []))
+        if file_kind is None:
+            raise ValueError(f"{path}: 无法判断榜单类型，请使用 --type 指定")
+        headers = CSV_HEADERS[file_kind]
+        missing = [col for col in headers if col != "获取时间" and col not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path}: 缺少表头 {', '.join(missing)}")
+        for raw in reader:
+            row = {key: (raw.get(col) or "").strip() for col, key in headers.items()}
+            if not row["fetch_date"]:
+                row["fetch_date"] = fallback_date
+            yield file_kind, row
+
+
+def _chunks(
+    items: Iterable[Tuple[Path, str, Any]], size: int
+) -> Iterator[Tuple[Path, str, List[Any]]]:
+    """把 (path, kind, item) 流按榜单类型连续分块（可跨文件），每块最多 size 项。
+
+    产出 (块内最后一个文件, kind, items)。
+    """
+    current_kind: Optional[str] = None
+    last_path: Optional[Path] = None
+    chunk: List[Any] = []
+    for path, kind, item in items:
+        if chunk and (kind != current_kind or len(chunk) >= size):
+            yield last_path, current_kind, chunk  # type: ignore[misc]
+            chunk = []
+        current_kind, last_path = kind, path
+        chunk.append(item)
+    if chunk:
+        yield last_path, current_kind, chunk  # type: ignore[misc]
+
+
+def _prepare_file(path: str, kind: Optional[str]) -> List[Tuple[str, Any, Any]]:
+    """子进程入口：解析单个文件，并预先完成归一化、档位解析与检索分词。"""
+    grouped: List[Tuple[str, List[Dict[str, Any]]]] = []
+    for row_kind, row in iter_rows(Path(path), kind):
+        if grouped and grouped[-1][0] == row_kind:
+            grouped[-1][1].append(row)
+        else:
+            grouped.append((row_kind, [row]))
+    prepared = []
+    for row_kind, rows in grouped:
+        normalized, derived = storage_sqlite.prepare_rows(row_kind, rows)
+        prepared.extend((row_kind, values, extra) for values, extra in zip(normalized, derived))
+    return prepared
+
+
+def _prepared_items(
+    files: List[Path], kind: Optional[str], workers: int
+) -> Iterator[Tuple[Path, str, Tuple[Any, Any]]]:
+    """按文件顺序产出子进程预处理好的行；最多同时预处理 2 * workers 个文件。"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window: Deque[Tuple[Path, Future]] = deque()
+        remaining = iter(files)
+        for path in remaining:
+            window.append((path, pool.submit(_prepare_file, str(path), kind)))
+            if len(window) >= 2 * workers:
+                break
+        while window:
+            path, future = window.popleft()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                window.append((next_path, pool.submit(_prepare_file, str(next_path), kind)))
+            for row_kind, values, extra in future.result():
+                yield path, row_kind, (values, extra)
+
+
+def import_files(
+    files: List[Path],
+    db_path: Path = storage_sqlite.DB_PATH,
+    kind: Optional[str] = None,
+    chunk_size: int = 5000,
+    workers: int = 1,
+    verbose: bool = True,
+) -> Dict[str, int]:
+    """把文件逐块写入 SQLite，返回汇总计数（files / rows / inserted / updated / unchanged）。
+
+    workers <= 1 时在当前进程流式解析；否则解析、归一化、档位解析与检索分词在
+    子进程中完成，主进程只负责按块写库（SQLite 单写者）。
+    """
+    storage_sqlite.init_db_if_needed(db_path)
+    totals = {"files": len(files), "rows": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+
+    if workers <= 1:
+        stream: Iterable[Tuple[Path, str, Any]] = (
+            (path, row_kind, row) for path in files for row_kind, row in iter_rows(path, kind)
+        )
+    else:
+        stream = _prepared_items(files, kind, workers)
+
+    for path, chunk_kind, chunk in _chunks(stream, chunk_size):
+        if workers <= 1:
+            counts = INSERTERS[chunk_kind](chunk, db_path)
+        else:
+            normalized = [values for values, _extra in chunk]
+            derived = [extra for _values, extra in chunk]
+            counts = storage_sqlite.insert_prepared_rows(chunk_kind, normalized, derived, db_path)
+        totals["rows"] += len(chunk)
+        for name, count in counts.items():
+            totals[name] += count
+        if verbose:
+            print(
+                f"  {chunk_kind} {len(chunk)} 行，至 {path.name} "
+                f"(新增 {counts['inserted']} / 更新 {counts['updated']} / 未变化 {counts['unchanged']})"
+            )
+    return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量导入历史 CSV / JSONL 到本地 SQLite")
+    parser.add_argument("paths", nargs="+", help="文件、目录或通配符")
+    parser.add_argument("--db", default=str(storage_sqlite.DB_PATH), help="SQLite 文件路径")
+    parser.add_argument(
+        "--type", choices=sorted(INSERTERS), default=None, help="榜单类型（默认按文件名 / 字段判断）"
+    )
+    parser.add_argument("--chunk-size", type=int, default=5000, help="每个事务写入的行数")
+    parser.add_argument("--workers", type=int, default=1, help="并行解析文件的进程数")
+    parser.add_argument("--quiet", action="store_true", help="只输出汇总")
+    args = parser.parse_args()
+
+    files = expand_paths(args.paths)
+    if not files:
+        raise SystemExit("没有找到可导入的文件。")
+
+    started = time.perf_counter()
+    totals = import_files(
+        files,
+        Path(args.db),
+        kind=args.type,
+        chunk_size=max(1, args.chunk_size),
+        workers=max(1, args.workers),
+        verbose=not args.quiet,
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"导入完成：{totals['files']} 个文件，{totals['rows']} 行，"
+        f"新增 {totals['inserted']}，更新 {totals['updated']}，未变化 {totals['unchanged']}，"
+        f"耗时 {elapsed:.1f}s（{totals['rows'] / max(elapsed, 1e-9):.0f} 行/秒）"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""采集数据的扇出写入：一次请求只校验、归一化一次，把同一批行并行交给多个写入端（sink）。
+
+- SqliteSink：写入本地库（按自然键去重，直接使用预先归一化的行）；
+- FeishuSink：提交飞书上传任务（upload_job 表 + 后台上传，接口不等待飞书返回）；
+- CsvArchiveSink：按获取时间追加到与扩展「下载 CSV」相同格式的归档文件，可再交给 import_history.py。
+
+各写入端在线程池中同时执行，请求耗时约等于最慢的一个；某个写入端失败不影响其他写入端，
+结果中分别给出每个写入端的状态。新增写入端只需继承 Sink 并实现 write。
+"""
+
+from __future__ import annotations
+
+import abc
+import contextvars
+import csv
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import metrics
+import storage_sqlite
+from import_history import CSV_HEADERS
+
+SINK_NAMES = ("sqlite", "feishu", "csv")
+
+
+def clean_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """统一取值：None 变为空串，其余转成去掉首尾空白的字符串（字段名保持扩展上报的原样）。"""
+    return [
+        {key: "" if value is None else str(value).strip() for key, value in row.items()}
+        for row in rows
+    ]
+
+
+class Capture:
+    """一次采集提交：清理后的原始行（飞书字段映射按它取值）与入库归一化结果，各写入端只读共享。"""
+
+    def __init__(self, kind: str, rows: List[Dict[str, Any]]) -> None:
+        self.kind = kind
+        self.rows = clean_rows(rows)
+        # 档位解析与检索分词也在这里做一次，SQLite 写入端不再重复
+        self.normalized, self.derived = storage_sqlite.prepare_rows(kind, self.rows)
+
+
+class Sink(abc.ABC):
+    """写入端：write(capture) 返回该写入端的结果字段，出错直接抛异常。
+
+    未实现 write 的子类在实例化时即报错，而不是等到扇出线程里才失败。
+    """
+
+    name = "sink"
+
+    @abc.abstractmethod
+    def write(self, capture: Capture) -> Dict[str, Any]:
+        """写入一次采集，返回该写入端的结果字段。"""
+
+
+class SqliteSink(Sink):
+    name = "sqlite"
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+
+    def write(self, capture: Capture) -> Dict[str, Any]:
+        return storage_sqlite.insert_prepared_rows(
+            capture.kind, capture.normalized, capture.derived, self.db_path
+        )
+
+
+class FeishuSink(Sink):
+    """提交到上传任务队列（UploadWorkerPool / AsyncUploadWorkerPool 的 submit）。"""
+
+    name = "feishu"
+
+    def __init__(self, upload_workers: Any) -> None:
+        self.upload_workers = upload_workers
+
+    def write(self, capture: Capture) -> Dict[str, Any]:
+        job_id = self.upload_workers.submit(capture.kind, capture.rows)
+        return {"job_id": job_id, "status": "pending"}
+
+
+class CsvArchiveSink(Sink):
+    """按获取时间追加到 directory/xhs_<kind>_rank_<YYYYMMDD>.csv（UTF-8 BOM，中文表头）。"""
+
+    name = "csv"
+
+    _locks: Dict[Path, threading.Lock] = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+
+    @classmethod
+    def _lock(cls, path: Path) -> threading.Lock:
+        with cls._locks_guard:
+            return cls._locks.setdefault(path, threading.Lock())
+
+    def write(self, capture: Capture) -> Dict[str, Any]:
+        headers = CSV_HEADERS[capture.kind]
+        by_date: Dict[str, List[Dict[str, str]]] = {}
+        for values in capture.normalized:
+            by_date.setdefault(values["fetch_date"], []).append(values)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files: List[str] = []
+        for fetch_date, values_list in sorted(by_date.items()):
+            stamp = fetch_date.replace("-", "") or "undated"
+            path = self.directory / f"xhs_{capture.kind}_rank_{stamp}.csv"
+            with self._lock(path):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                if not path.exists() or path.stat().st_size == 0:
+                    buffer.write("\ufeff")
+                    writer.writerow(list(headers))
+                for values in values_list:
+                    writer.writerow([values[column] for column in headers.values()])
+                # 整块一次追加：多进程同时写同一文件时行不会交错
+                with open(path, "a", encoding="utf-8", newline="") as f:
+                    f.write(buffer.getvalue())
+            files.append(path.name)
+        return {"files": files, "rows": len(capture.normalized)}
+
+
+class FanOut:
+    """在线程池中并行执行各写入端；线程池按进程懒创建（fork 出的工作进程各自新建）。"""
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="sink"
+                )
+            return self._executor
+
+    def run(self, capture: Capture, sinks: Sequence[Sink]) -> Dict[str, Dict[str, Any]]:
+        """同时执行所有写入端，返回 {写入端名: {"ok": bool, ...结果或 "error"}}。"""
+
+        def call(sink: Sink) -> Dict[str, Any]:
+            with metrics.phase(f"sink.{sink.name}"):
+                return sink.write(capture)
+
+        pool = self._pool()
+        # 复制上下文：写入端线程里的 SQL 与阶段耗时仍记到当前请求的追踪上
+        futures = [
+            (sink, pool.submit(contextvars.copy_context().run, call, sink)) for sink in sinks
+        ]
+        results: Dict[str, Dict[str, Any]] = {}
+        for sink, future in futures:
+            try:
+                results[sink.name] = {"ok": True, **future.result()}
+            except (Exception, SystemExit) as exc:  # upload_to_feishu 配置错误时抛 SystemExit
+                results[sink.name] = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        return results
@@ -0,0 +1,111 @@
+"""区间指标解析与档位登记表：SQLite 入库、飞书字段映射与统计接口共用。
+
+榜单指标以区间文本出现（"1000-3000"、"5万-7万"、"10万以上"、"￥0-1000"、"0-5%"），
+不同取值只有几十种，而行数以万计，因此解析结果按文本缓存在有界 LRU 中，
+整列解析时只对去重后的取值各解析一次。
+
+档位编码 = 区间下界落在 BAND_EDGES 中的第几档（1 起），低于首档为 0；
+百分比按百分数保存（"5%" -> 5.0）。
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 各指标档位的下界（升序）。原始文本仍按 TEXT 保存，档位只用于筛选、排序和统计。
+BAND_EDGES: Dict[str, List[float]] = {
+    "read_count": [1000, 3000, 5000, 7000, 9000, 1e4, 3e4, 5e4, 7e4, 1e5],
+    "click_rate": [0, 5, 15, 25, 50, 70],
+    "pay_conversion_rate": [0, 5, 15, 25, 50, 70],
+    "gmv": [0, 1000, 3000, 5000, 1e4, 5e4, 1e5, 5e5, 1e6],
+    "fans_count": [0, 1000, 5000, 1e4, 5e4, 1e5, 5e5, 1e6],
+}
+
+CACHE_SIZE = 4096
+
+Interval = Tuple[Optional[float], Optional[float]]
+Band = Tuple[Optional[int], Optional[float], Optional[float]]
+
+_UNIT_SCALE = {"万": 1e4, "w": 1e4, "千": 1e3, "k": 1e3, "亿": 1e8}
+_NUMBER_PATTERN = r"(\d+(?:\.\d+)?)([万千亿wk]?)"
+_RANGE_RE = re.compile(rf"^{_NUMBER_PATTERN}[-~～—–至]{_NUMBER_PATTERN}$")
+_SINGLE_RE = re.compile(rf"^{_NUMBER_PATTERN}(以上|以下|\+)?$")
+_NOISE_RE = re.compile(r"[\s,，￥¥%元]")
+
+
+def _scaled(number: str, unit: str) -> float:
+    return float(number) * _UNIT_SCALE.get(unit, 1.0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_interval(text: str) -> Interval:
+    """解析 "1万-3万" / "5%-15%" / "￥1000-3000" / "10万以上" / "1,007" 为 (下界, 上界)。
+
+    开区间的一侧为 None；无法解析时返回 (None, None)。
+    """
+    cleaned = _NOISE_RE.sub("", text or "").lower()
+    if not cleaned:
+        return None, None
+    match = _RANGE_RE.match(cleaned)
+    if match:
+        return _scaled(match.group(1), match.group(2)), _scaled(match.group(3), match.group(4))
+    match = _SINGLE_RE.match(cleaned)
+    if match:
+        value = _scaled(match.group(1), match.group(2))
+        suffix = match.group(3)
+        if suffix in ("以上", "+"):
+            return value, None
+        if suffix == "以下":
+            return None, value
+        return value, value
+    return None, None
+
+
+def parse_number(text: str) -> Optional[float]:
+    """单个数值（"1,187"、"1.2万"、"35%"）；区间或无法解析时返回 None。"""
+    lower, upper = parse_interval(text)
+    return lower if lower is not None and lower == upper else None
+
+
+def band_code(metric: str, lower: Optional[float], upper: Optional[float]) -> Optional[int]:
+    """区间对应的档位编码；下界缺失时按上界定位，两侧都缺失返回 None。
+
+    「X以下」不含 X 本身，落在以 X 为上界的档位（bisect_left），而不是以 X 开头的档位。
+    """
+    if lower is not None:
+        return bisect_right(BAND_EDGES[metric], lower)
+    if upper is None:
+        return None
+    return bisect_left(BAND_EDGES[metric], upper)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_band(metric: str, text: str) -> Band:
+    """(档位编码, 下界, 上界)，按 (指标, 文本) 缓存。"""
+    lower, upper = parse_interval(text)
+    return band_code(metric, lower, upper), lower, upper
+
+
+def parse_column(metric: str, values: Iterable[str]) -> List[Band]:
+    """整列解析：去重后每个取值只解析一次，按输入顺序返回 (档位, 下界, 上界)。"""
+    values = list(values)
+    parsed = {text: parse_band(metric, text) for text in dict.fromkeys(values)}
+    return [parsed[text] for text in values]
+
+
+def band_bounds(metric: str, code: int) -> Interval:
+    """档位编码对应的下界区间 [edges[code-1], edges[code])；0 档下界为 None，末档上界为 None。"""
+    edges = BAND_EDGES[metric]
+    if code < 0 or code > len(edges):
+        raise ValueError(f"{metric} 没有档位 {code}")
+    lower = edges[code - 1] if code > 0 else None
+    upper = edges[code] if code < len(edges) else None
+    return lower, upper
+
+
+def cache_clear() -> None:
+    parse_interval.cache_clear()
+    parse_band.cache_clear()
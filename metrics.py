@@ -0,0 +1,360 @@
+"""进程内指标：计数器 / 直方图以 Prometheus 文本格式输出（/metrics），外加慢请求日志。
+
+- 每个 HTTP 请求按路由模板（如 /api/upload_jobs/<job_id>）记录次数与耗时；
+- phase(name) 记录请求内部各阶段（JSON 解析、校验、入库、飞书 token / 每批写入、
+  rank_change 的 Python 拼接等）的耗时；
+- storage_sqlite 的连接把每条 SQL 的执行时间报到 record_statement；
+- 请求耗时超过阈值时，把该请求内的 SQL 文本、参数与各阶段耗时写入慢请求日志（JSONL），
+  总耗时减去 SQL 耗时即 Python 侧（拼接 / 序列化）的开销。
+
+不依赖 prometheus_client。指标只在本进程内累计：多进程部署时每个工作进程各自计数。
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """单调递增计数器（按标签分组）。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram:
+    """累积分桶直方图（秒），同时输出 _sum 与 _count。"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数（非累积，末位为 +Inf）, 总和]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += seconds
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        lines: List[str] = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# collector() 在每次抓取时调用，返回 [(指标名, 类型, 说明, [(标签字典, 值), ...]), ...]
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], List[Tuple[str, str, str, List[Sample]]]]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Any] = []
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector) -> None:
+        """注册抓取时才计算的指标（如缓存命中数、任务队列长度）。"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）。"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as exc:  # 某个采集失败不影响其余指标
+                lines.append(f"# collector error: {_escape(str(exc))}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "xhs_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "xhs_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+PHASE_LATENCY = REGISTRY.histogram(
+    "xhs_phase_duration_seconds", "Latency of named phases inside requests and upload jobs.", ("phase",)
+)
+SQL_STATEMENTS = REGISTRY.counter(
+    "xhs_sqlite_statements_total", "SQLite statements executed, by leading keyword.", ("kind",)
+)
+SQL_LATENCY = REGISTRY.histogram(
+    "xhs_sqlite_statement_duration_seconds",
+    "SQLite statement time (execute plus first fetch), by leading keyword.",
+    ("kind",),
+)
+SLOW_REQUESTS = REGISTRY.counter(
+    "xhs_slow_requests_total", "Requests slower than the slow-request threshold.", ("route",)
+)
+
+
+# ---- 请求追踪与慢请求日志 ----
+
+# 慢请求记录中最多保留的 SQL 条数，参数 repr 的最大长度
+MAX_TRACE_STATEMENTS = 100
+MAX_PARAMS_CHARS = 300
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def statement_kind(sql: str) -> str:
+    """SQL 的首个关键字（select / insert / update / ...），用作指标标签。"""
+    head = sql.lstrip().split(None, 1)
+    return head[0].lower() if head else ""
+
+
+@lru_cache(maxsize=1024)
+def _compact_sql(sql: str) -> str:
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def _params_text(params: Any, many: bool) -> str:
+    """参数摘要：executemany 只取行数与第一行（不复制参数列表；生成器此时已被消费）。"""
+    if many:
+        try:
+            count = len(params)
+            text = f"{count} rows, first={params[0]!r}" if count else "0 rows"
+        except (TypeError, KeyError, IndexError):
+            text = "rows from an iterator"
+    else:
+        text = repr(params)
+    return text if len(text) <= MAX_PARAMS_CHARS else text[: MAX_PARAMS_CHARS - 3] + "..."
+
+
+class RequestTrace:
+    """一个请求内的 SQL 与阶段耗时；只在请求超过阈值时才会被序列化。"""
+
+    __slots__ = ("method", "path", "query", "started", "statements", "phases", "sql_seconds", "dropped")
+
+    def __init__(self, method: str, path: str, query: str) -> None:
+        self.method = method
+        self.path = path
+        self.query = query
+        self.started = time.perf_counter()
+        # (sql, 参数摘要, 秒)：记录时就转成摘要，不持有 executemany 的整批参数
+        self.statements: List[Tuple[str, str, float]] = []
+        self.phases: List[Tuple[str, float]] = []
+        self.sql_seconds = 0.0
+        self.dropped = 0
+
+    def to_dict(self, route: str, status: int, seconds: float) -> Dict[str, Any]:
+        return {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "route": route,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2),
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "phases": [{"name": name, "ms": round(s * 1000, 2)} for name, s in self.phases],
+            "statements": [
+                {"sql": _compact_sql(sql), "params": params, "ms": round(s * 1000, 2)}
+                for sql, params, s in self.statements
+            ],
+            "dropped_statements": self.dropped,
+        }
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("xhs_request_trace", default=None)
+
+
+class SlowRequestLog:
+    """把超过 threshold_ms 的请求追加到 JSONL 文件（path 为 None 时只打印摘要）。"""
+
+    def __init__(self, threshold_ms: float = 500.0, path: Optional[Path] = None) -> None:
+        self.threshold_ms = threshold_ms
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        print(
+            f"慢请求 {record['method']} {record['path']} {record['duration_ms']} ms"
+            f"（SQL {record['sql_ms']} ms，{len(record['statements'])} 条语句）"
+        )
+        if self.path is None:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+slow_log = SlowRequestLog()
+
+
+def configure_slow_log(threshold_ms: float, path: Optional[Path]) -> None:
+    slow_log.threshold_ms = threshold_ms
+    slow_log.path = Path(path) if path else None
+
+
+def begin_request(method: str, path: str, query: str = "") -> Any:
+    """开始追踪当前请求；返回值交给 end_request。"""
+    trace = RequestTrace(method, path, query)
+    return trace, _current_trace.set(trace)
+
+
+def end_request(handle: Any, route: str, status: int) -> float:
+    """结束追踪：记录路由耗时，超过阈值写慢请求日志；返回请求耗时（秒）。"""
+    trace, token = handle
+    _current_trace.reset(token)
+    seconds = time.perf_counter() - trace.started
+    HTTP_REQUESTS.inc(1, trace.method, route, str(status))
+    HTTP_LATENCY.observe(seconds, trace.method, route)
+    if seconds * 1000 >= slow_log.threshold_ms:
+        SLOW_REQUESTS.inc(1, route)
+        try:
+            slow_log.write(trace.to_dict(route, status, seconds))
+        except OSError as exc:  # 日志写失败不影响请求
+            print(f"写慢请求日志失败：{exc}")
+    return seconds
+
+
+def record_statement(sql: str, params: Any, seconds: float, many: bool = False) -> None:
+    """由 storage_sqlite 的连接调用：计数、计时，并挂到当前请求的追踪上。"""
+    kind = statement_kind(sql)
+    SQL_STATEMENTS.inc(1, kind)
+    SQL_LATENCY.observe(seconds, kind)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.sql_seconds += seconds
+        if len(trace.statements) < MAX_TRACE_STATEMENTS:
+            trace.statements.append((sql, _params_text(params, many), seconds))
+        else:
+            trace.dropped += 1
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """记录一个阶段的耗时（直方图 + 当前请求的追踪）。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        PHASE_LATENCY.observe(seconds, name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.phases.append((name, seconds))
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,146 @@
+"""读接口的进程内响应缓存：按「接口 + 规范化查询参数 + 数据版本号」缓存序列化好的 JSON。
+
+榜单数据只在扩展上报或导入时变化，写入会让 storage_sqlite 的数据版本号加一，
+旧版本的缓存项因此自然失效（键中带版本号，不会再被命中，随 LRU 淘汰）。
+每个响应带 ETag（由版本号与请求键导出）和 Last-Modified（版本更新时间），
+浏览器重复查看时发送 If-None-Match，数据没变就直接返回 304，不查库也不序列化。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, make_response, request
+
+CacheKey = Tuple[str, Tuple[Tuple[str, Tuple[str, ...]], ...], int]
+
+# 只要出现就改变接口行为的参数：空值也要留在键里（如 cursor= 表示游标分页的第一页）
+PRESENCE_PARAMS = frozenset({"cursor"})
+
+
+class ResponseCache:
+    """线程安全的 LRU：同时限制条目数与正文总字节数，超出时淘汰最久未用的条目。"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, Tuple[bytes, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: CacheKey, body: bytes, mimetype: str) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._entries[key] = (body, mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+            }
+
+
+def cache_key(endpoint: str, args: Any, version: int) -> CacheKey:
+    """规范化查询参数：按参数名排序，丢弃空值（接口把空串视同未传），保留重复参数的顺序。
+
+    PRESENCE_PARAMS 中的参数即使为空也保留参数名。
+    """
+    params = tuple(
+        sorted(
+            (name, tuple(v for v in args.getlist(name) if v != ""))
+            for name in set(args.keys())
+        )
+    )
+    return endpoint, tuple(p for p in params if p[1] or p[0] in PRESENCE_PARAMS), version
+
+
+def _etag(key: CacheKey) -> str:
+    digest = hashlib.sha1(repr(key[:2]).encode("utf-8")).hexdigest()[:16]
+    return f"v{key[2]}-{digest}"
+
+
+def _parse_updated_at(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def cached_json(cache: ResponseCache, version_source: Callable[[], Tuple[int, str]]) -> Callable:
+    """Flask 视图装饰器：命中缓存直接返回缓存的正文；只缓存 200 响应。
+
+    version_source 返回 (数据版本号, 更新时间 ISO 字符串)，每个请求调用一次。
+    """
+
+    def decorator(view: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            version, updated_at = version_source()
+            key = cache_key(request.path, request.args, version)
+            etag = _etag(key)
+            last_modified = _parse_updated_at(updated_at)
+
+            if request.if_none_match.contains(etag):
+                cache.record_not_modified()
+                response = Response(status=304)
+            else:
+                entry = cache.get(key)
+                if entry is not None:
+                    response = Response(entry[0], mimetype=entry[1])
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cache.put(key, response.get_data(), response.mimetype)
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # 每次都向服务端确认（带 If-None-Match），数据没变时只返回 304
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
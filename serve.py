@@ -0,0 +1,154 @@
+"""生产方式启动本地 API：用 waitress（多线程）、gunicorn（多进程 × 多线程）托管 feishu_api.app，
+或用 uvicorn 运行 ASGI 版本 feishu_api_async.app（单进程事件循环，飞书上传不占线程）。
+
+`python feishu_api.py` 是 Flask 自带的开发服务器，只适合调试；批量回灌、多人同时查看
+或导出大文件时请改用本脚本：
+
+    python serve.py                              # 自动选择：有 gunicorn 且非 Windows 用 gunicorn，否则 waitress
+    python serve.py --server waitress --threads 16
+    python serve.py --server gunicorn --workers 4 --threads 8
+    python serve.py --server uvicorn --threads 8     # 需要 pip install uvicorn httpx
+
+服务器都是可选依赖（pip install waitress / gunicorn / uvicorn），按需安装其一即可。
+
+多进程时：
+- 主进程导入 feishu_api 时完成建表与迁移（只执行一次），随后 fork 出的各工作进程
+  各自打开 SQLite 连接（storage_sqlite.get_engine 按进程区分）；
+- 写入以 BEGIN IMMEDIATE 开始，进程之间由 SQLite 的文件锁串行化，WAL 下读不阻塞写；
+- 每个工作进程各自运行 UPLOAD_WORKERS 个上传线程，任务在数据库中原子领取，不会重复上传；
+- 响应缓存在进程内，键中带数据库里的数据版本号，任一进程写入后所有进程的旧缓存都会失效。
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from typing import Any, Dict, Optional
+
+try:
+    import config_local as _cfg  # type: ignore
+except ImportError:  # pragma: no cover - 运行时检查
+    _cfg = None  # type: ignore
+
+SERVER_WORKERS: int = getattr(_cfg, "SERVER_WORKERS", 2) if _cfg is not None else 2
+SERVER_THREADS: int = getattr(_cfg, "SERVER_THREADS", 8) if _cfg is not None else 8
+
+SERVERS = ("auto", "waitress", "gunicorn", "uvicorn")
+
+
+def _has_module(name: str) -> bool:
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_server(name: str) -> str:
+    if name != "auto":
+        return name
+    if os.name != "nt" and _has_module("gunicorn"):
+        return "gunicorn"
+    if _has_module("waitress"):
+        return "waitress"
+    raise SystemExit("未安装 waitress 或 gunicorn，请先执行 pip install waitress（Windows）或 pip install gunicorn。")
+
+
+def serve_waitress(host: str, port: int, threads: int) -> None:
+    """单进程多线程（Windows / macOS / Linux 通用）。"""
+    try:
+        from waitress import serve  # type: ignore
+    except ImportError:
+        raise SystemExit("未安装 waitress，请先执行 pip install waitress。")
+
+    import feishu_api
+
+    feishu_api.upload_workers.start()
+    print(f"waitress: http://{host}:{port}  threads={threads}")
+    serve(feishu_api.app, host=host, port=port, threads=threads)
+
+
+def serve_gunicorn(host: str, port: int, workers: int, threads: int, timeout: int) -> None:
+    """多进程（pre-fork）× 每进程多线程（gthread），仅 macOS / Linux。"""
+    try:
+        from gunicorn.app.base import BaseApplication  # type: ignore
+    except ImportError:
+        raise SystemExit("未安装 gunicorn，请先执行 pip install gunicorn（不支持 Windows，可改用 --server waitress）。")
+
+    # 在主进程导入：建表 / 迁移只跑一次，工作进程 fork 后直接复用已加载的代码
+    import feishu_api
+
+    def post_fork(server: Any, worker: Any) -> None:
+        # 线程不会随 fork 复制，上传线程在每个工作进程里各自启动
+        feishu_api.upload_workers.start()
+
+    class _Application(BaseApplication):  # type: ignore[misc]
+        def __init__(self, options: Dict[str, Any]) -> None:
+            self.options = options
+            super().__init__()
+
+        def load_config(self) -> None:
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            return feishu_api.app
+
+    options: Dict[str, Any] = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        # gthread 的心跳由主线程负责，长时间的导出 / 上传请求不会触发超时重启
+        "timeout": timeout,
+        "post_fork": post_fork,
+        "accesslog": None,
+    }
+    print(f"gunicorn: http://{host}:{port}  workers={workers} threads={threads}")
+    _Application(options).run()
+
+
+def serve_uvicorn(host: str, port: int, workers: int, threads: int) -> None:
+    """ASGI：每个进程一个事件循环，threads 为执行 SQLite 访问的线程数。"""
+    try:
+        import uvicorn  # type: ignore
+    except ImportError:
+        raise SystemExit("未安装 uvicorn，请先执行 pip install uvicorn httpx。")
+
+    import feishu_api_async
+
+    print(f"uvicorn: http://{host}:{port}  workers={workers} db_threads={threads}")
+    if workers == 1:
+        feishu_api_async.app.db_threads = threads
+        uvicorn.run(feishu_api_async.app, host=host, port=port, log_level="warning")
+    else:
+        # 多进程时 uvicorn 按导入路径在各子进程中重新加载应用，线程数取配置 ASYNC_DB_THREADS
+        uvicorn.run("feishu_api_async:app", host=host, port=port, workers=workers, log_level="warning")
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="以生产方式启动本地 API 服务（waitress / gunicorn）")
+    parser.add_argument("--server", choices=SERVERS, default="auto")
+    # 默认仅本机访问，与 feishu_api.py 一致
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="默认取配置中的 API_PORT")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（gunicorn 默认 SERVER_WORKERS，uvicorn 默认 1）")
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS, help="每个进程的请求线程数")
+    parser.add_argument("--timeout", type=int, default=120, help="gunicorn 工作进程无响应多久后重启（秒）")
+    args = parser.parse_args(argv)
+
+    server = resolve_server(args.server)
+    import feishu_api
+
+    port = args.port or feishu_api.API_PORT
+    threads = max(1, args.threads)
+    if server == "waitress":
+        serve_waitress(args.host, port, threads)
+    elif server == "uvicorn":
+        serve_uvicorn(args.host, port, max(1, args.workers or 1), threads)
+    else:
+        serve_gunicorn(args.host, port, max(1, args.workers or SERVER_WORKERS), threads, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
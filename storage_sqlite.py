@@ -1,480 +1,3678 @@
 from __future__ import annotations
 
+import base64
+import itertools
+import json
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import intervals
+import metrics
 
 DB_PATH = Path("data/xhs_rank.db")
 
 
-def _ensure_db_dir(db_path: Path) -> None:
-  db_path.parent.mkdir(parents=True, exist_ok=True)
+def _ensure_db_dir(db_path: Path) -> None:
+  db_path.parent.mkdir(parents=True, exist_ok=True)
+
+
+def _now_iso(offset_seconds: float = 0) -> str:
+  tz = timezone(timedelta(hours=8))  # 东八区
+  return (datetime.now(tz) + timedelta(seconds=offset_seconds)).isoformat(timespec="seconds")
+
+
+def _new_uuid() -> str:
+  return str(uuid.uuid4())
+
+
+def _normalize_value(value: Any) -> str:
+  # Store as text for flexibility (区间、百分比等)
+  if value is None:
+    return ""
+  return str(value).strip()
+
+
+# ---- 区间指标解析：入库时解析一次，写入档位编码与数值上下界 ----
+
+# 档位登记表与区间解析在 intervals 模块（带 LRU 缓存，与飞书映射、统计接口共用）
+BAND_EDGES = intervals.BAND_EDGES
+
+NOTE_BAND_METRICS: List[str] = ["read_count", "click_rate", "pay_conversion_rate", "gmv"]
+ACCOUNT_BAND_METRICS: List[str] = [
+  "fans_count",
+  "read_count",
+  "click_rate",
+  "pay_conversion_rate",
+  "gmv",
+]
+
+
+def _band_values(metrics: List[str], values: Dict[str, str]) -> List[Any]:
+  """Return [band, lo, hi] for every metric, flattened in metric order."""
+  out: List[Any] = []
+  for metric in metrics:
+    out.extend(intervals.parse_band(metric, values.get(metric, "")))
+  return out
+
+
+def _band_rows(metrics: List[str], rows: List[Dict[str, str]]) -> List[List[Any]]:
+  """_band_values for many rows, parsed column by column (distinct strings once)."""
+  out: List[List[Any]] = [[] for _ in rows]
+  for metric in metrics:
+    for values, band in zip(out, intervals.parse_column(metric, (r.get(metric, "") for r in rows))):
+      values.extend(band)
+  return out
+
+
+def _band_columns(metrics: List[str]) -> List[str]:
+  cols: List[str] = []
+  for metric in metrics:
+    cols.extend((f"{metric}_band", f"{metric}_lo", f"{metric}_hi"))
+  return cols
+
+
+def _table_columns(conn: sqlite3.Connection, table: str, schema: str = "main") -> List[str]:
+  return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _migrate_band_columns(
+  conn: sqlite3.Connection, table: str, metrics: List[str]
+) -> None:
+  """Add band/lo/hi columns to an existing table and backfill them once."""
+  existing = set(_table_columns(conn, table))
+  for metric in metrics:
+    for col, col_type in (
+      (f"{metric}_band", "INTEGER"),
+      (f"{metric}_lo", "REAL"),
+      (f"{metric}_hi", "REAL"),
+    ):
+      if col not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+
+  select_cols = ", ".join(metrics)
+  rows = conn.execute(f"SELECT rowid, {select_cols} FROM {table}").fetchall()
+  set_sql = ", ".join(f"{col} = ?" for col in _band_columns(metrics))
+  bands = _band_rows(metrics, [dict(zip(metrics, row[1:])) for row in rows])
+  conn.executemany(
+    f"UPDATE {table} SET {set_sql} WHERE rowid = ?",
+    [(*band, row[0]) for band, row in zip(bands, rows)],
+  )
+
+  conn.execute(
+    f"CREATE INDEX IF NOT EXISTS idx_{table}_fetch_created "
+    f"ON {table} (fetch_date, created_at)"
+  )
+  for metric in metrics:
+    conn.execute(
+      f"CREATE INDEX IF NOT EXISTS idx_{table}_{metric}_band "
+      f"ON {table} ({metric}_band, {metric}_lo)"
+    )
+
+
+def _migrate_v1(conn: sqlite3.Connection) -> None:
+  _migrate_band_columns(conn, "note_rank", NOTE_BAND_METRICS)
+  _migrate_band_columns(conn, "account_rank", ACCOUNT_BAND_METRICS)
+  conn.execute(
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_created ON audit_log (created_at)"
+  )
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> None:
+  # 游标分页按 (fetch_date, created_at, uuid) 排序，索引需要覆盖完整的排序键
+  for table in ("note_rank", "account_rank"):
+    conn.execute(f"DROP INDEX IF EXISTS idx_{table}_fetch_created")
+    conn.execute(
+      f"CREATE INDEX IF NOT EXISTS idx_{table}_fetch_created_uuid "
+      f"ON {table} (fetch_date, created_at, uuid)"
+    )
+  conn.execute("DROP INDEX IF EXISTS idx_audit_log_created")
+  conn.execute(
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_created_uuid ON audit_log (created_at, uuid)"
+  )
+
+  # 按 (表, fetch_date) 维护的行数计数，列表接口的 total 不再每次 COUNT 全表
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS row_counts (
+      table_name TEXT NOT NULL,
+      fetch_date TEXT NOT NULL,
+      row_count INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (table_name, fetch_date)
+    )
+    """
+  )
+  conn.execute("DELETE FROM row_counts")
+  for table in ("note_rank", "account_rank"):
+    conn.execute(
+      f"""
+      INSERT INTO row_counts (table_name, fetch_date, row_count)
+      SELECT '{table}', COALESCE(fetch_date, ''), COUNT(1)
+      FROM {table}
+      GROUP BY COALESCE(fetch_date, '')
+      """
+    )
+  conn.execute(
+    """
+    INSERT INTO row_counts (table_name, fetch_date, row_count)
+    SELECT 'audit_log', '', COUNT(1) FROM audit_log
+    """
+  )
+
+
+def _migrate_v3(conn: sqlite3.Connection) -> None:
+  _create_rank_change_tables(conn)
+  for kind in RANK_KINDS:
+    _rebuild_rank_change_kind(conn, kind)
+
+
+def _migrate_v4(conn: sqlite3.Connection) -> None:
+  # 飞书上传任务队列：与榜单数据同库，进程重启后未完成的任务继续执行
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS upload_job (
+      id TEXT PRIMARY KEY,
+      kind TEXT NOT NULL,
+      status TEXT NOT NULL,
+      payload TEXT NOT NULL,
+      row_count INTEGER NOT NULL,
+      uploaded INTEGER NOT NULL DEFAULT 0,
+      attempts INTEGER NOT NULL DEFAULT 0,
+      max_attempts INTEGER NOT NULL,
+      last_error TEXT,
+      next_attempt_at TEXT NOT NULL,
+      lease_until TEXT,
+      created_at TEXT NOT NULL,
+      updated_at TEXT NOT NULL,
+      finished_at TEXT
+    )
+    """
+  )
+  conn.execute(
+    "CREATE INDEX IF NOT EXISTS idx_upload_job_status "
+    "ON upload_job (status, next_attempt_at)"
+  )
+  conn.execute(
+    "CREATE INDEX IF NOT EXISTS idx_upload_job_created ON upload_job (created_at)"
+  )
+
+
+def _migrate_v5(conn: sqlite3.Connection) -> None:
+  # 上传任务的批次检查点：每批的 client_token 与记录内容哈希在首次执行时固定下来，
+  # 重试时从第一个未确认的批次继续
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS upload_batch (
+      job_id TEXT NOT NULL,
+      batch_index INTEGER NOT NULL,
+      table_key TEXT NOT NULL,
+      client_token TEXT NOT NULL,
+      record_hashes TEXT NOT NULL,
+      record_count INTEGER NOT NULL,
+      status TEXT NOT NULL,
+      record_ids TEXT,
+      updated_at TEXT NOT NULL,
+      PRIMARY KEY (job_id, batch_index)
+    ) WITHOUT ROWID
+    """
+  )
+  # 已确认写入飞书的记录（按多维表 + 内容哈希去重），跨任务跳过重复上传
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS feishu_record (
+      table_key TEXT NOT NULL,
+      content_hash TEXT NOT NULL,
+      record_id TEXT,
+      job_id TEXT,
+      created_at TEXT NOT NULL,
+      PRIMARY KEY (table_key, content_hash)
+    ) WITHOUT ROWID
+    """
+  )
+
+
+def _migrate_v6(conn: sqlite3.Connection) -> None:
+  # 自然键去重：同一天重复保存的行只保留最早的一条（保持原排名位置），再加唯一索引
+  for table, keys in NATURAL_KEYS.items():
+    key_sql = ", ".join(keys)
+    duplicate_sql = (
+      f"SELECT rowid FROM {table} WHERE rowid NOT IN "
+      f"(SELECT MIN(rowid) FROM {table} GROUP BY {key_sql})"
+    )
+    has_search = conn.execute(
+      "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{table}_search",)
+    ).fetchone()
+    if has_search:
+      conn.execute(f"DELETE FROM {table}_search WHERE rowid IN ({duplicate_sql})")
+    removed = conn.execute(f"DELETE FROM {table} WHERE rowid IN ({duplicate_sql})").rowcount
+    conn.execute(
+      f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_natural_key ON {table} ({key_sql})"
+    )
+    if not removed:
+      continue
+    conn.execute("DELETE FROM row_counts WHERE table_name = ?", (table,))
+    conn.execute(
+      f"""
+      INSERT INTO row_counts (table_name, fetch_date, row_count)
+      SELECT '{table}', COALESCE(fetch_date, ''), COUNT(1)
+      FROM {table}
+      GROUP BY COALESCE(fetch_date, '')
+      """
+    )
+    _rebuild_rank_change_kind(conn, _KIND_BY_TABLE[table])
+
+
+def _migrate_v7(conn: sqlite3.Connection) -> None:
+  # 档位统计预聚合表：档位分布按 fetch_date，档位跃迁按相邻日期对，回填现有数据
+  _create_rank_change_tables(conn)
+  _create_band_stat_tables(conn)
+  for kind in RANK_KINDS:
+    _refresh_band_distribution(conn, kind, None)
+    _aggregate_band_transitions(conn, kind, "1=1", ())
+
+
+def _migrate_v8(conn: sqlite3.Connection) -> None:
+  # 榜单数据版本号：每次写入榜单数据时加一，读接口的响应缓存与 ETag 以它为准
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS data_version (
+      id INTEGER PRIMARY KEY CHECK (id = 1),
+      version INTEGER NOT NULL,
+      updated_at TEXT NOT NULL
+    )
+    """
+  )
+  conn.execute(
+    "INSERT OR IGNORE INTO data_version (id, version, updated_at) VALUES (1, 1, ?)",
+    (_now_iso(),),
+  )
+
+
+def _migrate_v9(conn: sqlite3.Connection) -> None:
+  # 飞书增量同步：每行记录最后一次写入时的数据版本号（旧行为 0），
+  # 以 (row_version, rowid) 作为每张多维表的同步水位；本地 uuid -> 飞书 record_id 映射
+  for table in NATURAL_KEYS:
+    if "row_version" not in _table_columns(conn, table):
+      conn.execute(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_row_version ON {table} (row_version)")
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS feishu_sync_record (
+      table_key TEXT NOT NULL,
+      uuid TEXT NOT NULL,
+      record_id TEXT NOT NULL,
+      content_hash TEXT NOT NULL,
+      synced_at TEXT NOT NULL,
+      PRIMARY KEY (table_key, uuid)
+    ) WITHOUT ROWID
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS feishu_sync_state (
+      table_key TEXT NOT NULL,
+      kind TEXT NOT NULL,
+      high_water_version INTEGER NOT NULL,
+      high_water_rowid INTEGER NOT NULL,
+      synced_at TEXT NOT NULL,
+      PRIMARY KEY (table_key, kind)
+    ) WITHOUT ROWID
+    """
+  )
+
+
+def _migrate_v10(conn: sqlite3.Connection) -> None:
+  # 冷数据分区目录：已移出主库的月份及其分区文件（相对主库所在目录），见 archive_months
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS archive_partition (
+      month TEXT PRIMARY KEY,
+      path TEXT NOT NULL,
+      note_rows INTEGER NOT NULL,
+      account_rows INTEGER NOT NULL,
+      archived_at TEXT NOT NULL
+    )
+    """
+  )
+
+
+def _rebase_open_lower_bands(
+  conn: sqlite3.Connection, table: str, metrics: List[str]
+) -> Set[str]:
+  """Recompute *_band of rows without a lower bound ("X以下"); returns the changed fetch_dates."""
+  dates: Set[str] = set()
+  for metric in metrics:
+    updates: List[Tuple[Any, ...]] = []
+    for rowid, fetch_date, upper, band in conn.execute(
+      f"SELECT rowid, fetch_date, {metric}_hi, {metric}_band FROM {table} "
+      f"WHERE {metric}_lo IS NULL AND {metric}_hi IS NOT NULL"
+    ).fetchall():
+      code = intervals.band_code(metric, None, upper)
+      if code != band:
+        updates.append((code, rowid))
+        dates.add(fetch_date)
+    conn.executemany(f"UPDATE {table} SET {metric}_band = ? WHERE rowid = ?", updates)
+  return dates
+
+
+def _migrate_v11(conn: sqlite3.Connection) -> None:
+  # 「X以下」曾按上界 bisect_right 定位，落到以 X 开头的档位；按修正后的 band_code 重算，
+  # 已归档的分区文件一并修正，再重建受影响日期的档位分布与跃迁
+  catalog = _archive_catalog(conn)
+  for kind, spec in RANK_KINDS.items():
+    table = spec["table"]
+    dates = _rebase_open_lower_bands(conn, table, spec["band_metrics"])
+    for path in catalog.values():
+      if not path.exists():
+        continue
+      part = sqlite3.connect(str(path))
+      try:
+        with part:
+          dates |= _rebase_open_lower_bands(part, table, spec["band_metrics"])
+      finally:
+        part.close()
+    dates.discard("")
+    if dates:
+      _refresh_rank_changes(conn, table, dates)
+      _refresh_band_distribution(conn, kind, dates)
+  # 已归档月份的排名变化明细不落库（见 archive_months）
+  for month in catalog:
+    conn.execute("DELETE FROM rank_change WHERE cur_date BETWEEN ? AND ?", _month_range(month))
+
+
+def _rank_order_index_sql(table: str, schema: str = "main") -> List[str]:
+  # 列表按 fetch_date、created_at 倒序，同一次采集内按 rowid 升序（采集顺序）；
+  # 普通索引末尾隐含 rowid 升序，两列建成 DESC 后正向扫描即是这个顺序，无需再排序
+  return [
+    f"DROP INDEX IF EXISTS {schema}.idx_{table}_fetch_created_uuid",
+    f"CREATE INDEX IF NOT EXISTS {schema}.idx_{table}_fetch_created "
+    f"ON {table} (fetch_date DESC, created_at DESC)",
+  ]
+
+
+def _migrate_v12(conn: sqlite3.Connection) -> None:
+  # 游标分页改按 (fetch_date, created_at, rowid)：uuid 是随机的 uuid4，
+  # 以它决胜会把同一次采集的行打乱；已归档的分区文件一并换索引
+  catalog = _archive_catalog(conn)
+  for table in ("note_rank", "account_rank"):
+    for sql in _rank_order_index_sql(table):
+      conn.execute(sql)
+    for path in catalog.values():
+      if not path.exists():
+        continue
+      part = sqlite3.connect(str(path))
+      try:
+        with part:
+          for sql in _rank_order_index_sql(table):
+            part.execute(sql)
+      finally:
+        part.close()
+
+
+# 按顺序执行的 schema 迁移；PRAGMA user_version 记录已执行到第几步。
+_MIGRATIONS = [
+  _migrate_v1,
+  _migrate_v2,
+  _migrate_v3,
+  _migrate_v4,
+  _migrate_v5,
+  _migrate_v6,
+  _migrate_v7,
+  _migrate_v8,
+  _migrate_v9,
+  _migrate_v10,
+  _migrate_v11,
+  _migrate_v12,
+]
+
+
+def _apply_migrations(conn: sqlite3.Connection) -> None:
+  version = conn.execute("PRAGMA user_version").fetchone()[0]
+  for step, migrate in enumerate(_MIGRATIONS, start=1):
+    if version >= step:
+      continue
+    migrate(conn)
+    conn.execute(f"PRAGMA user_version = {step}")
+
+
+# ---- 全文检索：FTS5 + 二元切分（bigram），支持 1~2 个汉字的短查询与 emoji ----
+
+# 每张表参与检索的字段；索引表为 <table>_search，rowid 与原表一致，列名为 <field>_grams
+SEARCH_FIELDS: Dict[str, List[str]] = {
+  "note_rank": ["title", "nickname"],
+  "account_rank": ["shop_name"],
+}
+# bm25 列权重：标题命中比昵称命中更相关
+_SEARCH_WEIGHTS: Dict[str, List[float]] = {
+  "note_rank": [2.0, 1.0],
+  "account_rank": [1.0],
+}
+
+
+def _gram_token(chars: str) -> str:
+  # 把字符编码成 ASCII 词元（"我的" -> "6211x7684"），任何分词器都不会再拆分或丢弃 emoji/标点
+  return "x".join(f"{ord(ch):x}" for ch in chars) + ("x" if len(chars) == 1 else "")
+
+
+def _search_grams(text: str) -> str:
+  """Bigram tokens of text (case-folded, whitespace removed) plus the last char alone."""
+  chars = "".join(text.casefold().split())
+  if not chars:
+    return ""
+  tokens = [_gram_token(chars[i : i + 2]) for i in range(len(chars) - 1)]
+  tokens.append(_gram_token(chars[-1]))
+  return " ".join(tokens)
+
+
+def _search_match(q: str) -> Optional[str]:
+  """FTS5 MATCH expression for a substring query, or None when q is blank."""
+  chars = "".join(q.casefold().split())
+  if not chars:
+    return None
+  if len(chars) == 1:
+    return _gram_token(chars) + "*"
+  return '"' + " ".join(_gram_token(chars[i : i + 2]) for i in range(len(chars) - 1)) + '"'
+
+
+def _search_payload(table: str, values: Dict[str, str]) -> List[str]:
+  return [_search_grams(values.get(field, "")) for field in SEARCH_FIELDS[table]]
+
+
+def _ensure_search_index(conn: sqlite3.Connection) -> bool:
+  """Create and backfill the FTS5 tables; returns False if FTS5 is not compiled in."""
+  for table, fields in SEARCH_FIELDS.items():
+    search_table = f"{table}_search"
+    exists = conn.execute(
+      "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (search_table,)
+    ).fetchone()
+    if exists:
+      continue
+    grams_cols = ", ".join(f"{field}_grams" for field in fields)
+    try:
+      conn.execute(f"CREATE VIRTUAL TABLE {search_table} USING fts5({grams_cols})")
+    except sqlite3.OperationalError:
+      return False
+    rebuild_search_index(conn, table)
+  return True
+
+
+def rebuild_search_index(conn: sqlite3.Connection, table: str) -> None:
+  """Repopulate <table>_search from the base table (after bulk deletes or VACUUM)."""
+  fields = SEARCH_FIELDS[table]
+  search_table = f"{table}_search"
+  grams_cols = ", ".join(f"{field}_grams" for field in fields)
+  placeholders = ", ".join("?" for _ in fields)
+  conn.execute(f"DELETE FROM {search_table}")
+  rows = conn.execute(f"SELECT rowid, {', '.join(fields)} FROM {table}").fetchall()
+  conn.executemany(
+    f"INSERT INTO {search_table} (rowid, {grams_cols}) VALUES (?, {placeholders})",
+    [
+      (row[0], *_search_payload(table, dict(zip(fields, row[1:]))))
+      for row in rows
+    ],
+  )
+
+
+def _index_search_rows(
+  conn: sqlite3.Connection, table: str, rows: List[Tuple[str, List[str]]]
+) -> None:
+  """Add (uuid, search payload) rows that were just inserted into table to its search index."""
+  fields = SEARCH_FIELDS[table]
+  grams_cols = ", ".join(f"{field}_grams" for field in fields)
+  placeholders = ", ".join("?" for _ in fields)
+  conn.executemany(
+    f"""
+    INSERT INTO {table}_search (rowid, {grams_cols})
+    SELECT rowid, {placeholders} FROM {table} WHERE uuid = ?
+    """,
+    [(*payload, row_uuid) for row_uuid, payload in rows],
+  )
+
+
+def _init_schema(conn: sqlite3.Connection) -> None:
+  """Create tables if they do not exist, then run pending migrations."""
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS note_rank (
+      uuid TEXT PRIMARY KEY,
+      title TEXT,
+      nickname TEXT,
+      publish_time TEXT,
+      read_count TEXT,
+      click_rate TEXT,
+      pay_conversion_rate TEXT,
+      gmv TEXT,
+      fetch_date TEXT,
+      created_at TEXT
+    )
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS account_rank (
+      uuid TEXT PRIMARY KEY,
+      shop_name TEXT,
+      fans_count TEXT,
+      read_count TEXT,
+      click_rate TEXT,
+      pay_conversion_rate TEXT,
+      gmv TEXT,
+      fetch_date TEXT,
+      created_at TEXT
+    )
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS audit_log (
+      uuid TEXT PRIMARY KEY,
+      action TEXT,
+      detail TEXT,
+      created_at TEXT
+    )
+    """
+  )
+  _apply_migrations(conn)
+
+
+class _TimedCursor(sqlite3.Cursor):
+  """Cursor reporting each statement's time to metrics.record_statement.
+
+  A statement that returns rows is measured up to its first fetchone / fetchall /
+  fetchmany (where SQLite does the sorting / grouping); when the cursor is iterated
+  instead, only the execute step is counted.
+  """
+
+  _pending: Optional[Tuple[str, Any, float]] = None
+
+  def execute(self, sql: str, parameters: Any = ()) -> "_TimedCursor":
+    started = time.perf_counter()
+    super().execute(sql, parameters)
+    elapsed = time.perf_counter() - started
+    if self.description is None:
+      metrics.record_statement(sql, parameters, elapsed)
+    else:
+      self._pending = (sql, parameters, elapsed)
+    return self
+
+  def executemany(self, sql: str, seq_of_parameters: Any) -> "_TimedCursor":
+    started = time.perf_counter()
+    super().executemany(sql, seq_of_parameters)
+    metrics.record_statement(sql, seq_of_parameters, time.perf_counter() - started, many=True)
+    return self
+
+  def _flush(self, extra: float = 0.0) -> None:
+    pending = self._pending
+    if pending is not None:
+      self._pending = None
+      metrics.record_statement(pending[0], pending[1], pending[2] + extra)
+
+  def fetchone(self) -> Any:
+    started = time.perf_counter()
+    row = super().fetchone()
+    self._flush(time.perf_counter() - started)
+    return row
+
+  def fetchall(self) -> List[Any]:
+    started = time.perf_counter()
+    rows = super().fetchall()
+    self._flush(time.perf_counter() - started)
+    return rows
+
+  def fetchmany(self, size: int = 1) -> List[Any]:
+    started = time.perf_counter()
+    rows = super().fetchmany(size)
+    self._flush(time.perf_counter() - started)
+    return rows
+
+  def __iter__(self) -> "_TimedCursor":
+    self._flush()
+    return self
+
+
+class _TimedConnection(sqlite3.Connection):
+  """Connection whose execute / executemany shortcuts go through _TimedCursor."""
+
+  def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+    return self.cursor(_TimedCursor).execute(sql, parameters)
+
+  def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+    return self.cursor(_TimedCursor).executemany(sql, seq_of_parameters)
+
+
+class StorageEngine:
+  """Long-lived SQLite connections for one database file.
+
+  WAL 模式下一个写连接（串行化写入）+ 最多 max_readers 个读连接并发查询；
+  pragma 与 schema 初始化只在创建时执行一次，sqlite3 按 SQL 文本缓存已编译语句。
+  多进程部署（gunicorn 等）时每个进程各有一个引擎，进程之间由 SQLite 文件锁串行化写入。
+  """
+
+  def __init__(
+    self,
+    db_path: Path,
+    max_readers: int = 4,
+    cache_size_kb: int = 32768,
+    mmap_size: int = 256 * 1024 * 1024,
+    cached_statements: int = 256,
+  ) -> None:
+    self.db_path = Path(db_path)
+    self.pid = os.getpid()
+    self.max_readers = max(1, max_readers)
+    self._cache_size_kb = cache_size_kb
+    self._mmap_size = mmap_size
+    self._cached_statements = cached_statements
+
+    _ensure_db_dir(self.db_path)
+    self._writer = self._connect()
+    self._writer.execute("PRAGMA journal_mode=WAL;")
+    self._writer_lock = threading.RLock()
+    with self.writer() as conn:
+      _init_schema(conn)
+      # FTS5 缺失（极少数精简编译的 SQLite）时关键词查询退回 LIKE
+      self.has_search = _ensure_search_index(conn)
+
+    self._idle_readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+    self._reader_count = 0
+    self._reader_lock = threading.Lock()
+
+  def _connect(self) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+      self.db_path,
+      timeout=30,
+      check_same_thread=False,
+      cached_statements=self._cached_statements,
+      # 每条语句的耗时计入 /metrics，并挂到慢请求日志上
+      factory=_TimedConnection,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA cache_size=-{self._cache_size_kb};")
+    conn.execute(f"PRAGMA mmap_size={self._mmap_size};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    return conn
+
+  @contextmanager
+  def writer(self) -> Iterator[sqlite3.Connection]:
+    """Exclusive write connection; commits on success, rolls back on error."""
+    with self._writer_lock:
+      try:
+        # 事务开始即取写锁：其他进程正在写时在这里按 busy timeout 等待，
+        # 而不是读到一半升级写锁失败（SQLITE_BUSY，WAL 下不会重试）
+        if not self._writer.in_transaction:
+          self._writer.execute("BEGIN IMMEDIATE")
+        yield self._writer
+        self._writer.commit()
+      except BaseException:
+        self._writer.rollback()
+        raise
+
+  @contextmanager
+  def writer_attached(self, path: Path, schema: str) -> Iterator[sqlite3.Connection]:
+    """writer() with another database file attached as `schema` for the duration.
+
+    SQLite refuses ATTACH / DETACH inside a transaction, so both happen around it.
+    """
+    with self._writer_lock:
+      self._writer.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+      try:
+        with self.writer() as conn:
+          yield conn
+      finally:
+        self._writer.execute(f"DETACH DATABASE {schema}")
+
+  @contextmanager
+  def reader(self) -> Iterator[sqlite3.Connection]:
+    """Borrow a read connection from the pool (opened lazily, at most max_readers)."""
+    conn = self._acquire_reader()
+    try:
+      yield conn
+    finally:
+      if conn.in_transaction:
+        conn.rollback()
+      self._idle_readers.put(conn)
+
+  def _acquire_reader(self) -> sqlite3.Connection:
+    try:
+      return self._idle_readers.get_nowait()
+    except queue.Empty:
+      pass
+    with self._reader_lock:
+      if self._reader_count < self.max_readers:
+        self._reader_count += 1
+        return self._connect()
+    return self._idle_readers.get()
+
+  def close(self) -> None:
+    with self._writer_lock:
+      self._writer.close()
+    while True:
+      try:
+        self._idle_readers.get_nowait().close()
+      except queue.Empty:
+        break
+
+
+_ENGINES: Dict[str, StorageEngine] = {}
+_ENGINES_LOCK = threading.Lock()
+# fork 前父进程打开的引擎：连接不能跨进程使用，也不能在子进程里关闭（会影响父进程），只保留引用
+_FORKED_ENGINES: List[StorageEngine] = []
+
+
+def _after_fork_in_child() -> None:
+  global _ENGINES_LOCK
+  # fork 时锁可能正被父进程的其他线程持有，子进程换一把新锁
+  _ENGINES_LOCK = threading.Lock()
+  _FORKED_ENGINES.extend(_ENGINES.values())
+  _ENGINES.clear()
+
+
+if hasattr(os, "register_at_fork"):
+  os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_engine(db_path: Path = DB_PATH) -> StorageEngine:
+  """Return the shared engine for db_path, creating it (and the schema) on first use.
+
+  Engines are per process: a forked worker opens its own connections.
+  """
+  key = str(Path(db_path).resolve())
+  engine = _ENGINES.get(key)
+  if engine is not None and engine.pid == os.getpid():
+    return engine
+  with _ENGINES_LOCK:
+    engine = _ENGINES.get(key)
+    if engine is not None and engine.pid != os.getpid():
+      _FORKED_ENGINES.append(_ENGINES.pop(key))
+      engine = None
+    if engine is None:
+      engine = StorageEngine(Path(db_path))
+      _ENGINES[key] = engine
+    return engine
+
+
+def close_engines() -> None:
+  """Close every pooled connection (tests / benchmarks / shutdown)."""
+  with _ENGINES_LOCK:
+    for engine in _ENGINES.values():
+      if engine.pid == os.getpid():
+        engine.close()
+    _ENGINES.clear()
+
+
+def init_db_if_needed(db_path: Path = DB_PATH) -> None:
+  """Create SQLite file and tables if they do not exist, then run migrations."""
+  get_engine(db_path)
+
+
+def _bump_data_version(conn: sqlite3.Connection) -> None:
+  conn.execute(
+    "UPDATE data_version SET version = version + 1, updated_at = ? WHERE id = 1",
+    (_now_iso(),),
+  )
+
+
+def _next_data_version(conn: sqlite3.Connection) -> int:
+  # 写事务内读取：本次写入的行记为 version + 1，与随后的 _bump_data_version 一致
+  row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+  return (row[0] if row else 0) + 1
+
+
+def get_data_version(db_path: Path = DB_PATH) -> Tuple[int, str]:
+  """(version, updated_at) of the rank data; bumped by every write that changes it.
+
+  Stored in the database, so writes from other processes (import scripts) count too.
+  """
+  with get_engine(db_path).reader() as conn:
+    row = conn.execute("SELECT version, updated_at FROM data_version WHERE id = 1").fetchone()
+  return (row[0], row[1]) if row else (0, "")
+
+
+def _bump_row_counts(
+  conn: sqlite3.Connection, table: str, counts: Dict[str, int]
+) -> None:
+  conn.executemany(
+    """
+    INSERT INTO row_counts (table_name, fetch_date, row_count)
+    VALUES (?, ?, ?)
+    ON CONFLICT (table_name, fetch_date)
+    DO UPDATE SET row_count = row_count + excluded.row_count
+    """,
+    [(table, fetch_date, n) for fetch_date, n in counts.items()],
+  )
+
+
+def _record_audit(conn: sqlite3.Connection, action: str, detail: str) -> None:
+  conn.execute(
+    """
+    INSERT INTO audit_log (uuid, action, detail, created_at)
+    VALUES (?, ?, ?, ?)
+    """,
+    (_new_uuid(), action, detail, _now_iso()),
+  )
+  _bump_row_counts(conn, "audit_log", {"": 1})
+
+
+NOTE_COLUMNS: List[str] = [
+  "title",
+  "nickname",
+  "publish_time",
+  "read_count",
+  "click_rate",
+  "pay_conversion_rate",
+  "gmv",
+  "fetch_date",
+]
+ACCOUNT_COLUMNS: List[str] = [
+  "shop_name",
+  "fans_count",
+  "read_count",
+  "click_rate",
+  "pay_conversion_rate",
+  "gmv",
+  "fetch_date",
+]
+
+
+def _normalize_note_row(r: Dict[str, Any]) -> Dict[str, str]:
+  return {
+    "title": _normalize_value(r.get("title")),
+    "nickname": _normalize_value(r.get("nickname")),
+    "publish_time": _normalize_value(r.get("publishTime") or r.get("publish_time")),
+    "read_count": _normalize_value(r.get("readCount") or r.get("read_count")),
+    "click_rate": _normalize_value(r.get("clickRate") or r.get("click_rate")),
+    "pay_conversion_rate": _normalize_value(
+      r.get("payConversionRate") or r.get("pay_conversion_rate")
+    ),
+    "gmv": _normalize_value(r.get("gmv")),
+    "fetch_date": _normalize_value(r.get("fetchDate") or r.get("fetch_date")),
+  }
+
+
+def _normalize_account_row(r: Dict[str, Any]) -> Dict[str, str]:
+  return {
+    "shop_name": _normalize_value(r.get("shopName") or r.get("shop_name")),
+    "fans_count": _normalize_value(r.get("fansCount") or r.get("fans_count")),
+    "read_count": _normalize_value(r.get("readCount") or r.get("read_count")),
+    "click_rate": _normalize_value(r.get("clickRate") or r.get("click_rate")),
+    "pay_conversion_rate": _normalize_value(
+      r.get("payConversionRate") or r.get("pay_conversion_rate")
+    ),
+    "gmv": _normalize_value(r.get("gmv")),
+    "fetch_date": _normalize_value(r.get("fetchDate") or r.get("fetch_date")),
+  }
+
+
+# 每张表的自然键：同一 fetch_date 内唯一，重复保存时按键更新而不是新增一行
+NATURAL_KEYS: Dict[str, List[str]] = {
+  "note_rank": ["fetch_date", "title", "nickname"],
+  "account_rank": ["fetch_date", "shop_name"],
+}
+
+
+def _existing_values(
+  conn: sqlite3.Connection,
+  table: str,
+  columns: List[str],
+  keys: List[str],
+  fetch_dates: Iterable[str],
+) -> Dict[Tuple[str, ...], Tuple[str, ...]]:
+  """Stored column values of the given fetch_dates, keyed by natural key."""
+  rows = conn.execute(
+    f"""
+    SELECT {', '.join(columns)} FROM {table}
+    WHERE fetch_date IN (SELECT value FROM json_each(?))
+    """,
+    (json.dumps(sorted(set(fetch_dates))),),
+  ).fetchall()
+  key_idx = [columns.index(k) for k in keys]
+  return {tuple(row[i] for i in key_idx): tuple(row) for row in rows}
+
+
+# 每行的派生值：(档位列取值, 检索词元)，与 normalized 行一一对应
+RowDerived = Tuple[List[Any], List[str]]
+
+
+def _existing_values_by_key(
+  conn: sqlite3.Connection,
+  table: str,
+  columns: List[str],
+  keys: List[str],
+  natural_keys: List[Tuple[str, ...]],
+) -> Dict[Tuple[str, ...], Tuple[str, ...]]:
+  """Stored column values of the given natural keys (one chunk of a stream)."""
+  picks = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(keys)))
+  rows = conn.execute(
+    f"""
+    SELECT {', '.join(columns)} FROM {table}
+    WHERE ({', '.join(keys)}) IN (SELECT {picks} FROM json_each(?))
+    """,
+    (json.dumps(natural_keys, ensure_ascii=False),),
+  ).fetchall()
+  key_idx = [columns.index(k) for k in keys]
+  return {tuple(row[i] for i in key_idx): tuple(row) for row in rows}
+
+
+def _archived_state(
+  conn: sqlite3.Connection,
+  table: str,
+  columns: List[str],
+  keys: List[str],
+  natural_keys: Iterable[Tuple[str, ...]],
+  state: Dict[Tuple[str, ...], Tuple[str, ...]],
+) -> Dict[Tuple[str, ...], Tuple[str, str]]:
+  """Look up natural keys of archived months that the main table does not hold.
+
+  Found rows are added to `state` (so they classify as updated / unchanged, not new);
+  returns key -> (uuid, created_at) of each, so a changed row is written to the main
+  table under the same identity and in-day position until archive_months merges it.
+  """
+  catalog = _archive_catalog(conn)
+  if not catalog:
+    return {}
+  date_idx = keys.index("fetch_date")
+  by_month: Dict[str, List[Tuple[str, ...]]] = {}
+  for key in dict.fromkeys(natural_keys):
+    if key not in state and key[date_idx][:7] in catalog:
+      by_month.setdefault(key[date_idx][:7], []).append(key)
+  picks = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(keys)))
+  identity: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+  for month, month_keys in by_month.items():
+    rows = _read_partition(
+      catalog[month],
+      f"""
+      SELECT {', '.join(columns)}, uuid, created_at FROM {table}
+      WHERE ({', '.join(keys)}) IN (SELECT {picks} FROM json_each(?))
+      """,
+      (json.dumps(month_keys, ensure_ascii=False),),
+    )
+    for row in rows:
+      values = tuple(row[c] for c in columns)
+      key = tuple(row[k] for k in keys)
+      state[key] = values
+      identity[key] = (row["uuid"], row["created_at"])
+  return identity
+
+
+def _upsert_chunk(
+  conn: sqlite3.Connection,
+  has_search: bool,
+  table: str,
+  columns: List[str],
+  metrics: List[str],
+  normalized: List[Dict[str, str]],
+  derived: Optional[List[RowDerived]],
+  state: Dict[Tuple[str, ...], Tuple[str, ...]],
+  seen: Set[Tuple[str, ...]],
+  created_at: str,
+  row_version: int,
+  result: Dict[str, int],
+  archived: Optional[Dict[Tuple[str, ...], Tuple[str, str]]] = None,
+) -> Set[str]:
+  """Classify rows against `state`, write inserted / changed ones.
+
+  Keys already in `seen` count as unchanged (first row of a key wins). Written
+  rows get `row_version` (see feishu_sync). Keys in `archived` (see _archived_state)
+  keep that uuid / created_at. Adds to `result` and returns the fetch_dates whose
+  rows were written.
+  """
+  archived = archived or {}
+  keys = NATURAL_KEYS[table]
+  key_idx = [columns.index(k) for k in keys]
+  new_keys: Dict[Tuple[str, ...], str] = {}
+  pending: Dict[Tuple[str, ...], int] = {}
+  for idx, values in enumerate(normalized):
+    row = tuple(values[col] for col in columns)
+    key = tuple(row[i] for i in key_idx)
+    if key in seen:
+      result["unchanged"] += 1
+      continue
+    seen.add(key)
+    stored = state.get(key)
+    if stored is None:
+      result["inserted"] += 1
+      new_keys[key] = _new_uuid()
+    elif stored == row:
+      result["unchanged"] += 1
+      continue
+    else:
+      result["updated"] += 1
+    pending[key] = idx
+
+  if not pending:
+    return set()
+  all_columns = ["uuid", *columns, "created_at", "row_version", *_band_columns(metrics)]
+  updatable = [c for c in all_columns if c not in ("uuid", "created_at", *keys)]
+  conn.executemany(
+    f"""
+    INSERT INTO {table} ({', '.join(all_columns)})
+    VALUES ({', '.join('?' for _ in all_columns)})
+    ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+      {', '.join(f'{c} = excluded.{c}' for c in updatable)}
+    """,
+    [
+      (
+        new_keys.get(key) or archived.get(key, (_new_uuid(),))[0],
+        *(normalized[idx][col] for col in columns),
+        archived[key][1] if key in archived else created_at,
+        row_version,
+        *(derived[idx][0] if derived else _band_values(metrics, normalized[idx])),
+      )
+      for key, idx in pending.items()
+    ],
+  )
+  # 检索字段都属于自然键，更新不会改变索引内容，只需索引新增行
+  if has_search and new_keys:
+    _index_search_rows(
+      conn,
+      table,
+      [
+        (
+          row_uuid,
+          derived[pending[key]][1]
+          if derived
+          else _search_payload(table, normalized[pending[key]]),
+        )
+        for key, row_uuid in new_keys.items()
+      ],
+    )
+  per_date: Dict[str, int] = {}
+  for key in new_keys:
+    fetch_date = normalized[pending[key]]["fetch_date"]
+    per_date[fetch_date] = per_date.get(fetch_date, 0) + 1
+  if per_date:
+    _bump_row_counts(conn, table, per_date)
+  return {normalized[idx]["fetch_date"] for idx in pending.values()}
+
+
+def _finish_upsert(
+  conn: sqlite3.Connection, table: str, touched_dates: Set[str], result: Dict[str, int]
+) -> None:
+  """Refresh derived tables for the written dates and record the audit entry."""
+  if touched_dates:
+    _refresh_rank_changes(conn, table, touched_dates)
+    _refresh_band_distribution(conn, _KIND_BY_TABLE[table], touched_dates)
+    _bump_data_version(conn)
+  _record_audit(
+    conn,
+    action=f"insert_{table}",
+    detail=" ".join(f"{name}={count}" for name, count in result.items()),
+  )
+
+
+def _upsert_rows(
+  table: str,
+  columns: List[str],
+  metrics: List[str],
+  normalized: List[Dict[str, str]],
+  db_path: Path,
+  derived: Optional[List[RowDerived]] = None,
+) -> Dict[str, int]:
+  """Upsert rows on the table's natural key.
+
+  Rows are classified against what is stored; only inserted and changed rows
+  are written. Within one call the first row of a key wins (it matches the rank
+  position) and later repeats count as unchanged. Existing rows keep their
+  uuid / created_at, so their rank position within the day does not move.
+  `derived` carries precomputed band values / search grams (see prepare_rows);
+  without it they are computed here for the rows actually written.
+  """
+  result = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+  engine = get_engine(db_path)
+  with engine.writer() as conn:
+    keys = NATURAL_KEYS[table]
+    state = _existing_values(
+      conn, table, columns, keys, (values["fetch_date"] for values in normalized)
+    )
+    archived = _archived_state(
+      conn, table, columns, keys, (tuple(values[k] for k in keys) for values in normalized), state
+    )
+    touched_dates = _upsert_chunk(
+      conn,
+      engine.has_search,
+      table,
+      columns,
+      metrics,
+      normalized,
+      derived,
+      state,
+      set(),
+      _now_iso(),
+      _next_data_version(conn),
+      result,
+      archived,
+    )
+    _finish_upsert(conn, table, touched_dates, result)
+  return result
+
+
+def insert_note_rows(
+  rows: Iterable[Dict[str, Any]], db_path: Path = DB_PATH
+) -> Dict[str, int]:
+  """Upsert content-rank rows; return {"inserted", "updated", "unchanged"} counts."""
+  normalized = [_normalize_note_row(r) for r in rows]
+  if not normalized:
+    return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+  return _upsert_rows("note_rank", NOTE_COLUMNS, NOTE_BAND_METRICS, normalized, db_path)
+
+
+def insert_account_rows(
+  rows: Iterable[Dict[str, Any]], db_path: Path = DB_PATH
+) -> Dict[str, int]:
+  """Upsert account-rank rows; return {"inserted", "updated", "unchanged"} counts."""
+  normalized = [_normalize_account_row(r) for r in rows]
+  if not normalized:
+    return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+  return _upsert_rows(
+    "account_rank", ACCOUNT_COLUMNS, ACCOUNT_BAND_METRICS, normalized, db_path
+  )
+
+
+# kind -> (表, 列, 档位指标, 归一化函数)
+_INGEST_SPECS: Dict[str, Tuple[str, List[str], List[str], Any]] = {
+  "note": ("note_rank", NOTE_COLUMNS, NOTE_BAND_METRICS, _normalize_note_row),
+  "account": ("account_rank", ACCOUNT_COLUMNS, ACCOUNT_BAND_METRICS, _normalize_account_row),
+}
+
+
+def prepare_rows(
+  kind: str, rows: Iterable[Dict[str, Any]]
+) -> Tuple[List[Dict[str, str]], List[RowDerived]]:
+  """Normalize rows and precompute band values and search grams.
+
+  Pure CPU work with picklable output, so bulk importers can run it in worker
+  processes and hand the result to insert_prepared_rows.
+  """
+  table, _columns, metrics, normalize = _INGEST_SPECS[kind]
+  normalized = [normalize(r) for r in rows]
+  bands = _band_rows(metrics, normalized)
+  derived = [(band, _search_payload(table, values)) for band, values in zip(bands, normalized)]
+  return normalized, derived
+
+
+def insert_prepared_rows(
+  kind: str,
+  normalized: List[Dict[str, str]],
+  derived: List[RowDerived],
+  db_path: Path = DB_PATH,
+) -> Dict[str, int]:
+  """Upsert rows produced by prepare_rows; same counts as insert_note_rows."""
+  if not normalized:
+    return {"inserted": 0, "updated": 0, "unchanged": 0}
+  table, columns, metrics, _normalize = _INGEST_SPECS[kind]
+  return _upsert_rows(table, columns, metrics, normalized, db_path, derived)
+
+
+def ingest_rows(
+  kind: str,
+  rows: Iterable[Dict[str, Any]],
+  db_path: Path = DB_PATH,
+  chunk_size: int = 1000,
+) -> Dict[str, int]:
+  """Upsert a stream of rows chunk by chunk inside one transaction.
+
+  `rows` is consumed lazily: only one chunk of rows is held at a time (plus the
+  natural keys seen so far, to keep first-row-wins across chunks), and stored
+  values are looked up per chunk by natural key. Any error, including one
+  raised by the iterator itself, rolls back the whole stream. Same counts as
+  insert_note_rows.
+  """
+  table, columns, metrics, normalize = _INGEST_SPECS[kind]
+  keys = NATURAL_KEYS[table]
+  chunk_size = max(1, chunk_size)
+  result = {"inserted": 0, "updated": 0, "unchanged": 0}
+  touched_dates: Set[str] = set()
+  seen: Set[Tuple[str, ...]] = set()
+  created_at = _now_iso()
+  row_version: Optional[int] = None
+
+  engine = get_engine(db_path)
+
+  def flush(conn: sqlite3.Connection, chunk: List[Dict[str, str]]) -> None:
+    nonlocal row_version
+    if row_version is None:
+      row_version = _next_data_version(conn)
+    natural_keys = [tuple(values[k] for k in keys) for values in chunk]
+    state = _existing_values_by_key(conn, table, columns, keys, natural_keys)
+    archived = _archived_state(conn, table, columns, keys, natural_keys, state)
+    touched_dates.update(
+      _upsert_chunk(
+        conn,
+        engine.has_search,
+        table,
+        columns,
+        metrics,
+        chunk,
+        None,
+        state,
+        seen,
+        created_at,
+        row_version,
+        result,
+        archived,
+      )
+    )
+
+  with engine.writer() as conn:
+    chunk: List[Dict[str, str]] = []
+    for row in rows:
+      chunk.append(normalize(row))
+      if len(chunk) >= chunk_size:
+        flush(conn, chunk)
+        chunk = []
+    if chunk:
+      flush(conn, chunk)
+    if seen:
+      _finish_upsert(conn, table, touched_dates, result)
+  return result
+
+
+BandFilters = Dict[str, Tuple[Optional[int], Optional[int]]]
+
+# total 的计算方式：exact=精确 COUNT；approx=仅在计数表可直接给出时返回，否则为 None；none=不返回
+TOTAL_MODES = ("exact", "approx", "none")
+
+
+def _encode_cursor(values: List[Any]) -> str:
+  raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+  return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int) -> List[Any]:
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+  except Exception as exc:
+    raise ValueError("cursor 参数无效") from exc
+  if not isinstance(values, list) or len(values) != size:
+    raise ValueError("cursor 参数无效")
+  return values
+
+
+# ---- 冷数据分区：早于热数据窗口的月份移到独立的 SQLite 文件（见 archive_months） ----
+
+
+def _month_range(month: str) -> Tuple[str, str]:
+  # fetch_date 是 YYYY-MM-DD 文本，按字符串比较即可框住整月
+  return f"{month}-01", f"{month}-31"
+
+
+def _shift_month(month: str, delta: int) -> str:
+  index = int(month[:4]) * 12 + int(month[5:7]) - 1 + delta
+  return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _main_db_dir(conn: sqlite3.Connection) -> Path:
+  for row in conn.execute("PRAGMA database_list"):
+    if row[1] == "main":
+      return Path(row[2]).parent
+  return Path(".")
+
+
+def _archive_catalog(conn: sqlite3.Connection) -> Dict[str, Path]:
+  """month (YYYY-MM) -> partition file of every archived month."""
+  # 早期迁移（v3 / v7 回填）运行时目录表还不存在
+  if not conn.execute(
+    "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'archive_partition'"
+  ).fetchone():
+    return {}
+  rows = conn.execute("SELECT month, path FROM main.archive_partition ORDER BY month").fetchall()
+  if not rows:
+    return {}
+  base = _main_db_dir(conn)
+  return {row[0]: base / row[1] for row in rows}
+
+
+def _partition_schema(month: str) -> str:
+  return "archive_" + month.replace("-", "_")
+
+
+def _attach_limit(conn: sqlite3.Connection) -> int:
+  getlimit = getattr(conn, "getlimit", None)  # Python 3.11+
+  return getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if getlimit else 10
+
+
+@contextmanager
+def _rank_source(
+  conn: sqlite3.Connection,
+  table: str,
+  fetch_date_from: str | None,
+  fetch_date_to: str | None,
+  search: bool,
+) -> Iterator[Tuple[str, Optional[str], bool]]:
+  """FROM clause for a rank-row query; yields (source, fetch_date_from, search).
+
+  Without archived months this is the table itself. Queries without a date filter
+  (or whose range stays after the last archived month) read only the main database,
+  and an open start is moved past the archive so items and the counted total agree.
+  A range reaching archived months attaches their partitions for the block and reads
+  a UNION ALL with the main table, where a main row written since (same uuid, see
+  _archived_state) replaces its partition copy; keyword search then uses LIKE (the FTS
+  index only covers the main database).
+  """
+  catalog = _archive_catalog(conn)
+  if not catalog:
+    yield table, fetch_date_from, search
+    return
+  hot_from = f"{_shift_month(max(catalog), 1)}-01"
+  if fetch_date_from:
+    reaches_archive = fetch_date_from < hot_from
+  else:
+    reaches_archive = bool(fetch_date_to) and fetch_date_to < hot_from  # type: ignore[operator]
+  if not reaches_archive:
+    yield table, fetch_date_from or hot_from, search
+    return
+
+  months = [
+    month
+    for month in catalog
+    if (not fetch_date_from or month >= fetch_date_from[:7])
+    and (not fetch_date_to or month <= fetch_date_to[:7])
+  ]
+  limit = _attach_limit(conn)
+  if len(months) > limit:
+    raise ValueError(
+      f"日期范围跨越 {len(months)} 个已归档月份，单次查询最多 {limit} 个，请缩小 fetch_date 范围"
+    )
+  columns = _table_columns(conn, table)
+  attached: List[str] = []
+  try:
+    # 带上各自的 rowid：同日同 created_at 的行按它保持采集顺序
+    arms = [f"SELECT rowid AS rowid, {', '.join(columns)} FROM main.{table}"]
+    for month in months:
+      path = catalog[month]
+      if not path.exists():
+        raise FileNotFoundError(f"归档分区文件不存在：{path}")
+      schema = _partition_schema(month)
+      conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+      attached.append(schema)
+      # 分区建好后主表又加了列时，旧分区里补 NULL
+      present = set(_table_columns(conn, table, schema))
+      select_cols = ", ".join(c if c in present else f"NULL AS {c}" for c in columns)
+      arms.append(
+        f"SELECT p.rowid AS rowid, {select_cols} FROM {schema}.{table} AS p "
+        f"WHERE NOT EXISTS (SELECT 1 FROM main.{table} AS m WHERE m.uuid = p.uuid)"
+      )
+    yield "(" + " UNION ALL ".join(arms) + f") AS {table}", fetch_date_from, False
+  finally:
+    for schema in attached:
+      conn.execute(f"DETACH DATABASE {schema}")
+
+
+def _read_partition(path: Path, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+  """Run a read-only query against one partition file on a short-lived connection.
+
+  Used where ATTACH is not possible (inside the writer's open transaction).
+  """
+  part = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+  part.row_factory = sqlite3.Row
+  try:
+    return part.execute(sql, tuple(params)).fetchall()
+  finally:
+    part.close()
+
+
+def _archived_ranked_rows(
+  conn: sqlite3.Connection,
+  table: str,
+  columns: List[str],
+  fetch_dates: Iterable[str],
+  catalog: Dict[str, Path],
+) -> List[Dict[str, Any]]:
+  """Rows of fetch_dates in archived months with their in-day "rank".
+
+  A date's partition rows come first, then rows written to the main database after
+  the month was archived; both in (created_at, rowid) order like the live tables.
+  A main row updating an archived one (same uuid) takes that row's place.
+  """
+  select_cols = ", ".join(dict.fromkeys([*columns, "uuid", "fetch_date", "created_at"]))
+  by_month: Dict[str, List[str]] = {}
+  for fetch_date in sorted(set(fetch_dates)):
+    by_month.setdefault(fetch_date[:7], []).append(fetch_date)
+  ranked: List[Dict[str, Any]] = []
+  for month, dates in sorted(by_month.items()):
+    marks = ", ".join("?" for _ in dates)
+    sql = (
+      f"SELECT {select_cols} FROM {{table}} WHERE fetch_date IN ({marks}) "
+      "ORDER BY fetch_date, created_at, rowid"
+    )
+    per_date: Dict[str, List[Dict[str, Any]]] = {d: [] for d in dates}
+    slots: Dict[str, Tuple[str, int]] = {}
+    for row in _read_partition(catalog[month], sql.format(table=table), dates):
+      slots[row["uuid"]] = (row["fetch_date"], len(per_date[row["fetch_date"]]))
+      per_date[row["fetch_date"]].append(dict(row))
+    for row in conn.execute(sql.format(table=f"main.{table}"), dates):
+      slot = slots.get(row["uuid"])
+      if slot is not None:
+        per_date[slot[0]][slot[1]] = dict(row)
+      else:
+        per_date[row["fetch_date"]].append(dict(row))
+    for fetch_date in dates:
+      # 稳定排序：同一 created_at 内保持分区在前、各自 rowid 的顺序
+      rows = sorted(per_date[fetch_date], key=lambda r: r["created_at"] or "")
+      for idx, record in enumerate(rows, start=1):
+        record["rank"] = idx
+      ranked.extend(rows)
+  return ranked
+
+
+def _rank_order_sql(order_by: str, order: str, metrics: List[str]) -> str:
+  # 同一次采集的行 created_at 相同，rowid 升序保持采集（榜单）顺序，与 rank_change 的名次一致
+  direction = "ASC" if (order or "").lower() == "asc" else "DESC"
+  if order_by in metrics:
+    return (
+      f"{order_by}_band {direction}, {order_by}_lo {direction}, "
+      "fetch_date DESC, created_at DESC, rowid ASC"
+    )
+  if order_by == "created_at":
+    return f"created_at {direction}, rowid ASC"
+  return f"fetch_date {direction}, created_at {direction}, rowid ASC"
+
+
+def _rank_conditions(
+  table: str,
+  metrics: List[str],
+  q_conditions: List[str],
+  q: str | None,
+  fetch_date_from: str | None,
+  fetch_date_to: str | None,
+  band_filters: BandFilters | None,
+  search: bool,
+) -> Tuple[List[str], List[Any], bool]:
+  """Build WHERE conditions; the flag tells whether row_counts can answer COUNT."""
+  conditions = ["1=1"]
+  params: List[Any] = []
+  counted = True
+  match = _search_match(q) if q and search else None
+  if match:
+    conditions.append(
+      f"rowid IN (SELECT rowid FROM {table}_search WHERE {table}_search MATCH ?)"
+    )
+    params.append(match)
+    counted = False
+  elif q:
+    conditions.append("(" + " OR ".join(q_conditions) + ")")
+    params.extend(f"%{q}%" for _ in q_conditions)
+    counted = False
+  if fetch_date_from:
+    conditions.append("fetch_date >= ?")
+    params.append(fetch_date_from)
+  if fetch_date_to:
+    conditions.append("fetch_date <= ?")
+    params.append(fetch_date_to)
+  for metric, (band_min, band_max) in (band_filters or {}).items():
+    if metric not in metrics:
+      continue
+    if band_min is not None:
+      conditions.append(f"{metric}_band >= ?")
+      params.append(band_min)
+      counted = False
+    if band_max is not None:
+      conditions.append(f"{metric}_band <= ?")
+      params.append(band_max)
+      counted = False
+  return conditions, params, counted
+
+
+def _counted_total(
+  conn: sqlite3.Connection,
+  table: str,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+) -> int:
+  sql = "SELECT COALESCE(SUM(row_count), 0) FROM row_counts WHERE table_name = ?"
+  params: List[Any] = [table]
+  if fetch_date_from:
+    sql += " AND fetch_date >= ?"
+    params.append(fetch_date_from)
+  if fetch_date_to:
+    sql += " AND fetch_date <= ?"
+    params.append(fetch_date_to)
+  return conn.execute(sql, params).fetchone()[0]
+
+
+def _resolve_total(
+  conn: sqlite3.Connection,
+  table: str,
+  where_sql: str,
+  params: Tuple[Any, ...],
+  counted: bool,
+  total_mode: str,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  source: str | None = None,
+) -> Optional[int]:
+  if total_mode == "none":
+    return None
+  if counted:
+    # row_counts 按逻辑数据维护（含已归档月份），跨分区查询同样适用
+    return _counted_total(conn, table, fetch_date_from, fetch_date_to)
+  if total_mode == "approx":
+    return None
+  return conn.execute(f"SELECT COUNT(1) FROM {source or table}" + where_sql, params).fetchone()[0]
+
+
+def _rank_query(
+  table: str,
+  metrics: List[str],
+  q_conditions: List[str],
+  q: str | None,
+  fetch_date_from: str | None,
+  fetch_date_to: str | None,
+  band_filters: BandFilters | None,
+  order_by: str,
+  order: str,
+  search: bool,
+  source: str | None = None,
+) -> Tuple[str, List[Any], str, List[Any], bool]:
+  """Return (ordered SELECT without LIMIT, its params, WHERE sql, WHERE params, counted).
+
+  `source` replaces the table in FROM (see _rank_source); relevance order needs the
+  FTS index and so only applies to the table itself.
+  """
+  conditions, params, counted = _rank_conditions(
+    table, metrics, q_conditions, q, fetch_date_from, fetch_date_to, band_filters, search
+  )
+  where_sql = " WHERE " + " AND ".join(conditions)
+  match = _search_match(q) if q and search else None
+  if order_by == "relevance" and match:
+    # 按 bm25 相关度排序：检索结果与原表按 rowid 关联
+    weights = ", ".join(str(w) for w in _SEARCH_WEIGHTS[table])
+    other_conditions, other_params, _ = _rank_conditions(
+      table, metrics, q_conditions, None, fetch_date_from, fetch_date_to, band_filters, False
+    )
+    query_sql = (
+      f"SELECT {table}.* FROM {table} JOIN ("
+      f"SELECT rowid AS hit_rowid, bm25({table}_search, {weights}) AS score "
+      f"FROM {table}_search WHERE {table}_search MATCH ?"
+      f") AS hits ON hits.hit_rowid = {table}.rowid"
+      + " WHERE " + " AND ".join(other_conditions)
+      + f" ORDER BY hits.score, fetch_date DESC, created_at DESC, {table}.rowid ASC"
+    )
+    return query_sql, [match, *other_params], where_sql, params, counted
+  query_sql = (
+    f"SELECT * FROM {source or table}"
+    + where_sql
+    + f" ORDER BY {_rank_order_sql(order_by, order, metrics)}"
+  )
+  return query_sql, list(params), where_sql, params, counted
+
+
+def _list_rank_rows(
+  db_path: Path,
+  table: str,
+  metrics: List[str],
+  q_conditions: List[str],
+  q: str | None,
+  fetch_date_from: str | None,
+  fetch_date_to: str | None,
+  band_filters: BandFilters | None,
+  order_by: str,
+  order: str,
+  page: int,
+  page_size: int,
+) -> Tuple[List[Dict[str, Any]], int]:
+  offset = (page - 1) * page_size
+  engine = get_engine(db_path)
+  with engine.reader() as conn, _rank_source(
+    conn, table, fetch_date_from, fetch_date_to, engine.has_search
+  ) as (source, fetch_date_from, search):
+    query_sql, query_params, where_sql, params, counted = _rank_query(
+      table,
+      metrics,
+      q_conditions,
+      q,
+      fetch_date_from,
+      fetch_date_to,
+      band_filters,
+      order_by,
+      order,
+      search,
+      source,
+    )
+    rows = conn.execute(
+      query_sql + " LIMIT ? OFFSET ?", (*query_params, page_size, offset)
+    ).fetchall()
+    total = _resolve_total(
+      conn,
+      table,
+      where_sql,
+      tuple(params),
+      counted,
+      "exact",
+      fetch_date_from,
+      fetch_date_to,
+      source,
+    )
+
+    items: List[Dict[str, Any]] = []
+    for idx, row in enumerate(rows):
+      record = dict(row)
+      record.pop("rowid", None)  # 跨分区查询时带出的排序列
+      record["rank"] = offset + idx + 1
+      items.append(record)
+    return items, total or 0
+
+
+def _iter_query(
+  db_path: Path, sql: str, params: Iterable[Any], batch_size: int, rank: bool
+) -> Iterator[Dict[str, Any]]:
+  """Stream query rows through one pooled reader connection, fetchmany at a time.
+
+  The connection goes back to the pool when the generator finishes or is closed.
+  """
+  with get_engine(db_path).reader() as conn:
+    yield from _iter_cursor(conn.execute(sql, tuple(params)), batch_size, rank)
+
+
+def _iter_cursor(cursor: sqlite3.Cursor, batch_size: int, rank: bool) -> Iterator[Dict[str, Any]]:
+  position = 0
+  try:
+    while True:
+      rows = cursor.fetchmany(batch_size)
+      if not rows:
+        break
+      for row in rows:
+        record = dict(row)
+        if rank:
+          record.pop("rowid", None)  # 跨分区查询时带出的排序列，见 _rank_source
+          position += 1
+          record["rank"] = position
+        yield record
+  finally:
+    # 提前停止读取时也结束语句，随后才能 DETACH 分区 / 归还连接
+    cursor.close()
+
+
+def _iter_rank_rows(
+  db_path: Path,
+  table: str,
+  metrics: List[str],
+  q_conditions: List[str],
+  q: str | None,
+  fetch_date_from: str | None,
+  fetch_date_to: str | None,
+  band_filters: BandFilters | None,
+  order_by: str,
+  order: str,
+  batch_size: int,
+) -> Iterator[Dict[str, Any]]:
+  engine = get_engine(db_path)
+  with engine.reader() as conn, _rank_source(
+    conn, table, fetch_date_from, fetch_date_to, engine.has_search
+  ) as (source, fetch_date_from, search):
+    query_sql, query_params, _, _, _ = _rank_query(
+      table,
+      metrics,
+      q_conditions,
+      q,
+      fetch_date_from,
+      fetch_date_to,
+      band_filters,
+      order_by,
+      order,
+      search,
+      source,
+    )
+    yield from _iter_cursor(conn.execute(query_sql, tuple(query_params)), batch_size, rank=True)
+
+
+def _scan_rank_rows(
+  db_path: Path,
+  table: str,
+  metrics: List[str],
+  q_conditions: List[str],
+  q: str | None,
+  fetch_date_from: str | None,
+  fetch_date_to: str | None,
+  band_filters: BandFilters | None,
+  cursor: str | None,
+  page_size: int,
+  total_mode: str,
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+  engine = get_engine(db_path)
+  with engine.reader() as conn, _rank_source(
+    conn, table, fetch_date_from, fetch_date_to, engine.has_search
+  ) as (source, fetch_date_from, search):
+    conditions, params, counted = _rank_conditions(
+      table,
+      metrics,
+      q_conditions,
+      q,
+      fetch_date_from,
+      fetch_date_to,
+      band_filters,
+      search,
+    )
+    where_sql = " WHERE " + " AND ".join(conditions)
+    params_tuple = tuple(params)
+
+    start_rank = 0
+    page_sql = where_sql
+    page_params: List[Any] = list(params)
+    if cursor:
+      fetch_date, created_at, rowid, start_rank = _decode_cursor(cursor, 4)
+      if not isinstance(rowid, int):
+        raise ValueError("cursor 参数无效")
+      # 同一次采集内 rowid 升序，三元组比较表达不了混合方向；fetch_date <= ? 限定索引扫描范围
+      page_sql += (
+        " AND fetch_date <= ? AND (fetch_date < ? OR (fetch_date = ? AND"
+        " (created_at < ? OR (created_at = ? AND rowid > ?))))"
+      )
+      page_params.extend((fetch_date, fetch_date, fetch_date, created_at, created_at, rowid))
+    rows = conn.execute(
+      f"SELECT rowid AS rowid, * FROM {source}"
+      + page_sql
+      + f" ORDER BY {_rank_order_sql('fetch_date', 'desc', metrics)} LIMIT ?",
+      (*page_params, page_size + 1),
+    ).fetchall()
+
+    items: List[Dict[str, Any]] = []
+    last_rowid = None
+    for idx, row in enumerate(rows[:page_size]):
+      record = dict(row)
+      last_rowid = record.pop("rowid")
+      record["rank"] = int(start_rank) + idx + 1
+      items.append(record)
+    next_cursor = None
+    if len(rows) > page_size:
+      last = items[-1]
+      next_cursor = _encode_cursor(
+        [last["fetch_date"], last["created_at"], last_rowid, int(start_rank) + len(items)]
+      )
+    total = _resolve_total(
+      conn,
+      table,
+      where_sql,
+      params_tuple,
+      counted,
+      total_mode,
+      fetch_date_from,
+      fetch_date_to,
+      source,
+    )
+    return items, next_cursor, total
+
+
+def list_note_rows(
+  db_path: Path = DB_PATH,
+  q: str | None = None,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  page: int = 1,
+  page_size: int = 20,
+  band_filters: BandFilters | None = None,
+  order_by: str = "fetch_date",
+  order: str = "desc",
+) -> Tuple[List[Dict[str, Any]], int]:
+  """List note_rank rows with simple filters and pagination.
+
+  band_filters maps a metric (e.g. "gmv") to an inclusive (min, max) band-code range;
+  order_by accepts fetch_date / created_at / any band metric, or "relevance" together
+  with q (full-text match on title/nickname, ranked by bm25).
+  """
+  return _list_rank_rows(
+    db_path,
+    "note_rank",
+    NOTE_BAND_METRICS,
+    ["title LIKE ?", "nickname LIKE ?"],
+    q,
+    fetch_date_from,
+    fetch_date_to,
+    band_filters,
+    order_by,
+    order,
+    page,
+    page_size,
+  )
+
+
+def list_note_rows_by_cursor(
+  db_path: Path = DB_PATH,
+  q: str | None = None,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  cursor: str | None = None,
+  page_size: int = 20,
+  band_filters: BandFilters | None = None,
+  total_mode: str = "approx",
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+  """Keyset page of note_rank ordered by (fetch_date, created_at) desc, rowid asc.
+
+  Returns (items, next_cursor, total); next_cursor is None on the last page.
+  """
+  return _scan_rank_rows(
+    db_path,
+    "note_rank",
+    NOTE_BAND_METRICS,
+    ["title LIKE ?", "nickname LIKE ?"],
+    q,
+    fetch_date_from,
+    fetch_date_to,
+    band_filters,
+    cursor,
+    page_size,
+    total_mode,
+  )
+
+
+def list_account_rows(
+  db_path: Path = DB_PATH,
+  q: str | None = None,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  page: int = 1,
+  page_size: int = 20,
+  band_filters: BandFilters | None = None,
+  order_by: str = "fetch_date",
+  order: str = "desc",
+) -> Tuple[List[Dict[str, Any]], int]:
+  """List account_rank rows with simple filters and pagination (see list_note_rows)."""
+  return _list_rank_rows(
+    db_path,
+    "account_rank",
+    ACCOUNT_BAND_METRICS,
+    ["shop_name LIKE ?"],
+    q,
+    fetch_date_from,
+    fetch_date_to,
+    band_filters,
+    order_by,
+    order,
+    page,
+    page_size,
+  )
+
+
+def list_account_rows_by_cursor(
+  db_path: Path = DB_PATH,
+  q: str | None = None,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  cursor: str | None = None,
+  page_size: int = 20,
+  band_filters: BandFilters | None = None,
+  total_mode: str = "approx",
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+  """Keyset page of account_rank (see list_note_rows_by_cursor)."""
+  return _scan_rank_rows(
+    db_path,
+    "account_rank",
+    ACCOUNT_BAND_METRICS,
+    ["shop_name LIKE ?"],
+    q,
+    fetch_date_from,
+    fetch_date_to,
+    band_filters,
+    cursor,
+    page_size,
+    total_mode,
+  )
+
+
+def iter_note_rows(
+  db_path: Path = DB_PATH,
+  q: str | None = None,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  band_filters: BandFilters | None = None,
+  order_by: str = "fetch_date",
+  order: str = "desc",
+  batch_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+  """Stream every note_rank row matching list_note_rows' filters, in the same order."""
+  return _iter_rank_rows(
+    db_path,
+    "note_rank",
+    NOTE_BAND_METRICS,
+    ["title LIKE ?", "nickname LIKE ?"],
+    q,
+    fetch_date_from,
+    fetch_date_to,
+    band_filters,
+    order_by,
+    order,
+    batch_size,
+  )
+
+
+def iter_account_rows(
+  db_path: Path = DB_PATH,
+  q: str | None = None,
+  fetch_date_from: str | None = None,
+  fetch_date_to: str | None = None,
+  band_filters: BandFilters | None = None,
+  order_by: str = "fetch_date",
+  order: str = "desc",
+  batch_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+  """Stream every account_rank row matching list_account_rows' filters, in the same order."""
+  return _iter_rank_rows(
+    db_path,
+    "account_rank",
+    ACCOUNT_BAND_METRICS,
+    ["shop_name LIKE ?"],
+    q,
+    fetch_date_from,
+    fetch_date_to,
+    band_filters,
+    order_by,
+    order,
+    batch_size,
+  )
+
+
+def table_columns(db_path: Path, table: str) -> List[str]:
+  """Column names of a table, in storage order (export headers for empty results)."""
+  with get_engine(db_path).reader() as conn:
+    return _table_columns(conn, table)
+
+
+def table_column_types(db_path: Path, table: str) -> Dict[str, str]:
+  """Declared type of every column (PRAGMA table_info), e.g. for typed Parquet export."""
+  with get_engine(db_path).reader() as conn:
+    return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _audit_conditions(
+  action: str | None,
+  detail_q: str | None,
+  created_from: str | None,
+  created_to: str | None,
+) -> Tuple[List[str], List[Any]]:
+  conditions = ["1=1"]
+  params: List[Any] = []
+  if action:
+    conditions.append("action = ?")
+    params.append(action)
+  if detail_q:
+    conditions.append("detail LIKE ?")
+    params.append(f"%{detail_q}%")
+  if created_from:
+    conditions.append("created_at >= ?")
+    params.append(created_from)
+  if created_to:
+    conditions.append("created_at <= ?")
+    params.append(created_to)
+  return conditions, params
+
+
+def list_audit_logs(
+  db_path: Path = DB_PATH,
+  action: str | None = None,
+  detail_q: str | None = None,
+  created_from: str | None = None,
+  created_to: str | None = None,
+  page: int = 1,
+  page_size: int = 20,
+) -> Tuple[List[Dict[str, Any]], int]:
+  """List audit_log rows with simple filters and pagination."""
+  offset = (page - 1) * page_size
+  with get_engine(db_path).reader() as conn:
+    conditions, params = _audit_conditions(action, detail_q, created_from, created_to)
+    where_sql = " WHERE " + " AND ".join(conditions)
+    query_sql = (
+      "SELECT * FROM audit_log"
+      + where_sql
+      + " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+    )
+    params_tuple = tuple(params)
+    rows = conn.execute(query_sql, (*params_tuple, page_size, offset)).fetchall()
+    total = _resolve_total(
+      conn, "audit_log", where_sql, params_tuple, len(conditions) == 1, "exact"
+    )
+
+    return [dict(r) for r in rows], total or 0
+
+
+def iter_audit_logs(
+  db_path: Path = DB_PATH,
+  action: str | None = None,
+  detail_q: str | None = None,
+  created_from: str | None = None,
+  created_to: str | None = None,
+  batch_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+  """Stream audit_log rows matching list_audit_logs' filters, newest first."""
+  conditions, params = _audit_conditions(action, detail_q, created_from, created_to)
+  return _iter_query(
+    db_path,
+    "SELECT * FROM audit_log WHERE "
+    + " AND ".join(conditions)
+    + " ORDER BY created_at DESC, uuid DESC",
+    params,
+    batch_size,
+    rank=False,
+  )
+
+
+def list_audit_logs_by_cursor(
+  db_path: Path = DB_PATH,
+  action: str | None = None,
+  detail_q: str | None = None,
+  created_from: str | None = None,
+  created_to: str | None = None,
+  cursor: str | None = None,
+  page_size: int = 20,
+  total_mode: str = "approx",
+) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int]]:
+  """Keyset page of audit_log ordered by (created_at, uuid) desc."""
+  with get_engine(db_path).reader() as conn:
+    conditions, params = _audit_conditions(action, detail_q, created_from, created_to)
+    where_sql = " WHERE " + " AND ".join(conditions)
+    params_tuple = tuple(params)
+
+    page_sql = where_sql
+    page_params: List[Any] = list(params)
+    if cursor:
+      created_at, row_uuid = _decode_cursor(cursor, 2)
+      page_sql += " AND (created_at, uuid) < (?, ?)"
+      page_params.extend((created_at, row_uuid))
+    rows = conn.execute(
+      "SELECT * FROM audit_log"
+      + page_sql
+      + " ORDER BY created_at DESC, uuid DESC LIMIT ?",
+      (*page_params, page_size + 1),
+    ).fetchall()
+
+    items = [dict(r) for r in rows[:page_size]]
+    next_cursor = None
+    if len(rows) > page_size:
+      next_cursor = _encode_cursor([items[-1]["created_at"], items[-1]["uuid"]])
+    total = _resolve_total(
+      conn, "audit_log", where_sql, params_tuple, len(conditions) == 1, total_mode
+    )
+    return items, next_cursor, total
+
+
+# ---- 排名变化：入库时按相邻 fetch_date 物化快照，接口只做一次索引读取 ----
+
+ALL_BAND_METRICS: List[str] = ACCOUNT_BAND_METRICS
+
+RANK_KINDS: Dict[str, Dict[str, Any]] = {
+  "note": {
+    "table": "note_rank",
+    "columns": [*NOTE_COLUMNS, "created_at", *(f"{m}_band" for m in NOTE_BAND_METRICS)],
+    "label_fields": ["title", "nickname"],
+    "metric_fields": ["publish_time", "read_count", "click_rate", "pay_conversion_rate", "gmv"],
+    "band_metrics": NOTE_BAND_METRICS,
+    "key": lambda r: f"{r.get('title','')}__{r.get('nickname','')}",
+  },
+  "account": {
+    "table": "account_rank",
+    "columns": [*ACCOUNT_COLUMNS, "created_at", *(f"{m}_band" for m in ACCOUNT_BAND_METRICS)],
+    "label_fields": ["shop_name"],
+    "metric_fields": ["fans_count", "read_count", "click_rate", "pay_conversion_rate", "gmv"],
+    "band_metrics": ACCOUNT_BAND_METRICS,
+    "key": lambda r: r.get("shop_name", ""),
+  },
+}
+_KIND_BY_TABLE = {spec["table"]: kind for kind, spec in RANK_KINDS.items()}
+
+
+def _create_rank_change_tables(conn: sqlite3.Connection) -> None:
+  band_cols = ",\n".join(
+    f"      {m}_band_from INTEGER,\n      {m}_band_to INTEGER" for m in ALL_BAND_METRICS
+  )
+  conn.execute(
+    f"""
+    CREATE TABLE IF NOT EXISTS rank_change (
+      kind TEXT NOT NULL,
+      cur_date TEXT NOT NULL,
+      prev_date TEXT NOT NULL,
+      position INTEGER NOT NULL,
+      item_key TEXT NOT NULL,
+      current_rank INTEGER NOT NULL,
+      previous_rank INTEGER,
+      rank_change INTEGER,
+{band_cols},
+      payload TEXT NOT NULL,
+      PRIMARY KEY (kind, cur_date, prev_date, position)
+    ) WITHOUT ROWID
+    """
+  )
+  # 档位跃迁计数：每个相邻日期对、每个指标的 (from, to) 档位组合有多少条目，随快照一起重建
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS band_transition (
+      kind TEXT NOT NULL,
+      cur_date TEXT NOT NULL,
+      prev_date TEXT NOT NULL,
+      metric TEXT NOT NULL,
+      band_from INTEGER NOT NULL,
+      band_to INTEGER NOT NULL,
+      item_count INTEGER NOT NULL,
+      PRIMARY KEY (kind, cur_date, prev_date, metric, band_from, band_to)
+    ) WITHOUT ROWID
+    """
+  )
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS rank_change_snapshot (
+      kind TEXT NOT NULL,
+      cur_date TEXT NOT NULL,
+      prev_date TEXT NOT NULL,
+      item_count INTEGER NOT NULL,
+      built_at TEXT NOT NULL,
+      PRIMARY KEY (kind, cur_date, prev_date)
+    )
+    """
+  )
+
+
+def _latest_fetch_dates(conn: sqlite3.Connection, table: str) -> List[str]:
+  # row_counts 与数据表同事务维护，读它比 DISTINCT 扫全表便宜
+  cursor = conn.execute(
+    """
+    SELECT fetch_date
+    FROM row_counts
+    WHERE table_name = ? AND fetch_date != '' AND row_count > 0
+    ORDER BY fetch_date DESC
+    LIMIT 2
+    """,
+    (table,),
+  )
+  rows = [row[0] for row in cursor.fetchall()]
+  return rows
+
+
+def _neighbour_fetch_date(
+  conn: sqlite3.Connection, table: str, fetch_date: str, newer: bool
+) -> Optional[str]:
+  op, direction = (">", "ASC") if newer else ("<", "DESC")
+  row = conn.execute(
+    f"""
+    SELECT fetch_date FROM row_counts
+    WHERE table_name = ? AND fetch_date != '' AND row_count > 0 AND fetch_date {op} ?
+    ORDER BY fetch_date {direction}
+    LIMIT 1
+    """,
+    (table, fetch_date),
+  ).fetchone()
+  return row[0] if row else None
+
+
+def _fetch_ranked_rows(
+  conn: sqlite3.Connection,
+  table: str,
+  fetch_date: str,
+  columns: List[str],
+  key_builder,
+) -> List[Dict[str, Any]]:
+  catalog = _archive_catalog(conn)
+  if fetch_date[:7] in catalog:
+    archived = _archived_ranked_rows(conn, table, columns, [fetch_date], catalog)
+    for record in archived:
+      record["__key"] = key_builder(record)
+    return archived
+  select_cols = ", ".join(columns)
+  cursor = conn.execute(
+    f"""
+    SELECT {select_cols}
+    FROM {table}
+    WHERE fetch_date = ?
+    ORDER BY created_at ASC, rowid ASC
+    """,
+    (fetch_date,),
+  )
+  ranked: List[Dict[str, Any]] = []
+  for idx, row in enumerate(cursor.fetchall(), start=1):
+    record = dict(row)
+    record["rank"] = idx
+    key = key_builder(record)
+    record["__key"] = key
+    ranked.append(record)
+  return ranked
+
+
+def _build_rank_change_items(
+  current_rows: List[Dict[str, Any]],
+  previous_rows: List[Dict[str, Any]],
+  label_fields: List[str],
+  metric_fields: List[str],
+  band_metrics: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+  items: List[Dict[str, Any]] = []
+  # 自然键在同一 fetch_date 内唯一（见 NATURAL_KEYS），直接按键查上一期
+  prev_lookup: Dict[str, Dict[str, Any]] = {}
+  for prev in previous_rows:
+    prev_lookup.setdefault(prev.get("__key", ""), prev)
+
+  sorted_current = sorted(current_rows, key=lambda r: r["rank"])
+  for record in sorted_current:
+    key = record.get("__key", "")
+    prev = prev_lookup.get(key)
+    item: Dict[str, Any] = {
+      "key": key,
+      "current_rank": record["rank"],
+      "previous_rank": prev["rank"] if prev else None,
+      "rank_change": (prev["rank"] - record["rank"]) if prev else None,
+      "current": {field: record.get(field) for field in metric_fields},
+      "previous": {field: prev.get(field) for field in metric_fields} if prev else None,
+    }
+    if band_metrics:
+      # 档位跃迁：正数表示区间上升，None 表示任一侧无法解析或没有上一期
+      item["band_change"] = {
+        m: (
+          record[f"{m}_band"] - prev[f"{m}_band"]
+          if prev and record.get(f"{m}_band") is not None and prev.get(f"{m}_band") is not None
+          else None
+        )
+        for m in band_metrics
+      }
+    for field in label_fields:
+      item[field] = record.get(field)
+    if prev:
+      for field in label_fields:
+        prev_value = prev.get(field)
+        if item.get(f"previous_{field}") is None:
+          item[f"previous_{field}"] = prev_value
+    items.append(item)
+  return items
+
+
+def _compute_rank_change_pair(
+  conn: sqlite3.Connection, kind: str, current_date: str, previous_date: str
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+  """Return (items, current_rows, previous_rows) for one date pair."""
+  spec = RANK_KINDS[kind]
+  current_rows = _fetch_ranked_rows(
+    conn, spec["table"], current_date, spec["columns"], spec["key"]
+  )
+  previous_rows = _fetch_ranked_rows(
+    conn, spec["table"], previous_date, spec["columns"], spec["key"]
+  )
+  # SQL 耗时由连接单独计数，这里只计 Python 侧按自然键拼接两天数据的耗时
+  with metrics.phase("rank_change.join"):
+    items = _build_rank_change_items(
+      current_rows,
+      previous_rows,
+      spec["label_fields"],
+      spec["metric_fields"],
+      spec["band_metrics"],
+    )
+  return items, current_rows, previous_rows
+
+
+def _store_rank_change_pair(
+  conn: sqlite3.Connection, kind: str, current_date: str, previous_date: str
+) -> int:
+  """(Re)build and persist the snapshot for one date pair; returns item count."""
+  items, current_rows, previous_rows = _compute_rank_change_pair(
+    conn, kind, current_date, previous_date
+  )
+  conn.execute(
+    "DELETE FROM rank_change WHERE kind = ? AND cur_date = ? AND prev_date = ?",
+    (kind, current_date, previous_date),
+  )
+  prev_by_rank = {r["rank"]: r for r in previous_rows}
+  band_cols = []
+  for m in ALL_BAND_METRICS:
+    band_cols.extend((f"{m}_band_from", f"{m}_band_to"))
+  columns = [
+    "kind",
+    "cur_date",
+    "prev_date",
+    "position",
+    "item_key",
+    "current_rank",
+    "previous_rank",
+    "rank_change",
+    *band_cols,
+    "payload",
+  ]
+  payload = []
+  for position, (item, record) in enumerate(zip(items, current_rows), start=1):
+    prev = prev_by_rank.get(item["previous_rank"]) if item["previous_rank"] else None
+    bands: List[Any] = []
+    for m in ALL_BAND_METRICS:
+      bands.extend((prev.get(f"{m}_band") if prev else None, record.get(f"{m}_band")))
+    payload.append(
+      (
+        kind,
+        current_date,
+        previous_date,
+        position,
+        item["key"],
+        item["current_rank"],
+        item["previous_rank"],
+        item["rank_change"],
+        *bands,
+        json.dumps(item, ensure_ascii=False),
+      )
+    )
+  conn.executemany(
+    f"INSERT INTO rank_change ({', '.join(columns)}) "
+    f"VALUES ({', '.join('?' for _ in columns)})",
+    payload,
+  )
+  conn.execute(
+    """
+    INSERT OR REPLACE INTO rank_change_snapshot
+      (kind, cur_date, prev_date, item_count, built_at)
+    VALUES (?, ?, ?, ?, ?)
+    """,
+    (kind, current_date, previous_date, len(payload), _now_iso()),
+  )
+  _aggregate_band_transitions(
+    conn, kind, "cur_date = ? AND prev_date = ?", (current_date, previous_date)
+  )
+  return len(payload)
+
+
+def _drop_rank_change_snapshots(
+  conn: sqlite3.Connection, kind: str, where_sql: str, params: Tuple[Any, ...]
+) -> None:
+  for table in ("rank_change", "rank_change_snapshot", "band_transition"):
+    conn.execute(f"DELETE FROM {table} WHERE kind = ? AND ({where_sql})", (kind, *params))
+
+
+def _refresh_rank_changes(
+  conn: sqlite3.Connection, table: str, fetch_dates: Iterable[str]
+) -> None:
+  """Rebuild the adjacent-date snapshots touched by rows landing on fetch_dates."""
+  kind = _KIND_BY_TABLE[table]
+  # 先收集受影响的日期对再统一重建：批量导入连续日期时，相邻日期共享的快照只算一次
+  pairs: Set[Tuple[str, str]] = set()
+  for fetch_date in sorted({d for d in fetch_dates if d}):
+    newer = _neighbour_fetch_date(conn, table, fetch_date, newer=True)
+    older = _neighbour_fetch_date(conn, table, fetch_date, newer=False)
+    # 该日期参与的快照全部失效；新日期插在中间时，原先跨过它的 (newer, older) 快照也一并失效
+    _drop_rank_change_snapshots(
+      conn, kind, "cur_date = ? OR prev_date = ?", (fetch_date, fetch_date)
+    )
+    if newer:
+      _drop_rank_change_snapshots(conn, kind, "cur_date = ?", (newer,))
+      pairs.add((newer, fetch_date))
+    if older:
+      pairs.add((fetch_date, older))
+  for current_date, previous_date in sorted(pairs):
+    _store_rank_change_pair(conn, kind, current_date, previous_date)
+
+
+def _rebuild_rank_change_kind(conn: sqlite3.Connection, kind: str) -> int:
+  # 早期迁移（如 v6 去重）也会调用这里，此时后加的快照相关表可能还不存在
+  _create_rank_change_tables(conn)
+  table = RANK_KINDS[kind]["table"]
+  dates = [
+    row[0]
+    for row in conn.execute(
+      """
+      SELECT fetch_date FROM row_counts
+      WHERE table_name = ? AND fetch_date != '' AND row_count > 0
+      ORDER BY fetch_date ASC
+      """,
+      (table,),
+    )
+  ]
+  _drop_rank_change_snapshots(conn, kind, "1=1", ())
+  total = 0
+  for previous_date, current_date in zip(dates, dates[1:]):
+    total += _store_rank_change_pair(conn, kind, current_date, previous_date)
+  return total
+
+
+def rebuild_rank_changes(db_path: Path = DB_PATH, kind: str | None = None) -> Dict[str, int]:
+  """Backfill rank_change for every adjacent fetch_date pair; returns items per kind."""
+  kinds = [kind] if kind else list(RANK_KINDS)
+  result: Dict[str, int] = {}
+  with get_engine(db_path).writer() as conn:
+    for name in kinds:
+      result[name] = _rebuild_rank_change_kind(conn, name)
+    _bump_data_version(conn)
+    _record_audit(
+      conn,
+      action="rebuild_rank_change",
+      detail=", ".join(f"{k}={v}" for k, v in result.items()),
+    )
+  return result
+
+
+def _read_rank_changes(
+  db_path: Path,
+  kind: str,
+  current_date: str | None = None,
+  previous_date: str | None = None,
+) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]:
+  table = RANK_KINDS[kind]["table"]
+  with get_engine(db_path).reader() as conn:
+    if current_date is None and previous_date is None:
+      dates = _latest_fetch_dates(conn, table)
+      if len(dates) < 2:
+        return (dates[0] if dates else None, None, [])
+      current_date, previous_date = dates[0], dates[1]
+    elif current_date is None:
+      raise ValueError("指定 previous_date 时必须同时指定 current_date")
+    elif previous_date is None:
+      previous_date = _neighbour_fetch_date(conn, table, current_date, newer=False)
+      if previous_date is None:
+        return current_date, None, []
+    if current_date == previous_date:
+      raise ValueError("current_date 与 previous_date 不能相同")
+
+    built = conn.execute(
+      "SELECT 1 FROM rank_change_snapshot WHERE kind = ? AND cur_date = ? AND prev_date = ?",
+      (kind, current_date, previous_date),
+    ).fetchone()
+    if not built or current_date[:7] in _archive_catalog(conn):
+      # 非相邻日期对不落库，已归档月份的快照明细在归档时移除（只保留档位跃迁计数）：
+      # 都直接按两天的数据现算（两次按 fetch_date 的索引读取，必要时读分区文件）
+      items, _, _ = _compute_rank_change_pair(conn, kind, current_date, previous_date)
+      return current_date, previous_date, items
+
+    rows = conn.execute(
+      """
+      SELECT payload FROM rank_change
+      WHERE kind = ? AND cur_date = ? AND prev_date = ?
+      ORDER BY position
+      """,
+      (kind, current_date, previous_date),
+    ).fetchall()
+    with metrics.phase("rank_change.decode"):
+      items = [json.loads(row[0]) for row in rows]
+    return current_date, previous_date, items
+
+
+def get_note_rank_changes(
+  db_path: Path = DB_PATH,
+  current_date: str | None = None,
+  previous_date: str | None = None,
+) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]:
+  """Rank diff between two fetch_dates (default: the latest two).
+
+  Only current_date given -> compare with the fetch_date right before it.
+  """
+  return _read_rank_changes(db_path, "note", current_date, previous_date)
+
+
+def get_account_rank_changes(
+  db_path: Path = DB_PATH,
+  current_date: str | None = None,
+  previous_date: str | None = None,
+) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]:
+  """Rank diff between two fetch_dates (see get_note_rank_changes)."""
+  return _read_rank_changes(db_path, "account", current_date, previous_date)
+
+
+def _window_fetch_dates(
+  conn: sqlite3.Connection, table: str, days: int, end_date: str | None
+) -> List[str]:
+  sql = (
+    "SELECT fetch_date FROM row_counts "
+    "WHERE table_name = ? AND fetch_date != '' AND row_count > 0"
+  )
+  params: List[Any] = [table]
+  if end_date:
+    sql += " AND fetch_date <= ?"
+    params.append(end_date)
+  sql += " ORDER BY fetch_date DESC LIMIT ?"
+  params.append(days)
+  return sorted(row[0] for row in conn.execute(sql, params))
+
+
+def get_rank_trajectory(
+  db_path: Path = DB_PATH,
+  kind: str = "note",
+  days: int = 7,
+  end_date: str | None = None,
+  keys: List[str] | None = None,
+  limit: int | None = None,
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+  """Rank and band series per key over the last `days` fetch_dates up to end_date.
+
+  One windowed query ranks every row of the window (ROW_NUMBER per fetch_date), then
+  rows are grouped by key in a single pass. Series are aligned with the returned
+  dates and hold None where the key is absent. Items are ordered by their rank on the
+  last date (absent keys last); `limit` keeps the first N.
+  """
+  spec = RANK_KINDS[kind]
+  table = spec["table"]
+  band_metrics: List[str] = spec["band_metrics"]
+  label_fields: List[str] = spec["label_fields"]
+  wanted = set(keys) if keys else None
+
+  with get_engine(db_path).reader() as conn:
+    dates = _window_fetch_dates(conn, table, max(1, days), end_date)
+    if not dates:
+      return [], []
+    position = {d: i for i, d in enumerate(dates)}
+    columns = [*label_fields, "fetch_date", *(f"{m}_band" for m in band_metrics)]
+    catalog = _archive_catalog(conn)
+    live_dates = [d for d in dates if d[:7] not in catalog]
+    cursor = conn.execute(
+      f"""
+      SELECT {', '.join(columns)},
+        ROW_NUMBER() OVER (PARTITION BY fetch_date ORDER BY created_at, rowid) AS rank
+      FROM {table}
+      WHERE fetch_date IN ({', '.join('?' for _ in live_dates)})
+      """,
+      live_dates,
+    )
+    archived_rows = _archived_ranked_rows(
+      conn, table, columns, [d for d in dates if d[:7] in catalog], catalog
+    ) if len(live_dates) < len(dates) else []
+
+    series: Dict[str, Dict[str, Any]] = {}
+    for row in itertools.chain(cursor, archived_rows):
+      record = dict(row)
+      key = spec["key"](record)
+      if wanted is not None and key not in wanted:
+        continue
+      item = series.get(key)
+      if item is None:
+        item = {"key": key, **{f: record.get(f) for f in label_fields}}
+        item["ranks"] = [None] * len(dates)
+        item["bands"] = {m: [None] * len(dates) for m in band_metrics}
+        series[key] = item
+      idx = position[record["fetch_date"]]
+      # 同一天重复出现的 key 只取排名最靠前的一条
+      if item["ranks"][idx] is None or record["rank"] < item["ranks"][idx]:
+        item["ranks"][idx] = record["rank"]
+        for m in band_metrics:
+          item["bands"][m][idx] = record.get(f"{m}_band")
+
+  items = list(series.values())
+  for item in items:
+    present = [r for r in item["ranks"] if r is not None]
+    item["rank_change"] = present[0] - present[-1] if len(present) >= 2 else None
+  last = len(dates) - 1
+  items.sort(
+    key=lambda it: (
+      it["ranks"][last] is None,
+      it["ranks"][last] if it["ranks"][last] is not None else 0,
+      it["key"],
+    )
+  )
+  if limit is not None:
+    items = items[: max(0, limit)]
+  return dates, items
+
+
+# ---- 档位统计（区间跃迁）：按 fetch_date 预聚合，随入库在同一事务内增量维护 ----
+
+
+def _create_band_stat_tables(conn: sqlite3.Connection) -> None:
+  # 每个 fetch_date、每个指标各档位的行数；档位无法解析（NULL）的行不计入
+  conn.execute(
+    """
+    CREATE TABLE IF NOT EXISTS band_distribution (
+      kind TEXT NOT NULL,
+      fetch_date TEXT NOT NULL,
+      metric TEXT NOT NULL,
+      band INTEGER NOT NULL,
+      row_count INTEGER NOT NULL,
+      PRIMARY KEY (kind, fetch_date, metric, band)
+    ) WITHOUT ROWID
+    """
+  )
+
+
+def _refresh_band_distribution(
+  conn: sqlite3.Connection, kind: str, fetch_dates: Iterable[str] | None
+) -> None:
+  """Recount band_distribution for fetch_dates (None = every date of the kind)."""
+  spec = RANK_KINDS[kind]
+  table = spec["table"]
+  if fetch_dates is None:
+    where_sql, params_list = "1=1", [()]
+    conn.execute("DELETE FROM band_distribution WHERE kind = ?", (kind,))
+  else:
+    dates = sorted({d for d in fetch_dates if d})
+    where_sql, params_list = "fetch_date = ?", [(d,) for d in dates]
+    conn.executemany(
+      "DELETE FROM band_distribution WHERE kind = ? AND fetch_date = ?",
+      [(kind, d) for d in dates],
+    )
+  for params in params_list:
+    for metric in spec["band_metrics"]:
+      conn.execute(
+        f"""
+        INSERT INTO band_distribution (kind, fetch_date, metric, band, row_count)
+        SELECT ?, fetch_date, ?, {metric}_band, COUNT(1)
+        FROM {table}
+        WHERE {where_sql} AND fetch_date != '' AND {metric}_band IS NOT NULL
+        GROUP BY fetch_date, {metric}_band
+        """,
+        (kind, metric, *params),
+      )
+
+  # 已归档月份：主库里只剩归档后补写的行，再加上分区文件里的计数
+  catalog = _archive_catalog(conn)
+  if fetch_dates is None:
+    targets: Dict[str, Optional[List[str]]] = {month: None for month in catalog}
+  else:
+    targets = {}
+    for fetch_date in dates:
+      if fetch_date[:7] in catalog:
+        targets.setdefault(fetch_date[:7], []).append(fetch_date)
+  for month, month_dates in targets.items():
+    date_sql = (
+      f"fetch_date IN ({', '.join('?' for _ in month_dates)})"
+      if month_dates is not None
+      else "fetch_date BETWEEN ? AND ?"
+    )
+    date_params = tuple(month_dates) if month_dates is not None else _month_range(month)
+    # 主库中更新过的已归档行（同 uuid）已按主库计入，分区里的旧版本不再重复统计
+    overridden = json.dumps(
+      [row[0] for row in conn.execute(f"SELECT uuid FROM {table} WHERE {date_sql}", date_params)]
+    )
+    for metric in spec["band_metrics"]:
+      counts = _read_partition(
+        catalog[month],
+        f"""
+        SELECT fetch_date, {metric}_band, COUNT(1) FROM {table}
+        WHERE {date_sql} AND {metric}_band IS NOT NULL
+          AND uuid NOT IN (SELECT value FROM json_each(?))
+        GROUP BY fetch_date, {metric}_band
+        """,
+        (*date_params, overridden),
+      )
+      conn.executemany(
+        """
+        INSERT INTO band_distribution (kind, fetch_date, metric, band, row_count)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (kind, fetch_date, metric, band) DO UPDATE SET
+          row_count = row_count + excluded.row_count
+        """,
+        [(kind, row[0], metric, row[1], row[2]) for row in counts],
+      )
+
+
+def _aggregate_band_transitions(
+  conn: sqlite3.Connection, kind: str, where_sql: str, params: Tuple[Any, ...]
+) -> None:
+  """Count (band_from, band_to) per metric from stored rank_change rows matching where_sql."""
+  for metric in RANK_KINDS[kind]["band_metrics"]:
+    conn.execute(
+      f"""
+      INSERT OR REPLACE INTO band_transition
+        (kind, cur_date, prev_date, metric, band_from, band_to, item_count)
+      SELECT kind, cur_date, prev_date, ?, {metric}_band_from, {metric}_band_to, COUNT(1)
+      FROM rank_change
+      WHERE kind = ? AND ({where_sql})
+        AND {metric}_band_from IS NOT NULL AND {metric}_band_to IS NOT NULL
+      GROUP BY cur_date, prev_date, {metric}_band_from, {metric}_band_to
+      """,
+      (metric, kind, *params),
+    )
+
+
+def _band_metrics_for(kind: str, metrics: List[str] | None) -> List[str]:
+  available: List[str] = RANK_KINDS[kind]["band_metrics"]
+  if not metrics:
+    return list(available)
+  unknown = [m for m in metrics if m not in available]
+  if unknown:
+    raise ValueError(f"不支持的指标：{', '.join(unknown)}（可选 {', '.join(available)}）")
+  return list(dict.fromkeys(metrics))
+
+
+def get_band_distribution(
+  db_path: Path = DB_PATH,
+  kind: str = "note",
+  metrics: List[str] | None = None,
+  days: int = 7,
+  end_date: str | None = None,
+) -> Dict[str, Any]:
+  """Per-date band histograms over the last `days` fetch_dates up to end_date.
+
+  Reads only the pre-aggregated band_distribution table. Each metric maps to one
+  entry per band ({band, lo, hi, counts}) with counts aligned to `dates`; `totals`
+  is the row count of each date (rows whose band could not be parsed included).
+  """
+  metrics = _band_metrics_for(kind, metrics)
+  table = RANK_KINDS[kind]["table"]
+  with get_engine(db_path).reader() as conn:
+    dates = _window_fetch_dates(conn, table, max(1, days), end_date)
+    result: Dict[str, Any] = {"dates": dates, "totals": [], "metrics": {m: [] for m in metrics}}
+    if not dates:
+      return result
+    position = {d: i for i, d in enumerate(dates)}
+    date_marks = ", ".join("?" for _ in dates)
+    totals = dict(
+      conn.execute(
+        f"SELECT fetch_date, row_count FROM row_counts "
+        f"WHERE table_name = ? AND fetch_date IN ({date_marks})",
+        (table, *dates),
+      ).fetchall()
+    )
+    result["totals"] = [totals.get(d, 0) for d in dates]
+    rows = conn.execute(
+      f"""
+      SELECT metric, band, fetch_date, row_count FROM band_distribution
+      WHERE kind = ? AND fetch_date IN ({date_marks})
+        AND metric IN ({', '.join('?' for _ in metrics)})
+      ORDER BY metric, band
+      """,
+      (kind, *dates, *metrics),
+    ).fetchall()
+
+  series: Dict[Tuple[str, int], List[int]] = {}
+  for metric, band, fetch_date, count in rows:
+    counts = series.get((metric, band))
+    if counts is None:
+      counts = series[(metric, band)] = [0] * len(dates)
+      lower, upper = intervals.band_bounds(metric, band)
+      result["metrics"][metric].append({"band": band, "lo": lower, "hi": upper, "counts": counts})
+    counts[position[fetch_date]] = count
+  return result
+
+
+def get_band_transitions(
+  db_path: Path = DB_PATH,
+  kind: str = "note",
+  metrics: List[str] | None = None,
+  days: int = 7,
+  end_date: str | None = None,
+) -> Dict[str, Any]:
+  """Band moves between adjacent fetch_dates for the last `days` dates up to end_date.
+
+  Reads only band_transition. `pairs` lists (current_date, previous_date); per metric,
+  `up` / `down` / `same` count items (present on both dates) per pair, `total` sums
+  them over the window and `matrix` holds the summed (from, to) counts.
+  """
+  metrics = _band_metrics_for(kind, metrics)
+  table = RANK_KINDS[kind]["table"]
+  with get_engine(db_path).reader() as conn:
+    dates = _window_fetch_dates(conn, table, max(1, days), end_date)
+    date_marks = ", ".join("?" for _ in dates)
+    pairs = (
+      conn.execute(
+        f"""
+        SELECT cur_date, prev_date FROM rank_change_snapshot
+        WHERE kind = ? AND cur_date IN ({date_marks})
+        ORDER BY cur_date
+        """,
+        (kind, *dates),
+      ).fetchall()
+      if dates
+      else []
+    )
+    rows = (
+      conn.execute(
+        f"""
+        SELECT metric, cur_date, prev_date, band_from, band_to, item_count
+        FROM band_transition
+        WHERE kind = ? AND cur_date IN ({date_marks})
+          AND metric IN ({', '.join('?' for _ in metrics)})
+        """,
+        (kind, *dates, *metrics),
+      ).fetchall()
+      if pairs
+      else []
+    )
+
+  position = {(cur, prev): i for i, (cur, prev) in enumerate(pairs)}
+  result: Dict[str, Any] = {
+    "pairs": [{"current_date": cur, "previous_date": prev} for cur, prev in pairs],
+    "metrics": {},
+  }
+  matrices: Dict[str, Dict[Tuple[int, int], int]] = {m: {} for m in metrics}
+  for metric in metrics:
+    result["metrics"][metric] = {
+      "up": [0] * len(pairs),
+      "down": [0] * len(pairs),
+      "same": [0] * len(pairs),
+    }
+  for metric, cur, prev, band_from, band_to, count in rows:
+    idx = position.get((cur, prev))
+    if idx is None:
+      continue
+    direction = "up" if band_to > band_from else "down" if band_to < band_from else "same"
+    result["metrics"][metric][direction][idx] += count
+    cell = (band_from, band_to)
+    matrices[metric][cell] = matrices[metric].get(cell, 0) + count
+  for metric, entry in result["metrics"].items():
+    entry["total"] = {d: sum(entry[d]) for d in ("up", "down", "same")}
+    entry["matrix"] = [
+      {"from": band_from, "to": band_to, "count": count}
+      for (band_from, band_to), count in sorted(matrices[metric].items())
+    ]
+  return result
+
+
+# ---- 冷数据归档：按 fetch_date 月份把旧数据移到分区文件 ----
+
+ARCHIVE_DIR_NAME = "partitions"
+
+_CREATE_TABLE_RE = re.compile(r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?[\"`\[]?\w+[\"`\]]?", re.I)
+
+
+def _partition_path(db_path: Path, month: str, archive_dir: Path | None = None) -> Path:
+  directory = archive_dir or db_path.parent / ARCHIVE_DIR_NAME
+  return directory / f"{db_path.stem}_{month}.db"
+
+
+def _ensure_partition_schema(conn: sqlite3.Connection, schema: str, table: str) -> None:
+  """Create `table` in the attached partition with the main table's shape and indexes."""
+  create_sql = conn.execute(
+    "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+  ).fetchone()[0]
+  conn.execute(_CREATE_TABLE_RE.sub(f"CREATE TABLE IF NOT EXISTS {schema}.{table}", create_sql, 1))
+  # 分区建好后主表又加了列（新迁移）时补上，之后的合并按主表列复制
+  present = set(_table_columns(conn, table, schema))
+  for _, name, col_type, _, default, _ in conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+    if name not in present:
+      conn.execute(
+        f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {col_type}"
+        + (f" DEFAULT {default}" if default is not None else "")
+      )
+  for sql in _rank_order_index_sql(table, schema):
+    conn.execute(sql)
+  conn.execute(
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {schema}.idx_{table}_natural_key "
+    f"ON {table} ({', '.join(NATURAL_KEYS[table])})"
+  )
+
+
+def _merge_into_partition(
+  conn: sqlite3.Connection,
+  schema: str,
+  table: str,
+  where_sql: str,
+  params: Tuple[Any, ...],
+) -> int:
+  """Copy main rows matching `where_sql` (on alias m) into the partition, keyed by NATURAL_KEYS.
+
+  Keys already in the partition are updated in place like an upsert (uuid / created_at
+  and so the in-day position stay); the rest are appended in (created_at, rowid) order.
+  Returns the number of appended rows.
+  """
+  columns = _table_columns(conn, table)
+  keys = NATURAL_KEYS[table]
+  updatable = [c for c in columns if c not in ("uuid", "created_at", *keys)]
+  match_sql = " AND ".join(f"m.{k} = p.{k}" for k in keys)
+  conn.execute(
+    f"""
+    UPDATE {schema}.{table} AS p SET ({', '.join(updatable)}) = (
+      SELECT {', '.join(f'm.{c}' for c in updatable)} FROM main.{table} AS m
+      WHERE {match_sql} AND {where_sql}
+    )
+    WHERE EXISTS (SELECT 1 FROM main.{table} AS m WHERE {match_sql} AND {where_sql})
+    """,
+    (*params, *params),
+  )
+  return conn.execute(
+    f"""
+    INSERT INTO {schema}.{table} ({', '.join(columns)})
+    SELECT {', '.join(f'm.{c}' for c in columns)} FROM main.{table} AS m
+    WHERE {where_sql} AND NOT EXISTS (SELECT 1 FROM {schema}.{table} AS p WHERE {match_sql})
+    ORDER BY m.created_at, m.rowid
+    """,
+    params,
+  ).rowcount
+
+
+def _unsynced_in_month(conn: sqlite3.Connection, month: str) -> bool:
+  """Whether the main tables hold rows of `month` past a kind's Feishu sync high-water mark.
+
+  feishu_sync only scans the main tables, so such rows must not be archived yet. Kinds
+  that were never synced (no feishu_sync_state row) are not checked.
+  """
+  lo, hi = _month_range(month)
+  for kind, spec in RANK_KINDS.items():
+    mark = conn.execute(
+      """
+      SELECT high_water_version, high_water_rowid FROM feishu_sync_state
+      WHERE kind = ? ORDER BY high_water_version, high_water_rowid LIMIT 1
+      """,
+      (kind,),
+    ).fetchone()
+    if mark is None:
+      continue
+    if conn.execute(
+      f"""
+      SELECT 1 FROM main.{spec['table']}
+      WHERE fetch_date BETWEEN ? AND ?
+        AND (row_version > ? OR (row_version = ? AND rowid > ?))
+      LIMIT 1
+      """,
+      (lo, hi, mark[0], mark[0], mark[1]),
+    ).fetchone():
+      return True
+  return False
+
+
+def _archive_plan(
+  conn: sqlite3.Connection, keep_months: int
+) -> Tuple[List[str], List[str], List[str]]:
+  """(months to archive for the first time, archived months with rows written since, deferred).
+
+  Months holding rows not yet synced to Feishu are deferred; a deferred new month also
+  defers every later one, so archived months stay a prefix of the date range.
+  """
+  months = [
+    row[0]
+    for row in conn.execute(
+      f"""
+      SELECT DISTINCT substr(fetch_date, 1, 7) FROM row_counts
+      WHERE table_name IN ({', '.join('?' for _ in NATURAL_KEYS)})
+        AND fetch_date != '' AND row_count > 0
+      ORDER BY 1
+      """,
+      tuple(NATURAL_KEYS),
+    )
+  ]
+  if not months:
+    return [], [], []
+  cutoff = _shift_month(months[-1], -(keep_months - 1))
+  catalog = _archive_catalog(conn)
+  fresh: List[str] = []
+  deferred: List[str] = []
+  for month in months:
+    if month >= cutoff or month in catalog:
+      continue
+    if deferred or _unsynced_in_month(conn, month):
+      deferred.append(month)
+    else:
+      fresh.append(month)
+  late = [
+    month
+    for month in catalog
+    if any(
+      conn.execute(
+        f"SELECT 1 FROM main.{table} WHERE fetch_date BETWEEN ? AND ? LIMIT 1",
+        _month_range(month),
+      ).fetchone()
+      for table in NATURAL_KEYS
+    )
+  ]
+  deferred.extend(month for month in late if _unsynced_in_month(conn, month))
+  late = [month for month in late if month not in deferred]
+  return fresh, late, sorted(deferred)
+
+
+def _write_parquet_copy(path: Path, table: str, db_path: Path) -> Path:
+  import exporter  # 可选依赖 pyarrow，仅在需要时导入
+
+  target = path.with_name(f"{path.stem}_{table}.parquet")
+  part = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+  part.row_factory = sqlite3.Row
+  try:
+    cursor = part.execute(f"SELECT * FROM {table} ORDER BY fetch_date, created_at, rowid")
+    rows = _iter_cursor(cursor, 1000, rank=False)
+    tmp = target.with_suffix(".parquet.tmp")
+    with open(tmp, "wb") as f:
+      declared = {row[1]: row[2] for row in part.execute(f"PRAGMA table_info({table})")}
+      for chunk in exporter.parquet_stream(rows, columns=list(declared), types=declared):
+        f.write(chunk)
+    os.replace(tmp, target)
+  finally:
+    part.close()
+  return target
+
+
+def archive_months(
+  db_path: Path = DB_PATH,
+  keep_months: int = 3,
+  archive_dir: Path | None = None,
+  parquet: bool = False,
+  dry_run: bool = False,
+) -> Dict[str, Any]:
+  """Move rank rows older than the newest `keep_months` fetch_date months into partition files.
 
+  Each month goes to its own SQLite file (archive_partition records it); list_*_rows,
+  the cursor / export iterators, rank changes and trajectories read partitions whenever
+  the requested dates reach them. Runs online: rows are copied in short transactions on a
+  separate connection, then one writer transaction per month merges what changed in the
+  meantime and deletes the month from the main database. Rows later written for an archived
+  month stay in the main database until the next run merges them. Months with rows that
+  feishu_sync has not pushed yet are left in place (`deferred`). With `parquet`, a
+  compressed Parquet copy of each partition table is written next to it (needs pyarrow).
+  """
+  if keep_months < 1:
+    raise ValueError("keep_months 至少为 1")
+  engine = get_engine(db_path)
+  with engine.reader() as conn:
+    fresh, late, deferred = _archive_plan(conn, keep_months)
+  result: Dict[str, Any] = {"archived": fresh, "merged": late, "deferred": deferred, "rows": {}}
+  if dry_run or not (fresh or late):
+    return result
+  db_path = Path(db_path)
 
-def _now_iso() -> str:
-  tz = timezone(timedelta(hours=8))  # 东八区
-  return datetime.now(tz).isoformat(timespec="seconds")
+  # 第一阶段：在单独连接上逐日复制到分区文件，只读主库，不占用写锁
+  since = get_data_version(db_path)[0]
+  for month in fresh:
+    path = _partition_path(db_path, month, archive_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    schema = _partition_schema(month)
+    copy_conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    try:
+      copy_conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+      for table in NATURAL_KEYS:
+        copy_conn.execute("BEGIN")
+        _ensure_partition_schema(copy_conn, schema, table)
+        copy_conn.execute("COMMIT")
+        dates = [
+          row[0]
+          for row in copy_conn.execute(
+            "SELECT fetch_date FROM row_counts WHERE table_name = ? AND fetch_date BETWEEN ? AND ?",
+            (table, *_month_range(month)),
+          )
+        ]
+        for fetch_date in dates:
+          copy_conn.execute("BEGIN")
+          _merge_into_partition(copy_conn, schema, table, "m.fetch_date = ?", (fetch_date,))
+          copy_conn.execute("COMMIT")
+      copy_conn.execute(f"DETACH DATABASE {schema}")
+    finally:
+      copy_conn.close()
 
+  # 第二阶段：每个月一个写事务，补上复制期间的改动后从主库删除该月
+  touched: Dict[str, Set[str]] = {table: set() for table in NATURAL_KEYS}
+  for month in sorted([*fresh, *late]):
+    if month in fresh and any(m in fresh for m in deferred):
+      deferred.append(month)
+      continue
+    path = _partition_path(db_path, month, archive_dir) if month in fresh else None
+    with engine.reader() as conn:
+      path = path or _archive_catalog(conn)[month]
+    schema = _partition_schema(month)
+    lo, hi = _month_range(month)
+    counts: Dict[str, int] = {}
+    with engine.writer_attached(path, schema) as conn:
+      # 复制期间可能写入了尚未同步到飞书的行：本月（及之后的新月份）留到下次
+      if _unsynced_in_month(conn, month):
+        deferred.append(month)
+        continue
+      for table in NATURAL_KEYS:
+        _ensure_partition_schema(conn, schema, table)
+        if month in fresh:
+          where_sql, params = "m.fetch_date BETWEEN ? AND ? AND m.row_version > ?", (lo, hi, since)
+        else:
+          where_sql, params = "m.fetch_date BETWEEN ? AND ?", (lo, hi)
+        _merge_into_partition(conn, schema, table, where_sql, params)
+        if month in late:
+          touched[table].update(
+            row[0]
+            for row in conn.execute(
+              f"SELECT DISTINCT fetch_date FROM main.{table} WHERE fetch_date BETWEEN ? AND ?",
+              (lo, hi),
+            )
+          )
+        if engine.has_search:
+          conn.execute(
+            f"DELETE FROM main.{table}_search WHERE rowid IN "
+            f"(SELECT rowid FROM main.{table} WHERE fetch_date BETWEEN ? AND ?)",
+            (lo, hi),
+          )
+        conn.execute(f"DELETE FROM main.{table} WHERE fetch_date BETWEEN ? AND ?", (lo, hi))
+        # row_counts 保持逻辑行数：该月以分区内的行为准
+        conn.execute(
+          "DELETE FROM row_counts WHERE table_name = ? AND fetch_date BETWEEN ? AND ?",
+          (table, lo, hi),
+        )
+        conn.execute(
+          f"""
+          INSERT INTO row_counts (table_name, fetch_date, row_count)
+          SELECT ?, fetch_date, COUNT(1) FROM {schema}.{table}
+          WHERE fetch_date BETWEEN ? AND ?
+          GROUP BY fetch_date
+          """,
+          (table, lo, hi),
+        )
+        counts[table] = conn.execute(
+          f"SELECT COUNT(1) FROM {schema}.{table} WHERE fetch_date BETWEEN ? AND ?", (lo, hi)
+        ).fetchone()[0]
+      conn.execute(
+        """
+        INSERT OR REPLACE INTO archive_partition
+          (month, path, note_rows, account_rows, archived_at)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+          month,
+          os.path.relpath(path, db_path.parent),
+          counts["note_rank"],
+          counts["account_rank"],
+          _now_iso(),
+        ),
+      )
+      # 已归档月份的排名变化明细按需现算，只保留快照记录与档位跃迁计数
+      conn.execute("DELETE FROM rank_change WHERE cur_date BETWEEN ? AND ?", (lo, hi))
+      _bump_data_version(conn)
+      _record_audit(
+        conn,
+        action="archive_month",
+        detail=f"{month} note={counts['note_rank']} account={counts['account_rank']}",
+      )
+    result["rows"][month] = counts
+  fresh = result["archived"] = [month for month in fresh if month not in deferred]
+  late = result["merged"] = [month for month in late if month not in deferred]
+  result["deferred"] = sorted(deferred)
 
-def _new_uuid() -> str:
-  return str(uuid.uuid4())
+  # 补写进已归档月份的行合并后，按分区重新统计这些日期的档位分布与排名变化
+  if any(touched.values()):
+    with engine.writer() as conn:
+      for table, dates in touched.items():
+        if dates:
+          _refresh_rank_changes(conn, table, dates)
+          _refresh_band_distribution(conn, _KIND_BY_TABLE[table], dates)
+      for month in late:
+        conn.execute("DELETE FROM rank_change WHERE cur_date BETWEEN ? AND ?", _month_range(month))
+      _bump_data_version(conn)
 
+  if parquet:
+    with engine.reader() as conn:
+      catalog = _archive_catalog(conn)
+    result["parquet"] = [
+      str(_write_parquet_copy(catalog[month], table, db_path))
+      for month in sorted([*fresh, *late])
+      for table in NATURAL_KEYS
+    ]
+  return result
 
-def _normalize_value(value: Any) -> str:
-  # Store as text for flexibility (区间、百分比等)
-  if value is None:
-    return ""
-  return str(value).strip()
 
+# ---- 飞书上传任务队列 ----
 
-def init_db_if_needed(db_path: Path = DB_PATH) -> None:
-  """Create SQLite file and tables if they do not exist."""
-  _ensure_db_dir(db_path)
-  with sqlite3.connect(db_path) as conn:
-    conn.execute("PRAGMA journal_mode=WAL;")
+UPLOAD_JOB_STATUSES = ("pending", "running", "done", "failed")
+_UPLOAD_JOB_COLUMNS = (
+  "id, kind, status, row_count, uploaded, attempts, max_attempts, last_error, "
+  "next_attempt_at, created_at, updated_at, finished_at"
+)
+
+
+def enqueue_upload_job(
+  kind: str,
+  rows: List[Dict[str, Any]],
+  db_path: Path = DB_PATH,
+  max_attempts: int = 5,
+) -> str:
+  """Persist an upload job (rows as JSON) and return its id."""
+  job_id = _new_uuid()
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
     conn.execute(
       """
-      CREATE TABLE IF NOT EXISTS note_rank (
-        uuid TEXT PRIMARY KEY,
-        title TEXT,
-        nickname TEXT,
-        publish_time TEXT,
-        read_count TEXT,
-        click_rate TEXT,
-        pay_conversion_rate TEXT,
-        gmv TEXT,
-        fetch_date TEXT,
-        created_at TEXT
+      INSERT INTO upload_job (
+        id, kind, status, payload, row_count, max_attempts,
+        next_attempt_at, created_at, updated_at
       )
-      """
+      VALUES (?, ?, 'pending', ?, ?, ?, ?, ?, ?)
+      """,
+      (
+        job_id,
+        kind,
+        json.dumps(rows, ensure_ascii=False),
+        len(rows),
+        max_attempts,
+        now,
+        now,
+        now,
+      ),
     )
-    conn.execute(
+    _record_audit(conn, action="enqueue_upload_job", detail=f"{kind} id={job_id} rows={len(rows)}")
+  return job_id
+
+
+def claim_upload_job(
+  db_path: Path = DB_PATH, lease_seconds: int = 600
+) -> Optional[Dict[str, Any]]:
+  """Atomically take the oldest due job (or one whose worker lease expired).
+
+  Returns the job with its decoded "rows", or None when nothing is due.
+  """
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    row = conn.execute(
       """
-      CREATE TABLE IF NOT EXISTS account_rank (
-        uuid TEXT PRIMARY KEY,
-        shop_name TEXT,
-        fans_count TEXT,
-        read_count TEXT,
-        click_rate TEXT,
-        pay_conversion_rate TEXT,
-        gmv TEXT,
-        fetch_date TEXT,
-        created_at TEXT
-      )
+      SELECT id FROM upload_job
+      WHERE (status = 'pending' AND next_attempt_at <= ?)
+         OR (status = 'running' AND lease_until < ?)
+      ORDER BY next_attempt_at
+      LIMIT 1
+      """,
+      (now, now),
+    ).fetchone()
+    if row is None:
+      return None
+    claimed = conn.execute(
       """
-    )
+      UPDATE upload_job
+      SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ?
+      WHERE id = ? AND status IN ('pending', 'running')
+      """,
+      (_now_iso(lease_seconds), now, row[0]),
+    ).rowcount
+    if not claimed:
+      return None
+    job = dict(conn.execute("SELECT * FROM upload_job WHERE id = ?", (row[0],)).fetchone())
+  job["rows"] = json.loads(job.pop("payload"))
+  return job
+
+
+def update_upload_job_progress(job_id: str, uploaded: int, db_path: Path = DB_PATH) -> None:
+  with get_engine(db_path).writer() as conn:
     conn.execute(
-      """
-      CREATE TABLE IF NOT EXISTS audit_log (
-        uuid TEXT PRIMARY KEY,
-        action TEXT,
-        detail TEXT,
-        created_at TEXT
-      )
-      """
+      "UPDATE upload_job SET uploaded = ?, updated_at = ? WHERE id = ?",
+      (uploaded, _now_iso(), job_id),
     )
-    conn.commit()
-
 
-def _record_audit(conn: sqlite3.Connection, action: str, detail: str) -> None:
-  conn.execute(
-    """
-    INSERT INTO audit_log (uuid, action, detail, created_at)
-    VALUES (?, ?, ?, ?)
-    """,
-    (_new_uuid(), action, detail, _now_iso()),
-  )
 
+def complete_upload_job(job_id: str, uploaded: int, db_path: Path = DB_PATH) -> None:
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    conn.execute(
+      """
+      UPDATE upload_job
+      SET status = 'done', uploaded = ?, last_error = NULL, lease_until = NULL,
+          updated_at = ?, finished_at = ?
+      WHERE id = ?
+      """,
+      (uploaded, now, now, job_id),
+    )
+    _record_audit(conn, action="upload_job_done", detail=f"id={job_id} uploaded={uploaded}")
 
-def insert_note_rows(rows: Iterable[Dict[str, Any]], db_path: Path = DB_PATH) -> int:
-  """Insert content-rank rows, return inserted count."""
-  rows_list = list(rows)
-  if not rows_list:
-    return 0
 
-  init_db_if_needed(db_path)
-  created_at = _now_iso()
-  payload = [
-    (
-      _new_uuid(),
-      _normalize_value(r.get("title")),
-      _normalize_value(r.get("nickname")),
-      _normalize_value(r.get("publishTime") or r.get("publish_time")),
-      _normalize_value(r.get("readCount") or r.get("read_count")),
-      _normalize_value(r.get("clickRate") or r.get("click_rate")),
-      _normalize_value(r.get("payConversionRate") or r.get("pay_conversion_rate")),
-      _normalize_value(r.get("gmv")),
-      _normalize_value(r.get("fetchDate") or r.get("fetch_date")),
-      created_at,
-    )
-    for r in rows_list
-  ]
+def fail_upload_job(
+  job_id: str, error: str, retry_in_seconds: float, db_path: Path = DB_PATH
+) -> str:
+  """Record a failed attempt; requeue with delay unless attempts are exhausted.
 
-  with sqlite3.connect(db_path) as conn:
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.executemany(
+  Returns the new status ("pending" or "failed").
+  """
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    row = conn.execute(
+      "SELECT attempts, max_attempts FROM upload_job WHERE id = ?", (job_id,)
+    ).fetchone()
+    if row is None:
+      return "failed"
+    status = "pending" if row[0] < row[1] else "failed"
+    conn.execute(
       """
-      INSERT INTO note_rank (
-        uuid, title, nickname, publish_time,
-        read_count, click_rate, pay_conversion_rate,
-        gmv, fetch_date, created_at
-      )
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+      UPDATE upload_job
+      SET status = ?, last_error = ?, next_attempt_at = ?, lease_until = NULL,
+          updated_at = ?, finished_at = ?
+      WHERE id = ?
       """,
-      payload,
-    )
-    _record_audit(
-      conn,
-      action="insert_note_rank",
-      detail=f"inserted={len(payload)}",
+      (
+        status,
+        error[:2000],
+        _now_iso(retry_in_seconds),
+        now,
+        now if status == "failed" else None,
+        job_id,
+      ),
     )
-    conn.commit()
-  return len(payload)
+    if status == "failed":
+      _record_audit(conn, action="upload_job_failed", detail=f"id={job_id} error={error[:200]}")
+  return status
 
 
-def insert_account_rows(
-  rows: Iterable[Dict[str, Any]], db_path: Path = DB_PATH
-) -> int:
-  """Insert account-rank rows, return inserted count."""
-  rows_list = list(rows)
-  if not rows_list:
-    return 0
+def retry_upload_job(job_id: str, db_path: Path = DB_PATH) -> bool:
+  """Put a failed job back in the queue with a fresh attempt budget."""
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    changed = conn.execute(
+      """
+      UPDATE upload_job
+      SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ?,
+          finished_at = NULL
+      WHERE id = ? AND status = 'failed'
+      """,
+      (now, now, job_id),
+    ).rowcount
+  return bool(changed)
 
-  init_db_if_needed(db_path)
-  created_at = _now_iso()
-  payload = [
-    (
-      _new_uuid(),
-      _normalize_value(r.get("shopName") or r.get("shop_name")),
-      _normalize_value(r.get("fansCount") or r.get("fans_count")),
-      _normalize_value(r.get("readCount") or r.get("read_count")),
-      _normalize_value(r.get("clickRate") or r.get("click_rate")),
-      _normalize_value(r.get("payConversionRate") or r.get("pay_conversion_rate")),
-      _normalize_value(r.get("gmv")),
-      _normalize_value(r.get("fetchDate") or r.get("fetch_date")),
-      created_at,
-    )
-    for r in rows_list
-  ]
 
-  with sqlite3.connect(db_path) as conn:
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.executemany(
+def get_upload_job(job_id: str, db_path: Path = DB_PATH) -> Optional[Dict[str, Any]]:
+  """Job status plus batch checkpoint counts (batches_total / batches_done)."""
+  with get_engine(db_path).reader() as conn:
+    row = conn.execute(
+      f"SELECT {_UPLOAD_JOB_COLUMNS} FROM upload_job WHERE id = ?", (job_id,)
+    ).fetchone()
+    if row is None:
+      return None
+    batches = conn.execute(
       """
-      INSERT INTO account_rank (
-        uuid, shop_name, fans_count,
-        read_count, click_rate, pay_conversion_rate,
-        gmv, fetch_date, created_at
-      )
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+      SELECT COUNT(1), COALESCE(SUM(status = 'done'), 0)
+      FROM upload_batch WHERE job_id = ?
       """,
-      payload,
-    )
-    _record_audit(
-      conn,
-      action="insert_account_rank",
-      detail=f"inserted={len(payload)}",
-    )
-    conn.commit()
-  return len(payload)
+      (job_id,),
+    ).fetchone()
+  job = dict(row)
+  job["batches_total"], job["batches_done"] = batches[0], batches[1]
+  return job
 
 
-def list_note_rows(
+def list_upload_jobs(
   db_path: Path = DB_PATH,
-  q: str | None = None,
-  fetch_date_from: str | None = None,
-  fetch_date_to: str | None = None,
+  status: str | None = None,
+  kind: str | None = None,
   page: int = 1,
   page_size: int = 20,
 ) -> Tuple[List[Dict[str, Any]], int]:
-  """List note_rank rows with simple filters and pagination."""
-  init_db_if_needed(db_path)
+  """List upload jobs (newest first) without their row payloads."""
   offset = (page - 1) * page_size
-  with sqlite3.connect(db_path) as conn:
-    conn.row_factory = sqlite3.Row
-    conditions = ["1=1"]
-    params: List[Any] = []
-    if q:
-      conditions.append("(title LIKE ? OR nickname LIKE ?)")
-      params.extend((f"%{q}%", f"%{q}%"))
-    if fetch_date_from:
-      conditions.append("fetch_date >= ?")
-      params.append(fetch_date_from)
-    if fetch_date_to:
-      conditions.append("fetch_date <= ?")
-      params.append(fetch_date_to)
-
-    where_sql = " WHERE " + " AND ".join(conditions)
-    query_sql = (
-      "SELECT * FROM note_rank"
+  conditions = ["1=1"]
+  params: List[Any] = []
+  if status:
+    conditions.append("status = ?")
+    params.append(status)
+  if kind:
+    conditions.append("kind = ?")
+    params.append(kind)
+  where_sql = " WHERE " + " AND ".join(conditions)
+  with get_engine(db_path).reader() as conn:
+    rows = conn.execute(
+      f"SELECT {_UPLOAD_JOB_COLUMNS} FROM upload_job"
       + where_sql
-      + " ORDER BY fetch_date DESC, created_at DESC LIMIT ? OFFSET ?"
-    )
-    params_tuple = tuple(params)
-    rows = conn.execute(query_sql, (*params_tuple, page_size, offset)).fetchall()
-    count_sql = "SELECT COUNT(1) FROM note_rank" + where_sql
-    total = conn.execute(count_sql, params_tuple).fetchone()[0]
+      + " ORDER BY created_at DESC LIMIT ? OFFSET ?",
+      (*params, page_size, offset),
+    ).fetchall()
+    total = conn.execute("SELECT COUNT(1) FROM upload_job" + where_sql, params).fetchone()[0]
+  return [dict(r) for r in rows], total
 
-    items: List[Dict[str, Any]] = []
-    for idx, row in enumerate(rows):
-      record = dict(row)
-      record["rank"] = offset + idx + 1
-      items.append(record)
-    return items, total
 
+def count_upload_jobs(db_path: Path = DB_PATH) -> Dict[str, int]:
+  """Number of upload jobs per status (for /metrics)."""
+  with get_engine(db_path).reader() as conn:
+    rows = conn.execute("SELECT status, COUNT(1) FROM upload_job GROUP BY status").fetchall()
+  return {row[0]: row[1] for row in rows}
 
-def list_account_rows(
-  db_path: Path = DB_PATH,
-  q: str | None = None,
-  fetch_date_from: str | None = None,
-  fetch_date_to: str | None = None,
-  page: int = 1,
-  page_size: int = 20,
-) -> Tuple[List[Dict[str, Any]], int]:
-  """List account_rank rows with simple filters and pagination."""
-  init_db_if_needed(db_path)
-  offset = (page - 1) * page_size
-  with sqlite3.connect(db_path) as conn:
-    conn.row_factory = sqlite3.Row
-    conditions = ["1=1"]
-    params: List[Any] = []
-    if q:
-      conditions.append("(shop_name LIKE ?)")
-      params.append(f"%{q}%")
-    if fetch_date_from:
-      conditions.append("fetch_date >= ?")
-      params.append(fetch_date_from)
-    if fetch_date_to:
-      conditions.append("fetch_date <= ?")
-      params.append(fetch_date_to)
 
-    where_sql = " WHERE " + " AND ".join(conditions)
-    query_sql = (
-      "SELECT * FROM account_rank"
-      + where_sql
-      + " ORDER BY fetch_date DESC, created_at DESC LIMIT ? OFFSET ?"
-    )
-    params_tuple = tuple(params)
-    rows = conn.execute(query_sql, (*params_tuple, page_size, offset)).fetchall()
-    count_sql = "SELECT COUNT(1) FROM account_rank" + where_sql
-    total = conn.execute(count_sql, params_tuple).fetchone()[0]
+# ---- 上传批次检查点 ----
 
-    items: List[Dict[str, Any]] = []
-    for idx, row in enumerate(rows):
-      record = dict(row)
-      record["rank"] = offset + idx + 1
-      items.append(record)
-    return items, total
 
+def load_upload_batches(job_id: str, table_key: str, db_path: Path = DB_PATH) -> List[Dict[str, Any]]:
+  """Return the persisted batch plan of a job for one Bitable table (empty if none)."""
+  with get_engine(db_path).reader() as conn:
+    rows = conn.execute(
+      """
+      SELECT batch_index, client_token, record_hashes, record_count, status
+      FROM upload_batch
+      WHERE job_id = ? AND table_key = ?
+      ORDER BY batch_index
+      """,
+      (job_id, table_key),
+    ).fetchall()
+  batches = []
+  for row in rows:
+    item = dict(row)
+    item["record_hashes"] = json.loads(item["record_hashes"])
+    batches.append(item)
+  return batches
 
-def list_audit_logs(
-  db_path: Path = DB_PATH,
-  action: str | None = None,
-  detail_q: str | None = None,
-  created_from: str | None = None,
-  created_to: str | None = None,
-  page: int = 1,
-  page_size: int = 20,
-) -> Tuple[List[Dict[str, Any]], int]:
-  """List audit_log rows with simple filters and pagination."""
-  init_db_if_needed(db_path)
-  offset = (page - 1) * page_size
-  with sqlite3.connect(db_path) as conn:
-    conn.row_factory = sqlite3.Row
-    conditions = ["1=1"]
-    params: List[Any] = []
-    if action:
-      conditions.append("action = ?")
-      params.append(action)
-    if detail_q:
-      conditions.append("detail LIKE ?")
-      params.append(f"%{detail_q}%")
-    if created_from:
-      conditions.append("created_at >= ?")
-      params.append(created_from)
-    if created_to:
-      conditions.append("created_at <= ?")
-      params.append(created_to)
 
-    where_sql = " WHERE " + " AND ".join(conditions)
-    query_sql = (
-      "SELECT * FROM audit_log"
-      + where_sql
-      + " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+def save_upload_batches(
+  job_id: str, table_key: str, batches: List[Dict[str, Any]], db_path: Path = DB_PATH
+) -> None:
+  """Persist a batch plan; batches already stored for the job are left untouched."""
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    conn.executemany(
+      """
+      INSERT OR IGNORE INTO upload_batch (
+        job_id, batch_index, table_key, client_token, record_hashes,
+        record_count, status, updated_at
+      )
+      VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
+      """,
+      [
+        (
+          job_id,
+          b["batch_index"],
+          table_key,
+          b["client_token"],
+          json.dumps(b["record_hashes"]),
+          len(b["record_hashes"]),
+          now,
+        )
+        for b in batches
+      ],
     )
-    params_tuple = tuple(params)
-    rows = conn.execute(query_sql, (*params_tuple, page_size, offset)).fetchall()
-    count_sql = "SELECT COUNT(1) FROM audit_log" + where_sql
-    total = conn.execute(count_sql, params_tuple).fetchone()[0]
 
-    return [dict(r) for r in rows], total
 
+def complete_upload_batch(
+  job_id: str,
+  table_key: str,
+  batch_index: int,
+  record_hashes: List[str],
+  record_ids: List[Optional[str]],
+  db_path: Path = DB_PATH,
+) -> None:
+  """Mark a batch confirmed and remember its records as present in Bitable."""
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    conn.execute(
+      """
+      UPDATE upload_batch SET status = 'done', record_ids = ?, updated_at = ?
+      WHERE job_id = ? AND batch_index = ?
+      """,
+      (json.dumps(record_ids), now, job_id, batch_index),
+    )
+    ids = list(record_ids) + [None] * (len(record_hashes) - len(record_ids))
+    conn.executemany(
+      """
+      INSERT INTO feishu_record (table_key, content_hash, record_id, job_id, created_at)
+      VALUES (?, ?, ?, ?, ?)
+      ON CONFLICT (table_key, content_hash) DO NOTHING
+      """,
+      [(table_key, h, rid, job_id, now) for h, rid in zip(record_hashes, ids)],
+    )
 
-def _latest_fetch_dates(conn: sqlite3.Connection, table: str) -> List[str]:
-  cursor = conn.execute(
-    f"""
-    SELECT DISTINCT fetch_date
-    FROM {table}
-    WHERE fetch_date IS NOT NULL AND fetch_date != ''
-    ORDER BY fetch_date DESC
-    LIMIT 2
-    """
-  )
-  rows = [row[0] for row in cursor.fetchall()]
-  return rows
 
+def known_feishu_records(
+  table_key: str, record_hashes: List[str], db_path: Path = DB_PATH
+) -> Set[str]:
+  """Subset of `record_hashes` already confirmed in the given Bitable table."""
+  if not record_hashes:
+    return set()
+  with get_engine(db_path).reader() as conn:
+    rows = conn.execute(
+      """
+      SELECT content_hash FROM feishu_record
+      WHERE table_key = ? AND content_hash IN (SELECT value FROM json_each(?))
+      """,
+      (table_key, json.dumps(record_hashes)),
+    ).fetchall()
+  return {r[0] for r in rows}
 
-def _fetch_ranked_rows(
-  conn: sqlite3.Connection,
-  table: str,
-  fetch_date: str,
-  columns: List[str],
-  key_builder,
-) -> List[Dict[str, Any]]:
-  select_cols = ", ".join(columns)
-  cursor = conn.execute(
-    f"""
-    SELECT {select_cols}
-    FROM {table}
-    WHERE fetch_date = ?
-    ORDER BY created_at ASC
-    """,
-    (fetch_date,),
-  )
-  ranked: List[Dict[str, Any]] = []
-  for idx, row in enumerate(cursor.fetchall(), start=1):
-    record = dict(row)
-    record["rank"] = idx
-    key = key_builder(record)
-    record["__key"] = key
-    ranked.append(record)
-  return ranked
 
+# ---- 飞书增量同步（feishu_sync.py）：水位与 uuid -> record_id 映射 ----
 
-def _build_rank_change_items(
-  current_rows: List[Dict[str, Any]],
-  previous_rows: List[Dict[str, Any]],
-  label_fields: List[str],
-  metric_fields: List[str],
-) -> List[Dict[str, Any]]:
-  items: List[Dict[str, Any]] = []
-  prev_lookup: Dict[str, List[Dict[str, Any]]] = {}
-  for prev in previous_rows:
-    key = prev.get("__key", "")
-    prev_lookup.setdefault(key, []).append(prev)
 
-  sorted_current = sorted(current_rows, key=lambda r: r["rank"])
-  for record in sorted_current:
-    key = record.get("__key", "")
-    queue = prev_lookup.get(key)
-    prev = queue.pop(0) if queue else None
-    item: Dict[str, Any] = {
-      "key": key,
-      "current_rank": record["rank"],
-      "previous_rank": prev["rank"] if prev else None,
-      "rank_change": (prev["rank"] - record["rank"]) if prev else None,
-      "current": {field: record.get(field) for field in metric_fields},
-      "previous": {field: prev.get(field) for field in metric_fields} if prev else None,
-    }
-    for field in label_fields:
-      item[field] = record.get(field)
-    if prev:
-      for field in label_fields:
-        prev_value = prev.get(field)
-        if item.get(f"previous_{field}") is None:
-          item[f"previous_{field}"] = prev_value
-    items.append(item)
-  return items
+def get_sync_state(table_key: str, kind: str, db_path: Path = DB_PATH) -> Dict[str, Any]:
+  """High-water mark of `kind` rows in one Bitable table: {"version", "rowid", "synced_at"}.
 
+  Zeros before the first sync. Both kinds may share a table, so marks are kept per kind.
+  """
+  with get_engine(db_path).reader() as conn:
+    row = conn.execute(
+      """
+      SELECT high_water_version, high_water_rowid, synced_at
+      FROM feishu_sync_state WHERE table_key = ? AND kind = ?
+      """,
+      (table_key, kind),
+    ).fetchone()
+  if row is None:
+    return {"version": 0, "rowid": 0, "synced_at": None}
+  return {"version": row[0], "rowid": row[1], "synced_at": row[2]}
 
-def get_note_rank_changes(
+
+def reset_sync_state(table_key: str, kind: str, db_path: Path = DB_PATH) -> None:
+  """Move the high-water mark back to the start (mapped rows with unchanged content are still skipped)."""
+  with get_engine(db_path).writer() as conn:
+    conn.execute("DELETE FROM feishu_sync_state WHERE table_key = ? AND kind = ?", (table_key, kind))
+
+
+def list_changed_rows(
+  kind: str,
+  after_version: int,
+  after_rowid: int,
+  upto_version: int,
+  limit: int = 500,
   db_path: Path = DB_PATH,
-) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]:
-  init_db_if_needed(db_path)
-  with sqlite3.connect(db_path) as conn:
-    conn.row_factory = sqlite3.Row
-    dates = _latest_fetch_dates(conn, "note_rank")
-    if len(dates) < 2:
-      return (dates[0] if dates else None, None, [])
-
-    current_date, previous_date = dates[0], dates[1]
-    columns = [
-      "title",
-      "nickname",
-      "publish_time",
-      "read_count",
-      "click_rate",
-      "pay_conversion_rate",
-      "gmv",
-      "fetch_date",
-      "created_at",
+) -> List[Dict[str, Any]]:
+  """Rows written after the (row_version, rowid) mark, up to upto_version.
+
+  Ordered by (row_version, rowid). Each row also carries "rowid" and its "rank"
+  within its fetch_date (created_at, rowid order, as in the rank views).
+  """
+  table = RANK_KINDS[kind]["table"]
+  with get_engine(db_path).reader() as conn:
+    rows = [
+      dict(r)
+      for r in conn.execute(
+        f"""
+        SELECT rowid AS rowid, * FROM {table}
+        WHERE row_version >= ? AND row_version <= ?
+          AND (row_version > ? OR rowid > ?)
+        ORDER BY row_version, rowid
+        LIMIT ?
+        """,
+        (after_version, upto_version, after_version, after_rowid, limit),
+      ).fetchall()
     ]
-    current_rows = _fetch_ranked_rows(
-      conn,
-      "note_rank",
-      current_date,
-      columns,
-      lambda r: f"{r.get('title','')}__{r.get('nickname','')}",
-    )
-    previous_rows = _fetch_ranked_rows(
-      conn,
-      "note_rank",
-      previous_date,
-      columns,
-      lambda r: f"{r.get('title','')}__{r.get('nickname','')}",
+    if not rows:
+      return rows
+    dates = sorted({r["fetch_date"] for r in rows})
+    ranks = dict(
+      conn.execute(
+        f"""
+        SELECT rowid, ROW_NUMBER() OVER (PARTITION BY fetch_date ORDER BY created_at, rowid)
+        FROM {table}
+        WHERE fetch_date IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(dates, ensure_ascii=False),),
+      ).fetchall()
     )
+  for row in rows:
+    row["rank"] = ranks.get(row["rowid"])
+  return rows
 
-    items = _build_rank_change_items(
-      current_rows,
-      previous_rows,
-      ["title", "nickname"],
-      ["publish_time", "read_count", "click_rate", "pay_conversion_rate", "gmv"],
-    )
-    return current_date, previous_date, items
 
+def load_sync_records(
+  table_key: str, uuids: List[str], db_path: Path = DB_PATH
+) -> Dict[str, Tuple[str, str]]:
+  """uuid -> (record_id, content_hash) for rows already synced to the table."""
+  if not uuids:
+    return {}
+  with get_engine(db_path).reader() as conn:
+    rows = conn.execute(
+      """
+      SELECT uuid, record_id, content_hash FROM feishu_sync_record
+      WHERE table_key = ? AND uuid IN (SELECT value FROM json_each(?))
+      """,
+      (table_key, json.dumps(uuids)),
+    ).fetchall()
+  return {r[0]: (r[1], r[2]) for r in rows}
 
-def get_account_rank_changes(
+
+def feishu_record_ids(
+  table_key: str, record_hashes: List[str], db_path: Path = DB_PATH
+) -> Dict[str, str]:
+  """content_hash -> record_id of contents that upload jobs already wrote to the table."""
+  if not record_hashes:
+    return {}
+  with get_engine(db_path).reader() as conn:
+    rows = conn.execute(
+      """
+      SELECT content_hash, record_id FROM feishu_record
+      WHERE table_key = ? AND record_id IS NOT NULL
+        AND content_hash IN (SELECT value FROM json_each(?))
+      """,
+      (table_key, json.dumps(record_hashes)),
+    ).fetchall()
+  return {r[0]: r[1] for r in rows}
+
+
+def save_sync_batch(
+  table_key: str,
+  kind: str,
+  records: List[Tuple[str, str, str]],
+  high_water: Tuple[int, int],
   db_path: Path = DB_PATH,
-) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]:
-  init_db_if_needed(db_path)
-  with sqlite3.connect(db_path) as conn:
-    conn.row_factory = sqlite3.Row
-    dates = _latest_fetch_dates(conn, "account_rank")
-    if len(dates) < 2:
-      return (dates[0] if dates else None, None, [])
-
-    current_date, previous_date = dates[0], dates[1]
-    columns = [
-      "shop_name",
-      "fans_count",
-      "read_count",
-      "click_rate",
-      "pay_conversion_rate",
-      "gmv",
-      "fetch_date",
-      "created_at",
-    ]
-    current_rows = _fetch_ranked_rows(
-      conn,
-      "account_rank",
-      current_date,
-      columns,
-      lambda r: r.get("shop_name", ""),
-    )
-    previous_rows = _fetch_ranked_rows(
-      conn,
-      "account_rank",
-      previous_date,
-      columns,
-      lambda r: r.get("shop_name", ""),
+) -> None:
+  """Store one synced batch and advance the high-water mark in the same transaction.
+
+  `records` holds (uuid, record_id, content_hash). Created contents are also added
+  to feishu_record, so upload jobs carrying the same content skip them.
+  """
+  now = _now_iso()
+  with get_engine(db_path).writer() as conn:
+    if records:
+      conn.executemany(
+        """
+        INSERT INTO feishu_sync_record (table_key, uuid, record_id, content_hash, synced_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (table_key, uuid) DO UPDATE SET
+          record_id = excluded.record_id,
+          content_hash = excluded.content_hash,
+          synced_at = excluded.synced_at
+        """,
+        [(table_key, row_uuid, record_id, content_hash, now) for row_uuid, record_id, content_hash in records],
+      )
+      conn.executemany(
+        """
+        INSERT OR IGNORE INTO feishu_record (table_key, content_hash, record_id, job_id, created_at)
+        VALUES (?, ?, ?, NULL, ?)
+        """,
+        [(table_key, content_hash, record_id, now) for _uuid, record_id, content_hash in records],
+      )
+    conn.execute(
+      """
+      INSERT INTO feishu_sync_state (table_key, kind, high_water_version, high_water_rowid, synced_at)
+      VALUES (?, ?, ?, ?, ?)
+      ON CONFLICT (table_key, kind) DO UPDATE SET
+        high_water_version = excluded.high_water_version,
+        high_water_rowid = excluded.high_water_rowid,
+        synced_at = excluded.synced_at
+      """,
+      (table_key, kind, high_water[0], high_water[1], now),
     )
 
-    items = _build_rank_change_items(
-      current_rows,
-      previous_rows,
-      ["shop_name"],
-      ["fans_count", "read_count", "click_rate", "pay_conversion_rate", "gmv"],
+
+def main() -> None:
+  """简单 CLI：维护本地库的派生数据。"""
+  import argparse
+
+  parser = argparse.ArgumentParser(description="storage_sqlite 维护命令")
+  parser.add_argument("--db", default=str(DB_PATH), help="SQLite 文件路径")
+  sub = parser.add_subparsers(dest="command", required=True)
+  rebuild = sub.add_parser("rebuild-rank-change", help="按所有相邻 fetch_date 重建排名变化快照")
+  rebuild.add_argument("--type", choices=sorted(RANK_KINDS), default=None)
+  archive = sub.add_parser("archive", help="把较早月份的榜单数据移到按月分区文件")
+  archive.add_argument("--keep-months", type=int, default=3, help="主库保留最近几个月（默认 3）")
+  archive.add_argument("--dir", default=None, help=f"分区文件目录（默认主库旁的 {ARCHIVE_DIR_NAME}/）")
+  archive.add_argument("--parquet", action="store_true", help="同时写一份压缩的 Parquet 副本（需要 pyarrow）")
+  archive.add_argument("--dry-run", action="store_true", help="只列出将要归档的月份")
+  args = parser.parse_args()
+
+  if args.command == "rebuild-rank-change":
+    result = rebuild_rank_changes(Path(args.db), args.type)
+    for kind, count in result.items():
+      print(f"{kind}: 写入 {count} 条排名变化记录")
+  elif args.command == "archive":
+    result = archive_months(
+      Path(args.db),
+      keep_months=args.keep_months,
+      archive_dir=Path(args.dir) if args.dir else None,
+      parquet=args.parquet,
+      dry_run=args.dry_run,
     )
-    return current_date, previous_date, items
+    prefix = "（dry-run）" if args.dry_run else ""
+    print(f"{prefix}归档月份：{', '.join(result['archived']) or '无'}")
+    print(f"{prefix}合并补写：{', '.join(result['merged']) or '无'}")
+    if result["deferred"]:
+      print(f"{prefix}暂缓归档（有尚未同步到飞书的行）：{', '.join(result['deferred'])}")
+    for month, counts in result["rows"].items():
+      print(f"{month}: note_rank {counts['note_rank']} 行，account_rank {counts['account_rank']} 行")
+    for path in result.get("parquet", []):
+      print(f"Parquet 副本：{path}")
+
+
+if __name__ == "__main__":
+  main()
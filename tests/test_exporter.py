@@ -0,0 +1,27 @@
+import io
+
+import pytest
+
+import exporter
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _read(chunks) -> list:
+    return pq.read_table(io.BytesIO(b"".join(chunks))).to_pylist()
+
+
+def test_declared_type_survives_an_all_null_first_row_group() -> None:
+    rows = [{"a": None}] * 3 + [{"a": 5}]
+    chunks = exporter.parquet_stream(rows, ["a"], row_group_size=2, types={"a": "INTEGER"})
+    assert _read(chunks) == rows
+
+
+def test_undeclared_text_column_takes_later_values_as_text() -> None:
+    rows = [{"a": None}] * 3 + [{"a": 5}]
+    assert _read(exporter.parquet_stream(rows, ["a"], row_group_size=2))[-1] == {"a": "5"}
+
+
+def test_sample_types_scans_every_row() -> None:
+    rows = [{"a": None, "b": 1}, {"a": 2, "b": 1.5}]
+    assert exporter.sample_types(rows) == {"a": "INTEGER", "b": "REAL"}
@@ -0,0 +1,11 @@
+import intervals
+
+
+def test_open_lower_interval_lands_below_its_upper_bound() -> None:
+    assert intervals.parse_band("click_rate", "5%以下")[0] == intervals.parse_band("click_rate", "0-5%")[0]
+    assert intervals.parse_band("click_rate", "5%以下")[0] < intervals.parse_band("click_rate", "5%-15%")[0]
+    assert intervals.parse_band("gmv", "￥1000以下")[0] == intervals.parse_band("gmv", "￥0-1000")[0]
+
+
+def test_open_upper_interval_starts_at_its_lower_bound() -> None:
+    assert intervals.parse_band("gmv", "1000以上")[0] == intervals.parse_band("gmv", "￥1000-5000")[0]
@@ -0,0 +1,38 @@
+from flask import Flask, jsonify, request
+
+from response_cache import ResponseCache, cache_key, cached_json
+
+
+def _app() -> Flask:
+    app = Flask(__name__)
+    cache = ResponseCache()
+
+    @app.route("/rows")
+    @cached_json(cache, lambda: (1, ""))
+    def rows():
+        # 与 /api/note_rank 一致：带 cursor 参数（首页为空串）时走游标分页
+        if "cursor" in request.args:
+            return jsonify({"mode": "cursor", "next_cursor": "abc"})
+        return jsonify({"mode": "offset"})
+
+    return app
+
+
+def test_empty_cursor_is_not_the_offset_entry() -> None:
+    client = _app().test_client()
+    assert client.get("/rows?page_size=5").get_json() == {"mode": "offset"}
+    assert client.get("/rows?page_size=5&cursor=").get_json()["mode"] == "cursor"
+
+
+def test_offset_request_after_cursor_request() -> None:
+    client = _app().test_client()
+    assert client.get("/rows?page_size=3&cursor=").get_json()["mode"] == "cursor"
+    assert client.get("/rows?page_size=3").get_json() == {"mode": "offset"}
+
+
+def test_other_empty_params_still_share_an_entry() -> None:
+    app = _app()
+    with app.test_request_context("/rows?page_size=5&q="):
+        with_empty = cache_key("/rows", request.args, 1)
+    with app.test_request_context("/rows?page_size=5"):
+        assert cache_key("/rows", request.args, 1) == with_empty
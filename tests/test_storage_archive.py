@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pytest
+
+import storage_sqlite
+
+
+def _row(fetch_date: str, title: str, read_count: str = "1万-5万") -> dict:
+    return {
+        "title": title,
+        "nickname": "作者",
+        "publishTime": "2025-01-01",
+        "readCount": read_count,
+        "clickRate": "5%-15%",
+        "payConversionRate": "0-5%",
+        "gmv": "￥1000-5000",
+        "fetchDate": fetch_date,
+    }
+
+
+def _titles(db: Path, fetch_date: str) -> list:
+    items, total = storage_sqlite.list_note_rows(
+        db, fetch_date_from=fetch_date, fetch_date_to=fetch_date, page_size=100
+    )
+    assert total == len(items)
+    return sorted(item["title"] for item in items)
+
+
+@pytest.fixture
+def db(tmp_path: Path):
+    path = tmp_path / "rank.db"
+    storage_sqlite.init_db_if_needed(path)
+    for fetch_date in ("2025-01-10", "2025-02-10", "2025-03-10"):
+        storage_sqlite.insert_note_rows([_row(fetch_date, "甲"), _row(fetch_date, "乙")], path)
+    yield path
+    storage_sqlite.close_engines()
+
+
+def test_rewriting_archived_rows_does_not_duplicate_them(db: Path) -> None:
+    assert storage_sqlite.archive_months(db, keep_months=1)["archived"] == ["2025-01", "2025-02"]
+    result = storage_sqlite.insert_note_rows([_row("2025-01-10", "甲"), _row("2025-01-10", "乙")], db)
+    assert result == {"inserted": 0, "updated": 0, "unchanged": 2}
+    assert _titles(db, "2025-01-10") == ["乙", "甲"]
+
+
+def test_updated_archived_row_replaces_its_partition_copy(db: Path) -> None:
+    storage_sqlite.archive_months(db, keep_months=1)
+    (before,), _ = storage_sqlite.list_note_rows(db, q="甲", fetch_date_from="2025-01-10", fetch_date_to="2025-01-10")
+    result = storage_sqlite.insert_note_rows([_row("2025-01-10", "甲", "10万+")], db)
+    assert result == {"inserted": 0, "updated": 1, "unchanged": 0}
+    assert _titles(db, "2025-01-10") == ["乙", "甲"]
+
+    assert storage_sqlite.archive_months(db, keep_months=1)["merged"] == ["2025-01"]
+    (after,), total = storage_sqlite.list_note_rows(db, q="甲", fetch_date_from="2025-01-10", fetch_date_to="2025-01-10")
+    assert total == 1
+    assert (after["uuid"], after["created_at"]) == (before["uuid"], before["created_at"])
+    assert after["read_count"] == "10万+"
+
+
+def test_months_with_rows_not_yet_synced_stay_in_the_main_database(db: Path) -> None:
+    synced = storage_sqlite.get_data_version(db)[0]
+    storage_sqlite.save_sync_batch("tbl", "note", [], (synced, 1 << 62), db)
+    storage_sqlite.insert_note_rows([_row("2025-02-10", "丙")], db)
+
+    result = storage_sqlite.archive_months(db, keep_months=1)
+    assert (result["archived"], result["deferred"]) == (["2025-01"], ["2025-02"])
+    changed = storage_sqlite.list_changed_rows("note", synced, 1 << 62, synced + 10, db_path=db)
+    assert [row["title"] for row in changed] == ["丙"]
+
+    storage_sqlite.save_sync_batch("tbl", "note", [], (storage_sqlite.get_data_version(db)[0], 1 << 62), db)
+    assert storage_sqlite.archive_months(db, keep_months=1)["archived"] == ["2025-02"]
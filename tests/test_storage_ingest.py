@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import pytest
+
+import storage_sqlite
+
+
+def _note(fetch_date: str, title: str, gmv: str = "￥1000-5000") -> dict:
+    return {"title": title, "nickname": "作者", "readCount": "1万-5万", "gmv": gmv, "fetchDate": fetch_date}
+
+
+def _ranks(db: Path) -> list:
+    _, _, changes = storage_sqlite.get_note_rank_changes(db, "2025-03-10")
+    return [(c["key"], c["current_rank"], c["previous_rank"], c["rank_change"]) for c in changes]
+
+
+def _identities(db: Path) -> dict:
+    items, _ = storage_sqlite.list_note_rows(db, fetch_date_from="2025-03-10", fetch_date_to="2025-03-10")
+    return {item["title"]: (item["uuid"], item["created_at"]) for item in items}
+
+
+@pytest.fixture
+def db(tmp_path: Path):
+    path = tmp_path / "rank.db"
+    storage_sqlite.init_db_if_needed(path)
+    storage_sqlite.insert_note_rows([_note("2025-03-09", "甲"), _note("2025-03-09", "乙")], path)
+    yield path
+    storage_sqlite.close_engines()
+
+
+def test_same_day_sent_twice_is_counted_once(db: Path) -> None:
+    day = [_note("2025-03-10", "乙"), _note("2025-03-10", "甲")]
+    assert storage_sqlite.insert_note_rows(day, db) == {"inserted": 2, "updated": 0, "unchanged": 0}
+    ranks, identities = _ranks(db), _identities(db)
+
+    assert storage_sqlite.insert_note_rows(day, db) == {"inserted": 0, "updated": 0, "unchanged": 2}
+    assert _identities(db) == identities
+    assert _ranks(db) == ranks
+    assert storage_sqlite.list_note_rows(db)[1] == 4
+
+
+def test_changed_metric_updates_in_place(db: Path) -> None:
+    storage_sqlite.insert_note_rows([_note("2025-03-10", "乙"), _note("2025-03-10", "甲")], db)
+    ranks, identities = _ranks(db), _identities(db)
+
+    result = storage_sqlite.insert_note_rows(
+        [_note("2025-03-10", "乙", "￥5000-1万"), _note("2025-03-10", "甲")], db
+    )
+    assert result == {"inserted": 0, "updated": 1, "unchanged": 1}
+    assert _identities(db) == identities
+    assert _ranks(db) == ranks
+    items, total = storage_sqlite.list_note_rows(db, q="乙", fetch_date_from="2025-03-10")
+    assert (total, items[0]["gmv"]) == (1, "￥5000-1万")
+
+
+def test_account_rows_share_the_upsert_contract(db: Path) -> None:
+    row = {"shopName": "店铺", "fetchDate": "2025-03-10"}
+    assert storage_sqlite.insert_account_rows([row], db) == {"inserted": 1, "updated": 0, "unchanged": 0}
+    assert storage_sqlite.insert_account_rows([row], db) == {"inserted": 0, "updated": 0, "unchanged": 1}
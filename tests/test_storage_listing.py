@@ -0,0 +1,50 @@
+from pathlib import Path
+
+import pytest
+
+import storage_sqlite
+
+TITLES = [f"t{i}" for i in range(8)]
+
+
+@pytest.fixture
+def db(tmp_path: Path):
+    path = tmp_path / "rank.db"
+    storage_sqlite.init_db_if_needed(path)
+    storage_sqlite.insert_note_rows(
+        [
+            {
+                "title": title,
+                "nickname": "作者",
+                "readCount": "1万-5万",
+                "gmv": "￥1000-5000",
+                "fetchDate": "2025-03-10",
+            }
+            for title in TITLES
+        ],
+        path,
+    )
+    yield path
+    storage_sqlite.close_engines()
+
+
+def test_offset_pages_of_one_capture_keep_capture_order(db: Path) -> None:
+    titles, ranks = [], []
+    for page in (1, 2, 3):
+        items, total = storage_sqlite.list_note_rows(db, page=page, page_size=3)
+        assert total == len(TITLES)
+        titles += [item["title"] for item in items]
+        ranks += [item["rank"] for item in items]
+    assert titles == TITLES
+    assert ranks == list(range(1, len(TITLES) + 1))
+
+
+def test_cursor_pages_of_one_capture_keep_capture_order(db: Path) -> None:
+    items, cursor, _ = storage_sqlite.list_note_rows_by_cursor(db, page_size=3)
+    titles = [item["title"] for item in items]
+    while cursor:
+        items, cursor, _ = storage_sqlite.list_note_rows_by_cursor(db, cursor=cursor, page_size=3)
+        titles += [item["title"] for item in items]
+    assert titles == TITLES
+    assert "rowid" not in items[0]
+
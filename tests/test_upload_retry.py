@@ -0,0 +1,53 @@
+import importlib
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+import storage_sqlite
+import upload_queue
+from benchmarks.fake_feishu_server import FakeFeishuServer
+
+
+@pytest.fixture
+def uploader(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # upload_to_feishu 导入时读取 config_local；没有时与 benchmarks/suite.py 一样放一份临时配置
+    if importlib.util.find_spec("config_local") is None:
+        (tmp_path / "config_local.py").write_text("APP_ID = 'test'\nAPP_SECRET = 'test'\n", encoding="utf-8")
+        monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("upload_to_feishu")
+    with FakeFeishuServer() as server:
+        monkeypatch.setattr(module, "FEISHU_API_BASE", server.base_url)
+        monkeypatch.setattr(module, "BITABLE_NOTE_APP_TOKEN", "app")
+        monkeypatch.setattr(module, "BITABLE_NOTE_TABLE_ID", "tbl")
+        monkeypatch.setattr(module, "BATCH_SIZE", 2)
+        # 单并发时批次按顺序发送，第 N 个写请求就是第 N 批
+        monkeypatch.setattr(module, "UPLOAD_CONCURRENCY", 1)
+        yield module, server
+    storage_sqlite.close_engines()
+
+
+def test_retry_resends_only_unconfirmed_batches(uploader, tmp_path: Path) -> None:
+    module, server = uploader
+    db = tmp_path / "rank.db"
+    storage_sqlite.init_db_if_needed(db)
+    pool = upload_queue.UploadWorkerPool(db, {"note": module.upload_note_rows}, base_backoff=0)
+    rows = [{"笔记标题": f"标题{i}", "账号昵称": "作者", "获取时间": "2025-03-10"} for i in range(7)]
+    job_id = storage_sqlite.enqueue_upload_job("note", rows, db)
+
+    server.state.fail_request(3)
+    pool._process(storage_sqlite.claim_upload_job(db))
+    job = storage_sqlite.get_upload_job(job_id, db)
+    assert (job["status"], job["batches_total"]) == ("pending", 4)
+    # 第 3 批失败；已在途的第 4 批可能照常完成，其余批次不再发送
+    first_attempt = server.state.write_requests
+    assert job["batches_done"] == first_attempt - 1 >= 2
+
+    pool._process(storage_sqlite.claim_upload_job(db))
+    job = storage_sqlite.get_upload_job(job_id, db)
+    assert (job["status"], job["uploaded"], job["batches_done"]) == ("done", 7, 4)
+    # 重试只补发未确认的批次
+    assert server.state.write_requests - first_attempt == 4 - (first_attempt - 1)
+    created = server.state.tables[("app", "tbl")].values()
+    assert sorted(fields["笔记标题"] for fields in created) == sorted(row["笔记标题"] for row in rows)
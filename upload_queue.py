@@ -0,0 +1,280 @@
+"""飞书上传任务的后台执行器。
+
+HTTP 接口只负责把行数据写入 SQLite 的 upload_job 表并立即返回 job_id，
+这里的工作线程从表中领取任务、调用 upload_to_feishu 的上传函数，并把进度、
+重试与失败原因写回表中（进程重启后未完成的任务会被重新领取）。
+
+每批写入结果通过 UploadCheckpoint 记录在 upload_batch / feishu_record 表，
+重试时只补发未确认的批次。
+
+AsyncUploadWorkerPool 是 ASGI 服务使用的 asyncio 版本：上传在事件循环里以协程运行，
+SQLite 读写交给专用执行器。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import traceback
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import storage_sqlite
+
+# kind -> 上传函数：upload(rows, on_progress, checkpoint) -> 写入条数
+UploadHandler = Callable[..., int]
+# kind -> 协程上传函数：await upload(rows, on_progress, checkpoint, offload) -> 写入条数
+AsyncUploadHandler = Callable[..., Awaitable[int]]
+
+
+def retry_delay(attempts: int, base_backoff: float, max_backoff: float) -> float:
+    """失败任务下次重试前的等待秒数（指数退避，不超过 max_backoff）。"""
+    return min(max_backoff, base_backoff * (2 ** max(0, attempts - 1)))
+
+
+class UploadCheckpoint:
+    """把一个上传任务与 SQLite 中它的批次检查点（upload_batch）绑定在一起。"""
+
+    def __init__(self, db_path: Path, job_id: str) -> None:
+        self.db_path = db_path
+        self.job_id = job_id
+
+    def load(self, table_key: str) -> List[Dict[str, Any]]:
+        return storage_sqlite.load_upload_batches(self.job_id, table_key, self.db_path)
+
+    def save(self, table_key: str, batches: List[Dict[str, Any]]) -> None:
+        storage_sqlite.save_upload_batches(self.job_id, table_key, batches, self.db_path)
+
+    def known(self, table_key: str, hashes: List[str]) -> Set[str]:
+        return storage_sqlite.known_feishu_records(table_key, hashes, self.db_path)
+
+    def done(
+        self,
+        table_key: str,
+        batch_index: int,
+        hashes: List[str],
+        record_ids: List[Optional[str]],
+    ) -> None:
+        storage_sqlite.complete_upload_batch(
+            self.job_id, table_key, batch_index, hashes, record_ids, self.db_path
+        )
+
+
+class UploadWorkerPool:
+    """后台线程池：不断从 storage_sqlite 的 upload_job 表领取并执行上传任务。"""
+
+    def __init__(
+        self,
+        db_path: Path,
+        handlers: Dict[str, UploadHandler],
+        workers: int = 2,
+        poll_interval: float = 2.0,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+    ) -> None:
+        self.db_path = db_path
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def start(self) -> None:
+        """每个进程启动一次工作线程，重复调用不做任何事。
+
+        fork 后线程不会保留，多进程部署时每个工作进程各自启动；任务在 SQLite 中原子领取，
+        多个进程可以同时消费同一个队列。
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._wakeup = threading.Event()
+            self._threads = []
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for idx in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"upload-worker-{idx}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self) -> None:
+        """立即唤醒空闲的工作线程（提交任务后调用）。"""
+        self.start()
+        self._wakeup.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads.clear()
+
+    def submit(self, kind: str, rows: List[Dict[str, str]]) -> str:
+        """把 kind 类型的任务写入队列并唤醒工作线程，返回 job_id。"""
+        if kind not in self.handlers:
+            raise ValueError(f"未知的上传类型: {kind}")
+        job_id = storage_sqlite.enqueue_upload_job(kind, rows, self.db_path)
+        self.notify()
+        return job_id
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = storage_sqlite.claim_upload_job(self.db_path)
+            except Exception:  # pragma: no cover - 数据库暂时不可用时稍后重试
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job: Dict) -> None:
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            storage_sqlite.fail_upload_job(job_id, f"未知的上传类型: {job['kind']}", 0, self.db_path)
+            return
+
+        def on_progress(uploaded: int) -> None:
+            storage_sqlite.update_upload_job_progress(job_id, uploaded, self.db_path)
+
+        try:
+            uploaded = handler(
+                job["rows"],
+                on_progress=on_progress,
+                checkpoint=UploadCheckpoint(self.db_path, job_id),
+            )
+        except (Exception, SystemExit) as exc:  # upload_to_feishu 配置错误时抛 SystemExit
+            delay = retry_delay(job["attempts"], self.base_backoff, self.max_backoff)
+            status = storage_sqlite.fail_upload_job(
+                job_id, f"{type(exc).__name__}: {exc}", delay, self.db_path
+            )
+            print(f"上传任务 {job_id} 第 {job['attempts']} 次执行失败（{status}）：{exc}")
+            return
+        storage_sqlite.complete_upload_job(job_id, uploaded, self.db_path)
+
+
+class AsyncUploadWorkerPool:
+    """在 ASGI 服务的事件循环中以 asyncio 任务消费 upload_job 表。
+
+    飞书请求以协程执行，上传中的任务不占线程；所有 SQLite 调用都交给 executor。
+    submit() / notify() 可以在任意线程调用（如在执行器中运行的请求处理函数）。
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        handlers: Dict[str, AsyncUploadHandler],
+        executor: Executor,
+        workers: int = 2,
+        poll_interval: float = 2.0,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+    ) -> None:
+        self.db_path = db_path
+        self.handlers = handlers
+        self.executor = executor
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+
+    async def offload(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """在执行器中运行阻塞的（SQLite）调用。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: fn(*args))
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            self._loop.create_task(self._run(), name=f"upload-worker-{idx}")
+            for idx in range(self.workers)
+        ]
+
+    def notify(self) -> None:
+        """立即唤醒空闲的工作协程（线程安全）。"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, kind: str, rows: List[Dict[str, str]]) -> str:
+        """把 kind 类型的任务写入队列并唤醒工作协程，返回 job_id（阻塞调用）。"""
+        if kind not in self.handlers:
+            raise ValueError(f"未知的上传类型: {kind}")
+        job_id = storage_sqlite.enqueue_upload_job(kind, rows, self.db_path)
+        self.notify()
+        return job_id
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                job = await self.offload(storage_sqlite.claim_upload_job, self.db_path)
+            except Exception:  # pragma: no cover - 数据库暂时不可用时稍后重试
+                traceback.print_exc()
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._process(job)
+
+    async def _process(self, job: Dict) -> None:
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await self.offload(
+                storage_sqlite.fail_upload_job, job_id, f"未知的上传类型: {job['kind']}", 0, self.db_path
+            )
+            return
+
+        def on_progress(uploaded: int) -> None:
+            # 由 upload_to_bitable_async 经 offload 调用，已在执行器线程中
+            storage_sqlite.update_upload_job_progress(job_id, uploaded, self.db_path)
+
+        try:
+            uploaded = await handler(
+                job["rows"],
+                on_progress=on_progress,
+                checkpoint=UploadCheckpoint(self.db_path, job_id),
+                offload=self.offload,
+            )
+        except (Exception, SystemExit) as exc:
+            delay = retry_delay(job["attempts"], self.base_backoff, self.max_backoff)
+            status = await self.offload(
+                storage_sqlite.fail_upload_job, job_id, f"{type(exc).__name__}: {exc}", delay, self.db_path
+            )
+            print(f"上传任务 {job_id} 第 {job['attempts']} 次执行失败（{status}）：{exc}")
+            return
+        await self.offload(storage_sqlite.complete_upload_job, job_id, uploaded, self.db_path)
@@ -1,9 +1,20 @@
+import asyncio
 import csv
-import time
+import hashlib
+import json
+import threading
+import uuid
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
-
-import requests
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from feishu_client import (
+    FEISHU_BASE_URL,
+    MAX_BATCH_SIZE,
+    AsyncFeishuClient,
+    FeishuClient,
+    RateLimiter,
+)
+import intervals
 
 try:
     # 本地私密配置（不会进 Git）：请在同目录创建 config_local.py 填写以下变量：
@@ -21,6 +32,9 @@ except ImportError as exc:  # pragma: no cover - 仅运行时检查
 APP_ID: str = getattr(_cfg, "APP_ID", "")
 APP_SECRET: str = getattr(_cfg, "APP_SECRET", "")
 
+# 开放平台地址（一般不用改；本地压测时可指向 benchmarks/fake_feishu_server.py）
+FEISHU_API_BASE: str = getattr(_cfg, "FEISHU_BASE_URL", FEISHU_BASE_URL)
+
 # 内容榜多维表（优先使用新命名；若不存在则回退到旧的 BITABLE_APP_TOKEN / BITABLE_TABLE_ID）
 BITABLE_NOTE_APP_TOKEN: str = getattr(
     _cfg, "BITABLE_NOTE_APP_TOKEN", getattr(_cfg, "BITABLE_APP_TOKEN", "")
@@ -75,31 +89,53 @@ FIELD_MAPPING_ACCOUNT: Dict[str, str] = getattr(
 # 要上传的 CSV 文件路径（仅 CLI 调试使用，可按需修改）
 CSV_PATH = "xhs_note_rank_20251118.csv"
 
-# 每次批量写入的记录数上限（飞书目前上限是 500，这里保守一点）
-BATCH_SIZE = 100
+# 每次批量写入的记录数（飞书 batch_create 上限 500）
+BATCH_SIZE: int = max(1, min(MAX_BATCH_SIZE, int(getattr(_cfg, "FEISHU_BATCH_SIZE", MAX_BATCH_SIZE))))
+
+# 同时在途的 batch_create 请求数，以及令牌桶初始速率（次/秒）；
+# 被限流时速率自动减半并按 Retry-After 暂停，之后逐步回升到该值
+UPLOAD_CONCURRENCY: int = max(1, int(getattr(_cfg, "FEISHU_UPLOAD_CONCURRENCY", 4)))
+RATE_LIMIT_PER_SECOND: float = float(getattr(_cfg, "FEISHU_RATE_LIMIT", 10.0))
+
+
+# offload(fn, *args)：在线程 / 执行器中运行阻塞函数并返回可 await 的结果
+Offload = Callable[..., Awaitable[Any]]
+
+_clients: Dict[tuple, FeishuClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(
+    app_id: Optional[str] = None, app_secret: Optional[str] = None
+) -> FeishuClient:
+    """按 app_id/app_secret 复用进程内的 FeishuClient（缓存 token + 连接池）。"""
+    key = (app_id or APP_ID, app_secret or APP_SECRET, FEISHU_API_BASE)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = FeishuClient(
+                    key[0],
+                    key[1],
+                    base_url=FEISHU_API_BASE,
+                    pool_maxsize=max(8, UPLOAD_CONCURRENCY),
+                    rate_limiter=RateLimiter(
+                        RATE_LIMIT_PER_SECOND, burst=UPLOAD_CONCURRENCY
+                    ),
+                )
+                _clients[key] = client
+    return client
 
 
 def get_tenant_access_token(
     app_id: Optional[str] = None, app_secret: Optional[str] = None
 ) -> str:
-    """获取 tenant_access_token，可传入 app_id/app_secret 覆盖全局配置。"""
-    app_id = app_id or APP_ID
-    app_secret = app_secret or APP_SECRET
-
-    if not app_id or not app_secret:
-        raise SystemExit("APP_ID / APP_SECRET 未配置，请在 config_local.py 中填写。")
-
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-    resp = requests.post(
-        url,
-        json={"app_id": app_id, "app_secret": app_secret},
-        timeout=10,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    if data.get("code") != 0:
-        raise RuntimeError(f"get tenant_access_token failed: {data}")
-    return data["tenant_access_token"]
+    """获取 tenant_access_token，可传入 app_id/app_secret 覆盖全局配置。
+
+    token 在过期前会被缓存复用，不再每次上传都重新申请。
+    """
+    return get_client(app_id, app_secret).get_tenant_access_token()
 
 
 def read_csv_rows(csv_path: str) -> List[Dict[str, str]]:
@@ -132,14 +168,13 @@ def to_bitable_records(
             value = (raw_value or "").strip()
 
             if bitable_field in numeric_fields:
-                try:
-                    if value == "":
-                        fields[bitable_field] = None
-                    else:
-                        fields[bitable_field] = float(value.replace(",", ""))
-                except Exception:
-                    # 如果数字解析失败，就按文本写入，避免整条记录报错
-                    fields[bitable_field] = value
+                if value == "":
+                    fields[bitable_field] = None
+                else:
+                    # 与入库共用的解析（带缓存，支持千分位与万/千单位）；
+                    # 解析失败就按文本写入，避免整条记录报错
+                    number = intervals.parse_number(value)
+                    fields[bitable_field] = number if number is not None else value
             else:
                 fields[bitable_field] = value
 
@@ -157,84 +192,268 @@ def _clean_token(raw: str) -> str:
     return raw.split("&", 1)[0].split("?", 1)[0]
 
 
-def upload_to_bitable(
-    token: str, app_token: str, table_id: str, records: List[Dict]
-) -> int:
-    """通用上传封装：给定 token / app_token / table_id 与记录列表，批量写入多维表。"""
+def bitable_table_key(app_token: str, table_id: str) -> Tuple[str, str, str]:
+    """清理配置中的 app_token / table_id，返回 (app_token, table_id, table_key)；未配置时退出。"""
     app_token_clean = _clean_token(app_token)
     table_id_clean = _clean_token(table_id)
-
     if not app_token_clean or not table_id_clean:
         raise SystemExit("多维表 app_token / table_id 未配置，请检查 config_local.py。")
+    return app_token_clean, table_id_clean, f"{app_token_clean}/{table_id_clean}"
+
+
+def record_hash(record: Dict[str, Any]) -> str:
+    """记录内容哈希（字段排序后的 JSON），用于识别已写入飞书的记录。"""
+    fields = record.get("fields", record)
+    raw = json.dumps(fields, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def batch_client_token(seed: str, hashes: List[str]) -> str:
+    """由任务标识与批内记录哈希确定的 uuid4 格式 client_token，重发同一批时保持不变。"""
+    digest = hashlib.sha256("\n".join([seed, *hashes]).encode("utf-8")).digest()
+    return str(uuid.UUID(bytes=digest[:16], version=4))
+
+
+def _plan_upload(
+    app_token: str, table_id: str, records: List[Dict], checkpoint: Optional[Any]
+) -> Tuple[str, str, str, Dict[str, Dict], List[Dict[str, Any]], int]:
+    """校验多维表配置并生成（或从检查点读回）批次计划。
+
+    返回 (app_token, table_id, table_key, 哈希 -> 记录, 待发送批次, 已确认条数)。
+    """
+    app_token_clean, table_id_clean, table_key = bitable_table_key(app_token, table_id)
+    by_hash: Dict[str, Dict] = {}
+    for record in records:
+        by_hash.setdefault(record_hash(record), record)
+
+    plan = checkpoint.load(table_key) if checkpoint is not None else []
+    if not plan:
+        known = checkpoint.known(table_key, list(by_hash)) if checkpoint is not None else set()
+        fresh = [h for h in by_hash if h not in known]
+        seed = checkpoint.job_id if checkpoint is not None else table_key
+        plan = [
+            {
+                "batch_index": idx,
+                "client_token": batch_client_token(seed, hashes),
+                "record_hashes": hashes,
+                "status": "pending",
+            }
+            for idx, hashes in enumerate(batch(fresh, BATCH_SIZE))
+        ]
+        if checkpoint is not None:
+            checkpoint.save(table_key, plan)
+
+    pending = [b for b in plan if b["status"] != "done"]
+    confirmed = sum(len(b["record_hashes"]) for b in plan if b["status"] == "done")
+    skipped = len(records) - sum(len(b["record_hashes"]) for b in plan)
+    if skipped:
+        print(f"  跳过 {skipped} 条已写入 / 重复的记录")
+    if confirmed:
+        print(f"  从检查点继续：{confirmed} 条已确认，剩余 {len(pending)} 批")
+    return app_token_clean, table_id_clean, table_key, by_hash, pending, confirmed
+
+
+def _confirm_batch(
+    checkpoint: Optional[Any],
+    table_key: str,
+    item: Dict[str, Any],
+    created: List[Dict],
+    confirmed: int,
+    on_progress: Optional[Callable[[int], None]],
+) -> None:
+    """记录一批写入结果（检查点 + 进度回调）；confirmed 为计入本批后的累计确认条数。"""
+    if checkpoint is not None:
+        checkpoint.done(
+            table_key,
+            item["batch_index"],
+            item["record_hashes"],
+            [c.get("record_id") for c in created],
+        )
+    print(f"  已写入 {confirmed} 条（第 {item['batch_index'] + 1} 批 {len(created)} 条）")
+    if on_progress is not None:
+        on_progress(confirmed)
+
+
+def upload_to_bitable(
+    token: Optional[str],
+    app_token: str,
+    table_id: str,
+    records: List[Dict],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+) -> int:
+    """通用上传封装：给定 token / app_token / table_id 与记录列表，批量写入多维表。
+
+    token 传 None 时使用客户端缓存的 tenant_access_token（失效时自动刷新）。
+
+    记录按 BATCH_SIZE 拆批，最多 UPLOAD_CONCURRENCY 批并发写入，请求速率由客户端的
+    令牌桶控制（遇到限流自动降速重试），不再在批次间固定 sleep。
 
-    url = (
-        "https://open.feishu.cn/open-apis/bitable/v1/apps/"
-        f"{app_token_clean}/tables/{table_id_clean}/records/batch_create"
+    每批带确定性的 client_token（飞书侧幂等）。传入 checkpoint（见
+    upload_queue.UploadCheckpoint）时，批次划分在首次执行时持久化，每批确认后落库；
+    重试只发送未确认的批次，已记录在该多维表中的相同内容直接跳过。
+
+    on_progress 在每批写入成功后以累计确认条数回调（上传任务队列用来记录进度）。
+    返回本任务累计确认写入的条数（含此前尝试中已确认的批次）。
+    """
+    app_token_clean, table_id_clean, table_key, by_hash, pending, confirmed = _plan_upload(
+        app_token, table_id, records, checkpoint
     )
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
 
-    created_total = 0
-    for chunk in batch(records, BATCH_SIZE):
-        resp = requests.post(url, headers=headers, json={"records": chunk}, timeout=15)
-        if resp.status_code >= 400:
-            print("HTTP error:", resp.status_code, resp.text)
-            resp.raise_for_status()
+    def on_batch(index: int, created: List[Dict]) -> None:
+        nonlocal confirmed
+        confirmed += len(pending[index]["record_hashes"])
+        _confirm_batch(checkpoint, table_key, pending[index], created, confirmed, on_progress)
+
+    get_client().create_batches(
+        app_token_clean,
+        table_id_clean,
+        [(b["client_token"], [by_hash[h] for h in b["record_hashes"]]) for b in pending],
+        max_workers=UPLOAD_CONCURRENCY,
+        token=token,
+        on_batch=on_batch,
+    )
 
-        data = resp.json()
-        if data.get("code") != 0:
-            raise RuntimeError(f"batch_create failed: {data}")
+    print(f"写入完成，共写入 {confirmed} 条记录。")
+    return confirmed
 
-        created = len(data.get("data", {}).get("records", []))
-        created_total += created
-        print(f"  已写入 {created_total} 条（本批 {created} 条）")
-        time.sleep(0.3)
 
-    print(f"写入完成，共写入 {created_total} 条记录。")
-    return created_total
+async def upload_to_bitable_async(
+    client: AsyncFeishuClient,
+    app_token: str,
+    table_id: str,
+    records: List[Dict],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+    offload: Optional[Offload] = None,
+) -> int:
+    """upload_to_bitable 的 asyncio 版本：飞书请求走 AsyncFeishuClient，不占线程。
+
+    检查点读写与 on_progress 都会访问 SQLite，经 offload(fn, *args) 放到专用执行器运行
+    （默认 asyncio.to_thread）。批次计划、幂等 client_token 与返回值同同步版本。
+    """
+    run = offload or asyncio.to_thread
+    app_token_clean, table_id_clean, table_key, by_hash, pending, confirmed = await run(
+        _plan_upload, app_token, table_id, records, checkpoint
+    )
 
+    async def on_batch(index: int, created: List[Dict]) -> None:
+        nonlocal confirmed
+        # 累计数在事件循环里更新（并发批次互不覆盖），只有写库放到执行器
+        confirmed += len(pending[index]["record_hashes"])
+        await run(_confirm_batch, checkpoint, table_key, pending[index], created, confirmed, on_progress)
+
+    await client.create_batches(
+        app_token_clean,
+        table_id_clean,
+        [(b["client_token"], [by_hash[h] for h in b["record_hashes"]]) for b in pending],
+        max_workers=UPLOAD_CONCURRENCY,
+        on_batch=on_batch,
+    )
 
-# ---- 高层封装：内容榜 / 账号榜上传 ----
+    print(f"写入完成，共写入 {confirmed} 条记录。")
+    return confirmed
 
 
-def upload_note_rows(rows: List[Dict[str, str]]) -> int:
-    """将热卖榜-优秀内容行数据写入内容榜多维表。"""
-    if not rows:
-        print("内容榜：没有可上传的记录。")
-        return 0
+def new_async_client() -> AsyncFeishuClient:
+    """按全局配置创建 AsyncFeishuClient（httpx 连接绑定事件循环，由调用方负责 aclose）。"""
+    return AsyncFeishuClient(
+        APP_ID,
+        APP_SECRET,
+        base_url=FEISHU_API_BASE,
+        pool_maxsize=max(8, UPLOAD_CONCURRENCY),
+        rate_limiter=RateLimiter(RATE_LIMIT_PER_SECOND, burst=UPLOAD_CONCURRENCY),
+    )
 
-    print(f"内容榜：准备上传 {len(rows)} 行记录。")
+
+# ---- 高层封装：内容榜 / 账号榜上传 ----
+
+
+def _ranked_records(rows: List[Dict[str, str]], field_mapping: Dict[str, str]) -> List[Dict]:
     # 为每条记录生成“排名”（从 1 开始），写入临时字段 __rank
     enriched_rows: List[Dict[str, str]] = []
     for idx, row in enumerate(rows, start=1):
         new_row = dict(row)
         new_row["__rank"] = str(idx)
         enriched_rows.append(new_row)
+    return to_bitable_records(enriched_rows, field_mapping)
+
 
-    token = get_tenant_access_token()
-    records = to_bitable_records(enriched_rows, FIELD_MAPPING_NOTE)
-    return upload_to_bitable(token, BITABLE_NOTE_APP_TOKEN, BITABLE_NOTE_TABLE_ID, records)
+def upload_note_rows(
+    rows: List[Dict[str, str]],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+) -> int:
+    """将热卖榜-优秀内容行数据写入内容榜多维表。"""
+    if not rows:
+        print("内容榜：没有可上传的记录。")
+        return 0
+
+    print(f"内容榜：准备上传 {len(rows)} 行记录。")
+    records = _ranked_records(rows, FIELD_MAPPING_NOTE)
+    return upload_to_bitable(
+        None, BITABLE_NOTE_APP_TOKEN, BITABLE_NOTE_TABLE_ID, records, on_progress, checkpoint
+    )
 
 
-def upload_account_rows(rows: List[Dict[str, str]]) -> int:
+def upload_account_rows(
+    rows: List[Dict[str, str]],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+) -> int:
     """将成交榜-优秀账号行数据写入账号榜多维表。"""
     if not rows:
         print("账号榜：没有可上传的记录。")
         return 0
 
     print(f"账号榜：准备上传 {len(rows)} 行记录。")
-    enriched_rows: List[Dict[str, str]] = []
-    for idx, row in enumerate(rows, start=1):
-        new_row = dict(row)
-        new_row["__rank"] = str(idx)
-        enriched_rows.append(new_row)
-
-    token = get_tenant_access_token()
-    records = to_bitable_records(enriched_rows, FIELD_MAPPING_ACCOUNT)
+    records = _ranked_records(rows, FIELD_MAPPING_ACCOUNT)
     return upload_to_bitable(
-        token, BITABLE_ACCOUNT_APP_TOKEN, BITABLE_ACCOUNT_TABLE_ID, records
+        None, BITABLE_ACCOUNT_APP_TOKEN, BITABLE_ACCOUNT_TABLE_ID, records, on_progress, checkpoint
+    )
+
+
+async def upload_note_rows_async(
+    client: AsyncFeishuClient,
+    rows: List[Dict[str, str]],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+    offload: Optional[Offload] = None,
+) -> int:
+    """upload_note_rows 的 asyncio 版本。"""
+    if not rows:
+        print("内容榜：没有可上传的记录。")
+        return 0
+
+    print(f"内容榜：准备上传 {len(rows)} 行记录。")
+    records = _ranked_records(rows, FIELD_MAPPING_NOTE)
+    return await upload_to_bitable_async(
+        client, BITABLE_NOTE_APP_TOKEN, BITABLE_NOTE_TABLE_ID, records, on_progress, checkpoint, offload
+    )
+
+
+async def upload_account_rows_async(
+    client: AsyncFeishuClient,
+    rows: List[Dict[str, str]],
+    on_progress: Optional[Callable[[int], None]] = None,
+    checkpoint: Optional[Any] = None,
+    offload: Optional[Offload] = None,
+) -> int:
+    """upload_account_rows 的 asyncio 版本。"""
+    if not rows:
+        print("账号榜：没有可上传的记录。")
+        return 0
+
+    print(f"账号榜：准备上传 {len(rows)} 行记录。")
+    records = _ranked_records(rows, FIELD_MAPPING_ACCOUNT)
+    return await upload_to_bitable_async(
+        client,
+        BITABLE_ACCOUNT_APP_TOKEN,
+        BITABLE_ACCOUNT_TABLE_ID,
+        records,
+        on_progress,
+        checkpoint,
+        offload,
     )
 
 
@@ -109,7 +109,7 @@
           }
 
           chrome.runtime.sendMessage(
-            { type: "xhs-upload", endpoint: "upload_note_rank", rows },
+            { type: "xhs-upload", endpoint: "ingest_note_rank", rows },
             (res) => {
               if (chrome.runtime.lastError) {
                 console.error("xhs-upload note error:", chrome.runtime.lastError);
@@ -124,7 +124,7 @@
                 return;
               }
               setStatus(
-                `已上传内容榜，多维表新增 ${res.uploaded || 0} 条记录。`
+                `已保存内容榜到本地库（新增 ${res.inserted || 0} / 更新 ${res.updated || 0} / 未变化 ${res.unchanged || 0}），并提交飞书上传任务（${res.rows || rows.length} 条），后台写入中。任务 ID：${res.job_id || "-"}`
               );
             }
           );
@@ -164,7 +164,9 @@
                 );
                 return;
               }
-              setStatus(`已保存内容榜，本地库新增 ${res.inserted || 0} 条记录。`);
+              setStatus(
+                `已保存内容榜，本地库新增 ${res.inserted || 0} 条，更新 ${res.updated || 0} 条，未变化 ${res.unchanged || 0} 条。`
+              );
             }
           );
         });
@@ -186,7 +188,7 @@
           }
 
           chrome.runtime.sendMessage(
-            { type: "xhs-upload", endpoint: "upload_account_rank", rows },
+            { type: "xhs-upload", endpoint: "ingest_account_rank", rows },
             (res) => {
               if (chrome.runtime.lastError) {
                 console.error(
@@ -204,7 +206,7 @@
                 return;
               }
               setStatus(
-                `已上传账号榜，多维表新增 ${res.uploaded || 0} 条记录。`
+                `已保存账号榜到本地库（新增 ${res.inserted || 0} / 更新 ${res.updated || 0} / 未变化 ${res.unchanged || 0}），并提交飞书上传任务（${res.rows || rows.length} 条），后台写入中。任务 ID：${res.job_id || "-"}`
               );
             }
           );
@@ -244,7 +246,9 @@
                 );
                 return;
               }
-              setStatus(`已保存账号榜，本地库新增 ${res.inserted || 0} 条记录。`);
+              setStatus(
+                `已保存账号榜，本地库新增 ${res.inserted || 0} 条，更新 ${res.updated || 0} 条，未变化 ${res.unchanged || 0} 条。`
+              );
             }
           );
         });